@@ -0,0 +1,304 @@
+# Shared aggregation engine - one pass over the data, every report reads from it
+# Instead of each script grouping the raw orders again and again (by region,
+# by product, by month...), we sum Revenue, Profit and order counts ONCE into
+# a small "cube": one row per Region x Product x day. Every total the scripts
+# print can be re-added from that cube, which is tiny compared to the orders.
+#
+# Roll-ups don't use pandas groupby: every key is turned into small integer
+# codes (category codes for Region/Product, calendar_dim lookups for dates)
+# and the totals are added up with np.bincount().
+#
+# If the orders have a Customer_ID, the cube can also keep who bought what per
+# Region x Product x month (see distinct.py), for distinct customer counts,
+# and the order values and basket sizes there (see quantiles.py), for medians
+# and percentiles.
+
+import numpy as np
+import pandas as pd
+
+from calendar_dim import CALENDAR_KEYS, day_codes, key_codes
+from distinct import CUSTOMER_COLUMN, build_distinct, merge_distinct
+from profiling import span
+from quantiles import QUANTILE_COLUMNS, QUANTILES, build_distribution, merge_distributions
+
+DIMENSIONS = ['Region', 'Product', 'Date']
+MEASURES = ['Revenue', 'Profit', 'Orders']
+
+
+class SalesCube:
+    """Revenue, Profit and order counts summed over Region x Product x day.
+
+    ``cells`` has one row per combination that actually had sales, with the
+    columns Region, Product, Date, Revenue, Profit, Orders and First_Row (the
+    position of the first order in that cell, used to list regions/products
+    in the order they first appear in the data, like ``df['Region'].unique()``).
+    ``customers`` is a distinct.DistinctCounter when customers were counted,
+    ``distributions`` a dict of column -> quantiles.ValueDistribution (Revenue,
+    Quantity) when their quantiles were kept.
+    """
+
+    def __init__(self, cells, customers=None, distributions=None):
+        self.cells = cells
+        self.customers = customers
+        self.distributions = distributions or {}
+        self._days = None
+
+    def __len__(self):
+        return len(self.cells)
+
+    # ---- Whole-dataset numbers -------------------------------------------
+
+    def totals(self):
+        """Overall revenue, profit and number of orders."""
+        return {
+            'Revenue': self.cells['Revenue'].sum(),
+            'Profit': self.cells['Profit'].sum(),
+            'Orders': int(self.cells['Orders'].sum()),
+        }
+
+    def date_range(self):
+        return self.cells['Date'].min(), self.cells['Date'].max()
+
+    def distinct_days(self, by=None):
+        """Number of different days that had at least one order, in total or per key.
+
+        Every cell is one day, so this counts different (group, day) pairs:
+        one sort of integer codes, however many orders there were. With
+        ``by`` (any rollup() key or list of keys) the result is a Series.
+        """
+        days = self.days()
+        if by is None:
+            return len(np.unique(days))
+        groups, shape, labels = self._groups(by)
+        first_day = days.min() if len(days) else 0
+        day_count = int(days.max() - first_day) + 1 if len(days) else 1
+        pairs = np.unique(groups * day_count + (days - first_day))
+        present, counts = np.unique(pairs // day_count, return_counts=True)
+        return pd.Series(counts, index=self._group_index(present, shape, labels), name='Days')
+
+    def distinct_customers(self, by=None):
+        """Number of different customers, in total or per key (None if they weren't counted).
+
+        ``by`` can be Region, Product or a month-level calendar key
+        (YearMonth, Month_Name, Quarter...). Built with distinct='sketch' the
+        counts are estimates, typically within 2-3%.
+        """
+        if self.customers is None:
+            return None
+        counts = self.customers.count(by)
+        return counts if by is None else counts.rename('Customers')
+
+    def value_quantiles(self, column='Revenue', by=None, quantiles=QUANTILES):
+        """Median, p90 and p99 of one order's ``column`` (Revenue or Quantity), in total or per key.
+
+        Returns a Series (p50, p90, p99) or, with ``by``, a DataFrame with one
+        row per key value - or None if the cube didn't keep that column. ``by``
+        can be Region, Product or a month-level calendar key. Built with
+        quantiles='sketch' every value is within 1% of the exact one.
+        """
+        if column not in self.distributions:
+            return None
+        return self.distributions[column].quantiles(by, quantiles)
+
+    # ---- Roll-ups ----------------------------------------------------------
+
+    def days(self):
+        """Day code of every cell (days since 1970-01-01), worked out once."""
+        if self._days is None:
+            self._days = day_codes(self.cells['Date'])
+        return self._days
+
+    def _codes(self, name):
+        """(codes, labels) for one grouping key: labels[codes[i]] is cell i's value."""
+        if name == 'Date' or name in CALENDAR_KEYS:
+            return key_codes(self.days(), name)
+        if name not in ('Region', 'Product'):
+            raise KeyError(f"Unknown grouping key: {name}")
+        column = self.cells[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            labels = pd.CategoricalIndex(column.cat.categories, categories=column.cat.categories,
+                                         ordered=column.cat.ordered, name=name)
+            return column.cat.codes.to_numpy(), labels
+        codes, uniques = pd.factorize(column, sort=True)
+        return codes, pd.Index(uniques, name=name)
+
+    def _groups(self, by):
+        """One group number per cell for a key or list of keys, plus what each number means."""
+        names = [by] if isinstance(by, str) else list(by)
+        coded = [self._codes(name) for name in names]
+        labels = [key_labels for _, key_labels in coded]
+        shape = tuple(len(key_labels) for key_labels in labels)
+        groups = np.ravel_multi_index([codes for codes, _ in coded], shape)
+        return np.asarray(groups, dtype='int64'), shape, labels
+
+    @staticmethod
+    def _group_index(groups, shape, labels):
+        """Index of key values (a MultiIndex for several keys) for the given group numbers."""
+        if len(labels) == 1:
+            return labels[0].take(groups)
+        codes = np.unravel_index(groups, shape)
+        return pd.MultiIndex(levels=labels, codes=codes,
+                             names=[key_labels.name for key_labels in labels]).remove_unused_levels()
+
+    def rollup(self, by):
+        """Sum Revenue, Profit and Orders by one key or a list of keys.
+
+        Besides the stored dimensions, every calendar_dim key can be used:
+        Month, Month_Name, Quarter, Day_of_Week, YearMonth, ISO_Week,
+        Fiscal_Quarter... Rows come out sorted by key, like a groupby.
+        """
+        groups, shape, labels = self._groups(by)
+        size = int(np.prod(shape))
+        present = np.flatnonzero(np.bincount(groups, minlength=size))
+        result = pd.DataFrame({
+            measure: np.bincount(groups, weights=self.cells[measure].to_numpy(dtype='float64'),
+                                 minlength=size)[present]
+            for measure in MEASURES
+        }, index=self._group_index(present, shape, labels))
+        result['Orders'] = result['Orders'].astype('int64')
+        return result
+
+    def appearance_order(self, by):
+        """Values of a key (or key tuples) in the order they first show up in the raw data."""
+        groups, shape, labels = self._groups(by)
+        never = np.iinfo('int64').max
+        first = np.full(int(np.prod(shape)), never, dtype='int64')
+        np.minimum.at(first, groups, self.cells['First_Row'].to_numpy(dtype='int64'))
+        present = np.flatnonzero(first != never)
+        present = present[np.argsort(first[present], kind='stable')]
+        return list(self._group_index(present, shape, labels))
+
+    def top_n(self, group, item, n=3, measure='Revenue'):
+        """The ``n`` best ``item`` values within every ``group`` value, by ``measure``.
+
+        e.g. top_n('Region', 'Product') for the top products per region,
+        top_n('Product', 'Region') or top_n('Month_Name', 'Date'). Returns a
+        table with the group key(s), item key(s), the measures and a Rank
+        column, sorted by group and then rank.
+        """
+        group = [group] if isinstance(group, str) else list(group)
+        item = [item] if isinstance(item, str) else list(item)
+        table = self.rollup(group + item).reset_index()
+        return top_n_per_group(table, group, measure, n)
+
+    def where(self, mask):
+        """A smaller cube with only the cells where ``mask`` is True.
+
+        Customer counts can't follow a mask over day cells, so they are left out.
+        """
+        return SalesCube(self.cells[mask].reset_index(drop=True))
+
+    def split(self, by):
+        """One smaller cube per value of a key (or key tuple), from a single sort.
+
+        Returns a dict of value -> SalesCube, in key order. Cells keep their
+        order inside each piece, so appearance_order() still works on them.
+        Split by Region or Product, every piece keeps its own customers and quantiles.
+        """
+        groups, shape, labels = self._groups(by)
+        order = np.argsort(groups, kind='stable')
+        present, starts = np.unique(groups[order], return_index=True)
+        pieces = np.split(order, starts[1:])
+        keys = self._group_index(present, shape, labels)
+        by_key = by in ('Region', 'Product')
+        keep_customers = self.customers is not None and by_key
+        distributions = self.distributions if by_key else {}
+        return {key: SalesCube(self.cells.take(rows).reset_index(drop=True),
+                               self.customers.where(by, key) if keep_customers else None,
+                               {column: distribution.where(by, key)
+                                for column, distribution in distributions.items()})
+                for key, rows in zip(keys, pieces)}
+
+
+def top_n_per_group(table, group, measure, n=3):
+    """The ``n`` rows with the largest ``measure`` in every ``group`` of ``table``.
+
+    One sort for all groups together (by group, then measure from high to
+    low) instead of filtering the table once per group. Ties keep the order
+    the rows already had.
+    """
+    group = [group] if isinstance(group, str) else list(group)
+    codes = table.groupby(group, observed=True, sort=True).ngroup().to_numpy()
+    values = table[measure].to_numpy(dtype='float64')
+    order = np.lexsort((-values, codes))
+
+    # Position of each row within its group after sorting: 0 for the best one
+    sorted_codes = codes[order]
+    positions = np.arange(len(order))
+    starts = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]] if len(order) else np.zeros(0, dtype=bool)
+    rank = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+
+    keep = rank < n
+    top = table.iloc[order[keep]].reset_index(drop=True)
+    top['Rank'] = rank[keep] + 1
+    return top
+
+
+def build_sales_cube(df, row_numbers=None, distinct=None, quantiles=None):
+    """Scan the orders once and return a SalesCube.
+
+    ``row_numbers`` gives each order's position in the full dataset when
+    ``df`` is only a slice of it (a chunk, or newly appended orders).
+    ``distinct`` ('exact' or 'sketch') also counts the customers, if the
+    orders have a Customer_ID. ``quantiles`` ('exact' or 'sketch') keeps
+    Revenue and Quantity for medians and percentiles.
+    """
+    with span('build cube', rows=len(df)):
+        cube = _build_cells(df, row_numbers)
+    if distinct and CUSTOMER_COLUMN in df.columns:
+        with span('count customers', rows=len(df)):
+            cube.customers = build_distinct(df, CUSTOMER_COLUMN, distinct)
+    if quantiles:
+        with span('keep quantiles', rows=len(df)):
+            cube.distributions = build_distributions(df, quantiles)
+    return cube
+
+
+def build_distributions(df, mode='exact'):
+    """Revenue/Quantity distributions of ``df`` for SalesCube.distributions (the columns it has)."""
+    return {column: build_distribution(df, column, mode) for column in QUANTILE_COLUMNS if column in df.columns}
+
+
+def _build_cells(df, row_numbers):
+    if row_numbers is None:
+        row_numbers = np.arange(len(df))
+    cells = pd.DataFrame({
+        'Region': df['Region'],
+        'Product': df['Product'],
+        'Date': pd.to_datetime(df['Date']).dt.normalize(),
+        'Revenue': df['Revenue'],
+        'Profit': df['Profit'],
+        'Row': np.asarray(row_numbers),
+    })
+    cells = cells.groupby(DIMENSIONS, observed=True, sort=False).agg(
+        Revenue=('Revenue', 'sum'),
+        Profit=('Profit', 'sum'),
+        Orders=('Row', 'size'),
+        First_Row=('Row', 'min'),
+    ).reset_index()
+    return SalesCube(cells)
+
+
+def merge_cubes(*cubes):
+    """Combine cubes built from different parts of the data into one.
+
+    Sums just add up and the first row of a cell is the earliest one seen,
+    so building cubes piece by piece gives the same totals as one big cube.
+    Customers and quantiles are merged too, if every piece kept them.
+    """
+    cells = pd.concat([cube.cells for cube in cubes], ignore_index=True)
+    for column in ('Region', 'Product'):
+        # Pieces may have seen different categories - align them before grouping
+        cells[column] = cells[column].astype(str).astype('category')
+    cells = cells.groupby(DIMENSIONS, observed=True, sort=False).agg(
+        Revenue=('Revenue', 'sum'),
+        Profit=('Profit', 'sum'),
+        Orders=('Orders', 'sum'),
+        First_Row=('First_Row', 'min'),
+    ).reset_index()
+    counters = [cube.customers for cube in cubes]
+    customers = merge_distinct(*counters) if all(counter is not None for counter in counters) else None
+    distributions = {column: merge_distributions(*(cube.distributions[column] for cube in cubes))
+                     for column in QUANTILE_COLUMNS
+                     if all(column in cube.distributions for cube in cubes)}
+    return SalesCube(cells, customers, distributions)
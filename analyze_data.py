@@ -1,88 +1,164 @@
 # This program analyzes our sales data
 # We'll calculate KPIs and find insights!
 
-import pandas as pd
-
-print("📊 SALES ANALYTICS DASHBOARD")
-print("=" * 60)
-
-# STEP 1: Load the Excel file
-print("\n🔄 Loading data from sales_data.xlsx...")
-df = pd.read_excel('sales_data.xlsx')
-
-print(f"✅ Loaded {len(df)} sales records")
-
-# STEP 2: Calculate KPIs (Key Performance Indicators)
-print("\n" + "=" * 60)
-print("💰 KEY PERFORMANCE INDICATORS (KPIs)")
-print("=" * 60)
-
-total_revenue = df['Revenue'].sum()
-total_profit = df['Profit'].sum()
-total_orders = len(df)
-avg_order_value = df['Revenue'].mean()
-profit_margin = (total_profit / total_revenue) * 100
-
-print(f"\n📈 Total Revenue:        ${total_revenue:,.2f}")
-print(f"💵 Total Profit:         ${total_profit:,.2f}")
-print(f"📦 Total Orders:         {total_orders}")
-print(f"🎯 Average Order Value:  ${avg_order_value:.2f}")
-print(f"📊 Profit Margin:        {profit_margin:.2f}%")
-
-# STEP 3: Best Performing Region
-print("\n" + "=" * 60)
-print("🗺️  REGIONAL PERFORMANCE")
-print("=" * 60)
-
-# Group by Region and calculate total revenue
-region_sales = df.groupby('Region')['Revenue'].sum().sort_values(ascending=False)
-
-print("\nRevenue by Region:")
-for region, revenue in region_sales.items():
-    percentage = (revenue / total_revenue) * 100
-    print(f"   {region:10s}  ${revenue:>10,.2f}  ({percentage:>5.1f}%)")
-
-best_region = region_sales.index[0]
-print(f"\n🏆 Best Region: {best_region} with ${region_sales[best_region]:,.2f}")
-
-# STEP 4: Top Products
-print("\n" + "=" * 60)
-print("📦 PRODUCT PERFORMANCE")
-print("=" * 60)
-
-# Group by Product and calculate total revenue
-product_sales = df.groupby('Product')['Revenue'].sum().sort_values(ascending=False)
-
-print("\nRevenue by Product:")
-for i, (product, revenue) in enumerate(product_sales.items(), 1):
-    print(f"   {i}. {product:15s}  ${revenue:>10,.2f}")
-
-best_product = product_sales.index[0]
-print(f"\n🏆 Top Product: {best_product} with ${product_sales[best_product]:,.2f}")
-
-# STEP 5: Most Profitable Product
-print("\n" + "=" * 60)
-print("💎 PROFITABILITY ANALYSIS")
-print("=" * 60)
-
-product_profit = df.groupby('Product')['Profit'].sum().sort_values(ascending=False)
-
-print("\nProfit by Product:")
-for i, (product, profit) in enumerate(product_profit.items(), 1):
-    print(f"   {i}. {product:15s}  ${profit:>10,.2f}")
-
-most_profitable = product_profit.index[0]
-print(f"\n💰 Most Profitable: {most_profitable} with ${product_profit[most_profitable]:,.2f} profit")
-
-# STEP 6: Summary Insights
-print("\n" + "=" * 60)
-print("🔍 KEY INSIGHTS")
-print("=" * 60)
-
-print(f"\n1. Our {best_region} region is performing the best!")
-print(f"2. {best_product} is our top-selling product")
-print(f"3. {most_profitable} generates the most profit")
-print(f"4. We're making {profit_margin:.1f}% profit margin overall")
-
-print("\n✅ Analysis Complete!")
-print("=" * 60)
\ No newline at end of file
+import argparse
+
+import profiling
+from data_loader import (BACKENDS, DEFAULT_MAX_MEMORY_MB, NoOrdersError, add_input_arguments, describe_filters,
+                         engine_available, input_filters, load_sales_data)
+from aggregations import build_sales_cube
+
+parser = argparse.ArgumentParser(description='Sales KPI dashboard')
+parser.add_argument('--profile', action='store_true', help='record step timings to PROFILE.json')
+add_input_arguments(parser)
+mode = parser.add_mutually_exclusive_group()
+mode.add_argument('--incremental', action='store_true',
+                  help='only add orders that arrived since the last run (totals are saved in .sales_cache)')
+mode.add_argument('--stream', action='store_true',
+                  help='read the file in chunks instead of loading it all into memory')
+mode.add_argument('--backend', choices=BACKENDS, default='pandas',
+                  help='add the orders up with pandas (default) or an embedded SQL database')
+parser.add_argument('--max-memory-mb', type=int, default=DEFAULT_MAX_MEMORY_MB,
+                    help='memory ceiling for --stream and for building the SQL database (default: %(default)s MB)')
+
+
+def main(argv=None, df=None, cube=None):
+    """Run the KPI dashboard.
+
+    ``df`` / ``cube`` let the pipeline runner pass in data it already loaded.
+    """
+    args = parser.parse_args(argv)
+    if args.incremental and any(value is not None for value in input_filters(args).values()):
+        parser.error('--incremental keeps totals for the whole input - it can\'t be combined with --start/--end/--region')
+    if not engine_available(args.backend):
+        parser.error(f'--backend {args.backend} needs the {args.backend} package (pip install {args.backend})')
+    if args.profile:
+        profiling.enable()
+    steps = profiling.Steps('analyze_data')
+
+    print("📊 SALES ANALYTICS DASHBOARD")
+    print("=" * 60)
+
+    # STEP 1: Load the Excel file
+    steps.next('STEP 1: Load the Excel file')
+    # The other ways of adding the orders up are only imported when asked for,
+    # so the plain run starts faster
+    if args.incremental:
+        from incremental import load_incremental_cube
+        print(f"\n🔄 Updating saved totals from {args.input}...")
+        cube, new_orders = load_incremental_cube(args.input)
+        print(f"✅ {cube.totals()['Orders']} sales records ({new_orders} new since last run)")
+    elif args.stream:
+        from streaming import build_sales_cube_streaming
+        print(f"\n🔄 Streaming data from {args.input}{describe_filters(args)} (max {args.max_memory_mb} MB)...")
+        cube = build_sales_cube_streaming(args.input, args.max_memory_mb, **input_filters(args))
+        print(f"✅ Loaded {cube.totals()['Orders']} sales records")
+    else:
+        print(f"\n🔄 Loading data from {args.input}{describe_filters(args)}...")
+        if args.backend != 'pandas':
+            # The database adds the orders up; only the small cube comes back
+            from sql_backend import build_sales_cube_sql
+            cube = build_sales_cube_sql(args.input, args.backend, max_memory_mb=args.max_memory_mb,
+                                        **input_filters(args))
+            print(f"✅ Loaded {cube.totals()['Orders']} sales records")
+        else:
+            if df is None:
+                df = load_sales_data(args.input, **input_filters(args))
+
+            print(f"✅ Loaded {len(df)} sales records")
+
+            # Sum everything up once - all the tables below are read from this cube
+            if cube is None:
+                cube = build_sales_cube(df)
+
+    totals = cube.totals()
+    steps.rows(totals['Orders'])
+    product_totals = cube.rollup('Product')
+
+    # STEP 2: Calculate KPIs (Key Performance Indicators)
+    steps.next('STEP 2: Calculate KPIs (Key Performance Indicators)')
+    print("\n" + "=" * 60)
+    print("💰 KEY PERFORMANCE INDICATORS (KPIs)")
+    print("=" * 60)
+
+    total_revenue = totals['Revenue']
+    total_profit = totals['Profit']
+    total_orders = totals['Orders']
+    avg_order_value = total_revenue / total_orders
+    profit_margin = (total_profit / total_revenue) * 100
+
+    print(f"\n📈 Total Revenue:        ${total_revenue:,.2f}")
+    print(f"💵 Total Profit:         ${total_profit:,.2f}")
+    print(f"📦 Total Orders:         {total_orders}")
+    print(f"🎯 Average Order Value:  ${avg_order_value:.2f}")
+    print(f"📊 Profit Margin:        {profit_margin:.2f}%")
+
+    # STEP 3: Best Performing Region
+    steps.next('STEP 3: Best Performing Region')
+    print("\n" + "=" * 60)
+    print("🗺️  REGIONAL PERFORMANCE")
+    print("=" * 60)
+
+    # Group by Region and calculate total revenue
+    region_sales = cube.rollup('Region')['Revenue'].sort_values(ascending=False)
+
+    print("\nRevenue by Region:")
+    for region, revenue in region_sales.items():
+        percentage = (revenue / total_revenue) * 100
+        print(f"   {region:10s}  ${revenue:>10,.2f}  ({percentage:>5.1f}%)")
+
+    best_region = region_sales.index[0]
+    print(f"\n🏆 Best Region: {best_region} with ${region_sales[best_region]:,.2f}")
+
+    # STEP 4: Top Products
+    steps.next('STEP 4: Top Products')
+    print("\n" + "=" * 60)
+    print("📦 PRODUCT PERFORMANCE")
+    print("=" * 60)
+
+    # Group by Product and calculate total revenue
+    product_sales = product_totals['Revenue'].sort_values(ascending=False)
+
+    print("\nRevenue by Product:")
+    for i, (product, revenue) in enumerate(product_sales.items(), 1):
+        print(f"   {i}. {product:15s}  ${revenue:>10,.2f}")
+
+    best_product = product_sales.index[0]
+    print(f"\n🏆 Top Product: {best_product} with ${product_sales[best_product]:,.2f}")
+
+    # STEP 5: Most Profitable Product
+    steps.next('STEP 5: Most Profitable Product')
+    print("\n" + "=" * 60)
+    print("💎 PROFITABILITY ANALYSIS")
+    print("=" * 60)
+
+    product_profit = product_totals['Profit'].sort_values(ascending=False)
+
+    print("\nProfit by Product:")
+    for i, (product, profit) in enumerate(product_profit.items(), 1):
+        print(f"   {i}. {product:15s}  ${profit:>10,.2f}")
+
+    most_profitable = product_profit.index[0]
+    print(f"\n💰 Most Profitable: {most_profitable} with ${product_profit[most_profitable]:,.2f} profit")
+
+    # STEP 6: Summary Insights
+    steps.next('STEP 6: Summary Insights')
+    print("\n" + "=" * 60)
+    print("🔍 KEY INSIGHTS")
+    print("=" * 60)
+
+    print(f"\n1. Our {best_region} region is performing the best!")
+    print(f"2. {best_product} is our top-selling product")
+    print(f"3. {most_profitable} generates the most profit")
+    print(f"4. We're making {profit_margin:.1f}% profit margin overall")
+
+    print("\n✅ Analysis Complete!")
+    print("=" * 60)
+    steps.done()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except NoOrdersError as error:
+        parser.error(str(error))
\ No newline at end of file
@@ -0,0 +1,256 @@
+# Benchmark - how does every pipeline stage scale with more data?
+# Generates synthetic datasets (same columns as generate_data.py) at growing
+# sizes, times each stage separately and records its peak memory, then saves
+# everything to a JSON file. Pass --compare old_results.json to spot stages
+# that got slower since an earlier run.
+#
+# Memory is recorded two ways: peak_mb is tracemalloc's peak for the stage
+# (Python and NumPy allocations), max_rss_mb is the process's highest memory
+# use so far (also counts Arrow/Parquet buffers; Unix only).
+#
+# Startup is measured too: how long each script takes to start in a fresh
+# Python (imports + argument parsing, via --help) in text-only mode. Anything
+# over --startup-budget seconds counts as a regression. By default the budget
+# is measured on the machine: the time Python needs to import pandas (which
+# every script pays) plus a margin for the project's own modules.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from aggregations import build_sales_cube
+from data_loader import load_sales_data
+from forecasting import fit_linear_trends, segment_month_matrix
+from generate_data import generate_sales_chunks, write_sales
+
+DEFAULT_SIZES = '1e3,1e4,1e5,1e6,1e7'
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Scripts (and their text-only options) whose start-up time is checked
+STARTUP_SCRIPTS = [
+    ('analyze_data.py', []),
+    ('generate_report.py', []),
+    ('forecast_sales.py', ['--no-charts']),
+    ('advanced_analysis.py', ['--no-charts']),
+    ('run_pipeline.py', ['--no-charts']),
+]
+# Start-up budget = time to run STARTUP_BASELINE + STARTUP_MARGIN_SECONDS
+STARTUP_BASELINE = ['-c', 'import pandas']
+STARTUP_MARGIN_SECONDS = 0.5
+
+
+def _forecast(cube):
+    monthly = cube.rollup('YearMonth')['Revenue'].to_numpy()[np.newaxis, :]
+    fit_linear_trends(monthly)
+    _, _, segment_revenue = segment_month_matrix(cube, ['Region', 'Product'])
+    fit_linear_trends(segment_revenue)
+
+
+def _charts(df, cube):
+    import create_charts
+    create_charts.main([], df=df, cube=cube)
+
+
+def _report(df, cube):
+    import generate_report
+    generate_report.main([], df=df, cube=cube)
+
+
+def _stages(path):
+    """(name, function) pairs; each function gets the results of the earlier ones."""
+    state = {}
+
+    def load_cold():
+        state['df'] = load_sales_data(path)
+
+    def load_cached():
+        state['df'] = load_sales_data(path)
+
+    def aggregate():
+        state['cube'] = build_sales_cube(state['df'])
+
+    return [
+        ('load', load_cold),
+        ('load_cached', load_cached),
+        ('aggregate', aggregate),
+        ('forecast', lambda: _forecast(state['cube'])),
+        ('charts', lambda: _charts(state['df'], state['cube'])),
+        ('report', lambda: _report(state['df'], state['cube'])),
+    ]
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+
+def _run(function, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if trace_memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return seconds, peak_mb
+
+
+def _prepare(folder, rows, seed):
+    """Fresh folder with a generated dataset (no cache, no charts yet)."""
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    path = os.path.join(folder, 'sales_data.parquet')
+    write_sales(generate_sales_chunks(rows, seed=seed), path)
+    return path
+
+
+def benchmark_size(rows, workdir, seed, measure_memory=True):
+    """Time (and optionally memory-profile) every stage for one dataset size."""
+    folder = os.path.join(workdir, f'rows_{rows}')
+    start = time.perf_counter()
+    path = _prepare(folder, rows, seed)
+    results = [{'rows': rows, 'stage': 'generate', 'seconds': time.perf_counter() - start,
+                'peak_mb': None, 'max_rss_mb': _max_rss_mb()}]
+
+    # Timing pass - memory tracing slows Python down, so it gets its own pass
+    previous = os.getcwd()
+    os.chdir(folder)  # the scripts write charts/ and EXECUTIVE_SUMMARY.txt here
+    try:
+        for stage, function in _stages(path):
+            seconds, _ = _run(function, trace_memory=False)
+            results.append({'rows': rows, 'stage': stage, 'seconds': seconds,
+                            'peak_mb': None, 'max_rss_mb': _max_rss_mb()})
+    finally:
+        os.chdir(previous)
+
+    if measure_memory:
+        path = _prepare(folder, rows, seed)
+        os.chdir(folder)
+        try:
+            for (stage, function), result in zip(_stages(path), results[1:]):
+                _, result['peak_mb'] = _run(function, trace_memory=True)
+        finally:
+            os.chdir(previous)
+    return results
+
+
+def measure_startup(script, options, repeat=3):
+    """Fastest of ``repeat`` fresh-interpreter starts of a script (seconds).
+
+    ``script=None`` runs Python with just ``options`` (e.g. STARTUP_BASELINE).
+    """
+    if script is None:
+        command = [sys.executable] + options
+    else:
+        command = [sys.executable, os.path.join(HERE, script)] + options + ['--help']
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, cwd=HERE)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def compare(results, old_file, threshold):
+    """Print stages that got more than ``threshold`` times slower than in old_file."""
+    with open(old_file, encoding='utf-8') as f:
+        old = {(r['rows'], r['stage']): r['seconds'] for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\n📊 Compared with {old_file}:")
+    for r in results:
+        before = old.get((r['rows'], r['stage']))
+        if not before:
+            continue
+        ratio = r['seconds'] / before
+        flag = '⚠️  SLOWER' if ratio > threshold else ''
+        regressions += bool(flag)
+        print(f"   {r['stage']:30s} {r['rows']:>10,} rows  {before:8.3f}s → {r['seconds']:8.3f}s  ({ratio:4.2f}x) {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage at growing data sizes')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='comma-separated row counts (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=42, help='seed for the generated data')
+    parser.add_argument('--output', default='benchmark_results.json', help='results file (default: %(default)s)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the (slower) peak-memory pass')
+    parser.add_argument('--compare', help='earlier results file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slow-down ratio reported as a regression (default: %(default)s)')
+    parser.add_argument('--startup-budget', type=float,
+                        help='most seconds a script may take to start '
+                             f'(default: time to import pandas + {STARTUP_MARGIN_SECONDS}s)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(float(size)) for size in args.sizes.split(',')] if args.sizes else []
+    print("⏱️  PIPELINE BENCHMARK")
+    print("=" * 60)
+
+    results = []
+    over_budget = 0
+    if args.startup_budget is None:
+        baseline = measure_startup(None, STARTUP_BASELINE)
+        args.startup_budget = baseline + STARTUP_MARGIN_SECONDS
+        print(f"\n🚀 Start-up time (budget {args.startup_budget:.2f}s = import pandas {baseline:.2f}s"
+              f" + {STARTUP_MARGIN_SECONDS}s)")
+    else:
+        print(f"\n🚀 Start-up time (budget {args.startup_budget:.2f}s)")
+    for script, options in STARTUP_SCRIPTS:
+        seconds = measure_startup(script, options)
+        flag = '⚠️  OVER BUDGET' if seconds > args.startup_budget else ''
+        over_budget += bool(flag)
+        print(f"   {script:22s} {seconds:8.3f}s  {flag}")
+        results.append({'rows': 0, 'stage': f'startup {script}', 'seconds': seconds,
+                        'peak_mb': None, 'max_rss_mb': None})
+    workdir = tempfile.mkdtemp(prefix='sales_benchmark_')
+    try:
+        for rows in sizes:
+            print(f"\n📊 {rows:,} rows")
+            for r in benchmark_size(rows, workdir, args.seed, measure_memory=not args.no_memory):
+                memory = f"{r['peak_mb']:9.1f} MB" if r['peak_mb'] is not None else ''
+                print(f"   {r['stage']:12s} {r['seconds']:8.3f}s  {memory}")
+                results.append(r)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'results': results,
+        }, f, indent=2)
+    print(f"\n💾 Saved to: {args.output}")
+
+    regressions = compare(results, args.compare, args.threshold) if args.compare else 0
+    if regressions or over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
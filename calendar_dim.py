@@ -0,0 +1,103 @@
+# Calendar dimension - everything we want to know about a day, worked out once
+# Grouping by month, quarter or weekday used to mean calling .dt.month_name(),
+# .dt.quarter, .dt.to_period('M')... on every row and then grouping on the
+# resulting strings. Instead we build a small table with ONE row per day in the
+# data's date range (a few hundred rows, however many orders there are) and
+# look every order's day up in it by an integer "day code" (days since
+# 1970-01-01). Each calendar attribute is stored as a small integer too, so
+# totals per month/quarter/weekday are plain np.bincount() calls, and the
+# names ("January", "Q1", "Monday") are only attached to the final labels.
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# First month of the financial year (1 = same as the calendar year, 4 = April...).
+# A fiscal year is named after the calendar year it ends in.
+FISCAL_YEAR_START_MONTH = 1
+
+# Keys that can be looked up in the calendar (besides the day itself)
+CALENDAR_KEYS = ['Year', 'Month', 'Month_Name', 'Quarter', 'YearMonth', 'YearQuarter',
+                 'Day_of_Week', 'ISO_Year', 'ISO_Week', 'Fiscal_Year', 'Fiscal_Quarter', 'Fiscal_Period']
+
+
+def day_codes(dates):
+    """Days since 1970-01-01 for a column of dates (no string or .dt work)."""
+    return np.asarray(dates, dtype='datetime64[D]').astype('int64')
+
+
+@lru_cache(maxsize=16)
+def calendar(first_day, last_day):
+    """One row per day from ``first_day`` to ``last_day`` (day codes), indexed by day code.
+
+    Every column is an integer: Year, Month (1-12), Quarter (1-4), Weekday
+    (0 = Monday), YearMonth / YearQuarter (pandas period ordinals, i.e. months
+    or quarters since 1970), ISO_Year, ISO_Week and the fiscal year/quarter/
+    period (month of the fiscal year).
+    """
+    days = pd.DatetimeIndex(np.arange(first_day, last_day + 1).astype('datetime64[D]'))
+    iso = days.isocalendar()
+    year, month = days.year.to_numpy(), days.month.to_numpy()
+    shifted = month - FISCAL_YEAR_START_MONTH  # months since the fiscal year started
+    fiscal_period = shifted % 12 + 1
+    table = pd.DataFrame({
+        'Date': days,
+        'Year': year,
+        'Month': month,
+        'Quarter': (month - 1) // 3 + 1,
+        'Weekday': days.weekday.to_numpy(),
+        'YearMonth': (year - 1970) * 12 + month - 1,
+        'YearQuarter': (year - 1970) * 4 + (month - 1) // 3,
+        'ISO_Year': iso['year'].to_numpy(),
+        'ISO_Week': iso['week'].to_numpy(),
+        'Fiscal_Year': year + (FISCAL_YEAR_START_MONTH > 1) * (shifted >= 0),
+        'Fiscal_Quarter': (fiscal_period - 1) // 3 + 1,
+        'Fiscal_Period': fiscal_period,
+    }, index=pd.Index(np.arange(first_day, last_day + 1), name='Day'))
+    return table.astype({column: 'int32' for column in table.columns if column != 'Date'})
+
+
+def _integer_labels(values, name):
+    """(codes, labels) for a plain integer attribute: codes count up from its smallest value."""
+    low, high = int(values.min()), int(values.max())
+    return values - low, pd.Index(np.arange(low, high + 1), name=name)
+
+
+def key_codes(days, name):
+    """Integer codes and their labels for one calendar key.
+
+    ``days`` are day codes (see day_codes()). Returns (codes, labels) where
+    ``labels[codes[i]]`` is the key's value for day ``i``; codes are small
+    non-negative integers ready for np.bincount().
+    """
+    if len(days) == 0:
+        return np.zeros(0, dtype='int64'), pd.Index([], name=name)
+    first_day = int(days.min())
+    table = calendar(first_day, int(days.max()))
+    position = days - first_day
+
+    if name == 'Date':
+        return position, pd.DatetimeIndex(table['Date'], name=name)
+    if name == 'Day_of_Week':
+        labels = pd.CategoricalIndex(DAY_NAMES, categories=DAY_NAMES, ordered=True, name=name)
+        return table['Weekday'].to_numpy()[position], labels
+    if name == 'Month_Name':
+        # Ordered category so months come out in calendar order, not A-Z
+        labels = pd.CategoricalIndex(MONTH_NAMES, categories=MONTH_NAMES, ordered=True, name=name)
+        return table['Month'].to_numpy()[position] - 1, labels
+    if name in ('YearMonth', 'YearQuarter'):
+        ordinals = table[name].to_numpy()
+        freq = 'M' if name == 'YearMonth' else 'Q'
+        first = pd.Period(ordinal=int(ordinals.min()), freq=freq)
+        labels = pd.period_range(first, periods=int(ordinals.max() - ordinals.min()) + 1, name=name)
+        return ordinals[position] - ordinals.min(), labels
+    if name in table.columns and name != 'Date':
+        values = table[name].to_numpy()
+        codes, labels = _integer_labels(values, name)
+        return codes[position], labels
+    raise KeyError(f"Unknown calendar key: {name}")
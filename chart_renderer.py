@@ -0,0 +1,299 @@
+# Chart rendering - draws the PNG charts in parallel and skips unchanged ones
+# Each chart is described by its type and the (small) aggregated numbers it
+# shows. Before drawing we hash those numbers: if the hash matches the one
+# recorded for the existing PNG in charts/, the chart is already up to date and
+# nothing is drawn. Charts that do need drawing are spread over a pool of
+# worker processes using matplotlib's non-interactive Agg backend.
+
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import profiling
+
+CHART_FOLDER = 'charts'
+MANIFEST_FILE = '.chart_hashes.json'
+
+# Bump this when the drawing code changes, so every chart is redrawn once
+RENDER_VERSION = 1
+
+REGION_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+# ---- Chart drawing functions ---------------------------------------------
+# Each one gets the chart's data dict and the file to save to.
+
+def draw_revenue_by_region(data, filename):
+    plt = _pyplot()
+    plt.figure(figsize=(10, 6))  # Size of chart
+    plt.bar(data['labels'], data['values'], color=REGION_COLORS)
+    plt.title('Revenue by Region', fontsize=16, fontweight='bold')
+    plt.xlabel('Region', fontsize=12)
+    plt.ylabel('Revenue ($)', fontsize=12)
+    plt.grid(axis='y', alpha=0.3)
+
+    # Add value labels on bars
+    for i, v in enumerate(data['values']):
+        plt.text(i, v, f'${v:,.0f}', ha='center', va='bottom', fontweight='bold')
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def draw_revenue_by_product(data, filename):
+    plt = _pyplot()
+    plt.figure(figsize=(14, 7))  # Bigger size
+    plt.barh(data['labels'], data['values'], color='#4ECDC4')
+    plt.title('Revenue by Product', fontsize=16, fontweight='bold', pad=20)
+    plt.xlabel('Revenue ($)', fontsize=12)
+    plt.ylabel('Product', fontsize=12)
+    plt.grid(axis='x', alpha=0.3)
+
+    # Add value labels INSIDE the bars (on the right)
+    for i, v in enumerate(data['values']):
+        plt.text(v - 8000, i, f'${v:,.0f}', va='center', ha='right', fontweight='bold', color='white', fontsize=11)
+
+    # Add more space on the right
+    plt.xlim(0, max(data['values']) * 1.1)  # 10% extra space
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def draw_region_distribution(data, filename):
+    plt = _pyplot()
+    plt.figure(figsize=(10, 8))
+    plt.pie(data['values'], labels=data['labels'], autopct='%1.1f%%',
+            colors=REGION_COLORS, startangle=90, textprops={'fontsize': 12, 'fontweight': 'bold'})
+    plt.title('Sales Distribution by Region', fontsize=16, fontweight='bold')
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def draw_sales_forecast(data, filename):
+    plt = _pyplot()
+    plt.figure(figsize=(14, 7))
+
+    # Plot historical data
+    plt.plot(data['months'], data['revenue'],
+             marker='o', linewidth=2, markersize=8, label='Actual Sales', color='#4ECDC4')
+
+    # Plot trend line (what model learned)
+    plt.plot(data['months'], data['trend'],
+             linestyle='--', linewidth=2, label='Trend', color='#FF6B6B', alpha=0.7)
+
+    # Plot future predictions
+    plt.plot(data['future_months'], data['forecast'],
+             marker='s', markersize=10, linewidth=2, label='Forecast',
+             color='#FFA07A', linestyle='--')
+
+    # Add labels to forecast points
+    for x, y in zip(data['future_months'], data['forecast']):
+        plt.text(x, y, f'\n${y:,.0f}', ha='center', fontweight='bold', fontsize=10)
+
+    plt.title('Sales Forecast - Historical & Predicted', fontsize=16, fontweight='bold')
+    plt.xlabel('Month', fontsize=12)
+    plt.ylabel('Revenue ($)', fontsize=12)
+    plt.legend(fontsize=11)
+    plt.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def draw_revenue_trend(data, filename):
+    import pandas as pd
+    plt = _pyplot()
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10), sharex=True)
+    dates = pd.to_datetime(data['dates'])
+
+    # Top: daily revenue with its 7-day and 30-day moving averages
+    ax1.plot(dates, data['revenue'], linewidth=1, color='#4ECDC4', alpha=0.5, label='Daily Revenue')
+    ax1.plot(dates, data['average_7'], linewidth=2, color='#45B7D1', label='7-Day Average')
+    ax1.plot(dates, data['average_30'], linewidth=2.5, color='#FF6B6B', label='30-Day Average')
+    ax1.set_title('Daily Revenue & Moving Averages', fontsize=16, fontweight='bold')
+    ax1.set_ylabel('Revenue ($)', fontsize=12)
+    ax1.legend(fontsize=11)
+    ax1.grid(True, alpha=0.3)
+
+    # Bottom: running total of revenue for every region
+    for (region, running), color in zip(data['cumulative'].items(), REGION_COLORS * len(data['cumulative'])):
+        ax2.plot(dates, running, linewidth=2.5, color=color, label=region)
+    ax2.set_title('Cumulative Revenue by Region', fontsize=16, fontweight='bold')
+    ax2.set_xlabel('Date', fontsize=12)
+    ax2.set_ylabel('Revenue to Date ($)', fontsize=12)
+    ax2.legend(fontsize=11)
+    ax2.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def draw_advanced_dashboard(data, filename):
+    import numpy as np
+    import pandas as pd
+    plt = _pyplot()
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('Advanced Sales Analytics Dashboard', fontsize=18, fontweight='bold')
+
+    # Chart 1: Monthly Revenue Trend
+    ax1 = axes[0, 0]
+    pd.Series(data['month_revenue'], index=data['months']).plot(kind='bar', ax=ax1, color='#4ECDC4')
+    ax1.set_title('Revenue by Month', fontweight='bold', fontsize=14)
+    ax1.set_xlabel('Month', fontsize=11)
+    ax1.set_ylabel('Revenue ($)', fontsize=11)
+    ax1.tick_params(axis='x', rotation=45)
+    ax1.grid(axis='y', alpha=0.3)
+
+    # Chart 2: Quarterly Comparison
+    ax2 = axes[0, 1]
+    x = np.arange(len(data['quarters']))
+    width = 0.35
+    ax2.bar(x - width/2, data['quarter_revenue'], width, label='Revenue', color='#4ECDC4')
+    ax2.bar(x + width/2, data['quarter_profit'], width, label='Profit', color='#FF6B6B')
+    ax2.set_title('Quarterly Revenue vs Profit', fontweight='bold', fontsize=14)
+    ax2.set_xlabel('Quarter', fontsize=11)
+    ax2.set_ylabel('Amount ($)', fontsize=11)
+    ax2.set_xticks(x)
+    ax2.set_xticklabels([f'Q{i}' for i in data['quarters']])
+    ax2.legend()
+    ax2.grid(axis='y', alpha=0.3)
+
+    # Chart 3: Product Profit Margin
+    ax3 = axes[1, 0]
+    colors_margin = ['#2ECC71' if x > 30 else '#F39C12' if x > 25 else '#E74C3C'
+                     for x in data['product_margins']]
+    pd.Series(data['product_margins'], index=data['products']).plot(kind='barh', ax=ax3, color=colors_margin)
+    ax3.set_title('Product Profit Margins', fontweight='bold', fontsize=14)
+    ax3.set_xlabel('Profit Margin (%)', fontsize=11)
+    ax3.set_ylabel('Product', fontsize=11)
+    ax3.grid(axis='x', alpha=0.3)
+
+    # Chart 4: Day of Week Pattern
+    ax4 = axes[1, 1]
+    pd.Series(data['day_means'], index=data['days']).plot(kind='line', marker='o', ax=ax4, color='#9B59B6',
+                                                           linewidth=2, markersize=8)
+    ax4.set_title('Average Revenue by Day of Week', fontweight='bold', fontsize=14)
+    ax4.set_xlabel('Day', fontsize=11)
+    ax4.set_ylabel('Avg Revenue ($)', fontsize=11)
+    ax4.tick_params(axis='x', rotation=45)
+    ax4.grid(alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+CHART_TYPES = {
+    'revenue_by_region': draw_revenue_by_region,
+    'revenue_by_product': draw_revenue_by_product,
+    'region_distribution': draw_region_distribution,
+    'sales_forecast': draw_sales_forecast,
+    'revenue_trend': draw_revenue_trend,
+    'advanced_dashboard': draw_advanced_dashboard,
+}
+
+
+# ---- Rendering -------------------------------------------------------------
+
+def chart_hash(chart_type, data):
+    """Fingerprint of everything that decides what a chart looks like."""
+    text = json.dumps({'type': chart_type, 'version': RENDER_VERSION, 'data': data},
+                      sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _worker_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _draw(job):
+    chart_type, data, filename = job
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    CHART_TYPES[chart_type](data, filename)
+    return filename, time.perf_counter() - start, time.process_time() - cpu_start, os.getpid()
+
+
+def _read_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def render_charts(charts, folder=CHART_FOLDER, workers=None):
+    """Draw every chart whose data changed since its PNG was last saved.
+
+    ``charts`` is a list of (file name, chart type, data dict) entries, where
+    the data only holds plain numbers, strings and lists. Returns two lists
+    of file paths: (drawn, skipped). ``workers=0`` draws in this process.
+    """
+    os.makedirs(folder, exist_ok=True)
+    manifest = _read_manifest(folder)
+
+    jobs, skipped, hashes = [], [], {}
+    for name, chart_type, data in charts:
+        filename = os.path.join(folder, name)
+        hashes[name] = chart_hash(chart_type, data)
+        if manifest.get(name) == hashes[name] and os.path.exists(filename):
+            skipped.append(filename)
+        else:
+            jobs.append((chart_type, data, filename))
+
+    if not jobs:
+        return [], skipped
+
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    started = time.perf_counter()
+    if workers == 0:
+        results = [_draw(job) for job in jobs]
+    else:
+        # Workers are forked from a clean single-threaded server process
+        # (started fresh where forkserver isn't available). Forking this
+        # process directly can hang: run_pipeline.py calls us from a thread,
+        # and another thread may be holding a lock at that moment.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context()) as pool:
+            results = list(pool.map(_draw, jobs))
+
+    drawn = []
+    for filename, seconds, cpu_seconds, pid in results:
+        # Worker clocks can't be lined up with ours, so each chart is shown
+        # as starting when rendering started, on its worker's own row
+        profiling.record(f'savefig {os.path.basename(filename)}', started, seconds, cpu_seconds, pid=pid, tid=pid)
+        drawn.append(filename)
+
+    # Re-read so charts recorded by another script in the meantime are kept
+    manifest = _read_manifest(folder)
+    for chart_type, data, filename in jobs:
+        name = os.path.basename(filename)
+        manifest[name] = hashes[name]
+    _write_manifest(folder, manifest)
+    return drawn, skipped
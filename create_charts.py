@@ -1,75 +1,85 @@
 # This program creates visual charts from our sales data
 # Visualization = Turning numbers into pictures!
 
-import pandas as pd
-import matplotlib.pyplot as plt
-
-print("📊 Creating visualizations...")
-
-# Load data
-df = pd.read_excel('sales_data.xlsx')
-
-# Create folder for charts
-import os
-os.makedirs('charts', exist_ok=True)
-
-# CHART 1: Revenue by Region
-print("\n📊 Creating Chart 1: Revenue by Region...")
-
-region_sales = df.groupby('Region')['Revenue'].sum().sort_values(ascending=False)
-
-plt.figure(figsize=(10, 6))  # Size of chart
-plt.bar(region_sales.index, region_sales.values, color=['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A'])
-plt.title('Revenue by Region', fontsize=16, fontweight='bold')
-plt.xlabel('Region', fontsize=12)
-plt.ylabel('Revenue ($)', fontsize=12)
-plt.grid(axis='y', alpha=0.3)
-
-# Add value labels on bars
-for i, v in enumerate(region_sales.values):
-    plt.text(i, v, f'${v:,.0f}', ha='center', va='bottom', fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('charts/revenue_by_region.png', dpi=300, bbox_inches='tight')
-print("   ✅ Saved: charts/revenue_by_region.png")
-plt.close()
-
-# CHART 2: Revenue by Product
-print("\n📊 Creating Chart 2: Revenue by Product...")
-
-product_sales = df.groupby('Product')['Revenue'].sum().sort_values(ascending=False)
-
-plt.figure(figsize=(14, 7))  # Bigger size
-plt.barh(product_sales.index, product_sales.values, color='#4ECDC4')
-plt.title('Revenue by Product', fontsize=16, fontweight='bold', pad=20)
-plt.xlabel('Revenue ($)', fontsize=12)
-plt.ylabel('Product', fontsize=12)
-plt.grid(axis='x', alpha=0.3)
-
-# Add value labels INSIDE the bars (on the right)
-for i, v in enumerate(product_sales.values):
-    plt.text(v - 8000, i, f'${v:,.0f}', va='center', ha='right', fontweight='bold', color='white', fontsize=11)
-
-# Add more space on the right
-plt.xlim(0, product_sales.max() * 1.1)  # 10% extra space
-
-plt.tight_layout()
-plt.savefig('charts/revenue_by_product.png', dpi=300, bbox_inches='tight')
-print("   ✅ Saved: charts/revenue_by_product.png")
-plt.close() 
-
-# CHART 3: Region Distribution (Pie Chart)
-print("\n📊 Creating Chart 3: Regional Distribution...")
-
-plt.figure(figsize=(10, 8))
-colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
-plt.pie(region_sales.values, labels=region_sales.index, autopct='%1.1f%%', 
-        colors=colors, startangle=90, textprops={'fontsize': 12, 'fontweight': 'bold'})
-plt.title('Sales Distribution by Region', fontsize=16, fontweight='bold')
-plt.tight_layout()
-plt.savefig('charts/region_distribution.png', dpi=300, bbox_inches='tight')
-print("   ✅ Saved: charts/region_distribution.png")
-plt.close()
-
-print("\n✅ All charts created successfully!")
-print("📁 Check the 'charts' folder to see your visualizations!")
\ No newline at end of file
+import argparse
+
+import profiling
+from data_loader import NoOrdersError, add_input_arguments, input_filters, load_sales_data
+from aggregations import build_sales_cube
+from chart_renderer import render_charts
+from timeseries import time_series
+
+parser = argparse.ArgumentParser(description='Create the sales charts in charts/')
+parser.add_argument('--profile', action='store_true', help='record step timings to PROFILE.json')
+add_input_arguments(parser)
+
+
+def main(argv=None, df=None, cube=None):
+    """Run the chart creation.
+
+    ``df`` / ``cube`` let the pipeline runner pass in data it already loaded.
+    """
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiling.enable()
+    steps = profiling.Steps('create_charts')
+
+    print("📊 Creating visualizations...")
+
+    # Load data
+    steps.next('Load data')
+    if cube is None:
+        if df is None:
+            df = load_sales_data(args.input, **input_filters(args))
+        cube = build_sales_cube(df)
+
+    # Work out the numbers each chart shows. The charts themselves are drawn by
+    # chart_renderer - in parallel, and only when these numbers have changed.
+    steps.next('Render charts')
+    region_sales = cube.rollup('Region')['Revenue'].sort_values(ascending=False)
+    product_sales = cube.rollup('Product')['Revenue'].sort_values(ascending=False)
+
+    region_data = {'labels': list(region_sales.index), 'values': region_sales.tolist()}
+    product_data = {'labels': list(product_sales.index), 'values': product_sales.tolist()}
+
+    # Day by day on a gap-free calendar (days without orders count as $0)
+    daily = time_series(cube, 'D', 'Region')
+    total = daily.total()
+    trend_data = {
+        'dates': [str(day) for day in daily.periods],
+        'revenue': total.series('Revenue')[0].tolist(),
+        'average_7': total.moving_average('Revenue', 7)[0].tolist(),
+        'average_30': total.moving_average('Revenue', 30)[0].tolist(),
+        'cumulative': {str(region): running.tolist()
+                       for region, running in zip(daily.segments, daily.cumulative('Revenue'))},
+    }
+
+    charts = [
+        # CHART 1: Revenue by Region
+        ('revenue_by_region.png', 'revenue_by_region', region_data),
+        # CHART 2: Revenue by Product
+        ('revenue_by_product.png', 'revenue_by_product', product_data),
+        # CHART 3: Region Distribution (Pie Chart)
+        ('region_distribution.png', 'region_distribution', region_data),
+        # CHART 4: Revenue Trend (moving averages + running totals)
+        ('revenue_trend.png', 'revenue_trend', trend_data),
+    ]
+
+    print("\n📊 Drawing charts: Revenue by Region, Revenue by Product, Regional Distribution, Revenue Trend...")
+    drawn, skipped = render_charts(charts)
+
+    for filename in drawn:
+        print(f"   ✅ Saved: {filename}")
+    for filename in skipped:
+        print(f"   ⏭️  Unchanged: {filename}")
+
+    print("\n✅ All charts created successfully!")
+    print("📁 Check the 'charts' folder to see your visualizations!")
+    steps.done()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except NoOrdersError as error:
+        parser.error(str(error))
\ No newline at end of file
@@ -0,0 +1,358 @@
+# Shared data loader - every script gets its sales data from here
+# Reading Excel is SLOW, so the first time we read sales_data.xlsx we save a
+# fast columnar copy (Parquet) in the .sales_cache folder. Later runs read that
+# copy instead, as long as the Excel file hasn't changed.
+#
+# The path can also be a folder of partitioned files (see partitions.py), and
+# --start/--end/--region filters make sure only the orders we need are loaded.
+# Orders are validated as they are read (see validation.py): broken ones are
+# set aside in a quarantine file, so the cache only ever holds good orders.
+
+import hashlib
+import importlib.util
+import json
+import os
+
+import pandas as pd
+
+from partitions import add_partition_columns, filter_sales, list_partitions, prune_partitions
+from profiling import span
+from schema import CATEGORY_COLUMNS, MONEY_DTYPE, apply_schema, memory_footprint, print_footprint
+from validation import OUTLIER_Z, print_problems, validate_sales, write_problems
+
+SOURCE_FILE = 'sales_data.xlsx'
+CACHE_DIR = '.sales_cache'
+
+# Bump this whenever the way we convert the data changes, so old caches are rebuilt
+CACHE_VERSION = 4
+
+# --stream / --backend choices. They are kept here (not in streaming.py and
+# sql_backend.py) so a script can offer the options without importing those
+# modules until they are actually used
+DEFAULT_MAX_MEMORY_MB = 256
+ENGINES = ['sqlite', 'duckdb']
+BACKENDS = ['pandas'] + ENGINES
+
+
+class NoOrdersError(ValueError):
+    """The input has no orders, or none that match the --start/--end/--region filters."""
+
+    def __init__(self, path, start=None, end=None, regions=None):
+        filters = _filter_text(start, end, regions)
+        super().__init__(f"no orders in {path} match the filters ({filters})" if filters
+                         else f"no orders in {path}")
+
+
+def _cache_format():
+    """Use Parquet when pyarrow is installed, otherwise fall back to pickle."""
+    if importlib.util.find_spec('pyarrow') is not None:
+        return 'parquet'
+    return 'pickle'
+
+
+def cache_file(path, suffix, create=True):
+    """Path of a helper file kept next to the cache, e.g. cache_file(path, 'state.json')."""
+    folder = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    if create:
+        os.makedirs(folder, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path.rstrip('/\\')))[0]
+    return os.path.join(folder, f'{name}.{suffix}')
+
+
+def frame_file(path, name):
+    """Path for a saved table in the cache folder, e.g. frame_file(path, 'aggregates')."""
+    extension = 'parquet' if _cache_format() == 'parquet' else 'pkl'
+    return cache_file(path, f'{name}.{extension}' if name else extension)
+
+
+def write_frame(df, file):
+    """Save a table in the cache format (written to a temp file first)."""
+    temp_file = file + '.tmp'
+    if _cache_format() == 'parquet':
+        df.to_parquet(temp_file, index=False)
+    else:
+        df.to_pickle(temp_file)
+    os.replace(temp_file, file)
+
+
+def read_frame(file):
+    if _cache_format() == 'parquet':
+        return pd.read_parquet(file)
+    return pd.read_pickle(file)
+
+
+def _cache_paths(path):
+    return frame_file(path, None), cache_file(path, 'meta.json')
+
+
+def file_hash(path):
+    """SHA-256 of a file, read in 1 MB blocks so big files don't fill memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """A 64-bit hash of every row of ``df`` (all columns), as a NumPy array.
+
+    Adding them up gives one number for a set of rows that changes when any
+    value in any of them does, whatever order the rows are in.
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def prepare_types(df):
+    """Give the raw columns their compact types (see schema.py)."""
+    with span('apply schema', rows=len(df)):
+        return apply_schema(df)
+
+
+def read_raw(path):
+    """Read the original file exactly as stored, without converting any types."""
+    with span(f'read {os.path.basename(path)}') as timer:
+        if path.endswith('.csv'):
+            df = pd.read_csv(path)
+        elif path.endswith('.parquet'):
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_excel(path)
+        timer.rows = len(df)
+    return df
+
+
+def quarantine_file(path, create=True):
+    """CSV file where the orders of ``path`` that failed validation are kept."""
+    return cache_file(path, 'quarantine.csv', create)
+
+
+def save_problems(path, problems, append=False):
+    """Write the quarantined/flagged orders of ``path`` (an empty table removes an old file)."""
+    if len(problems):
+        write_problems(problems, quarantine_file(path), append)
+    elif not append and os.path.exists(quarantine_file(path, create=False)):
+        os.remove(quarantine_file(path, create=False))
+
+
+def _read_validated(path):
+    """Read the original file, set broken orders aside and convert the types.
+
+    Returns (table, counts) - counts says how many orders broke which rule.
+    """
+    df = read_raw(path)
+    with span('validate', rows=len(df)):
+        df, problems, counts = validate_sales(df)
+    save_problems(path, problems)
+    if counts:
+        print_problems(os.path.relpath(path), counts, quarantine_file(path))
+    return prepare_types(df), counts
+
+
+def read_source(path):
+    """Read the original file without any caching (broken orders are set aside)."""
+    return _read_validated(path)[0]
+
+
+def read_json(meta_file):
+    """Read a small JSON file, or return None if it is missing or broken."""
+    try:
+        with open(meta_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(meta_file, meta):
+    """Write a small JSON file safely (a half-written file never replaces the old one)."""
+    temp_file = meta_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(temp_file, meta_file)
+
+
+def source_signature(path):
+    """Size, modification time and hash of a file - enough to spot any change.
+
+    For a partitioned folder these cover all of its sales files together.
+    """
+    if os.path.isdir(path):
+        digest = hashlib.sha256()
+        size = mtime_ns = 0
+        for file, _ in list_partitions(path):
+            stat = os.stat(file)
+            size += stat.st_size
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+            digest.update(os.path.relpath(file, path).encode() + file_hash(file).encode())
+        return {'size': size, 'mtime_ns': mtime_ns, 'sha256': digest.hexdigest()}
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_hash(path)}
+
+
+def source_unchanged(path, recorded):
+    """Is the file still the one described by ``recorded`` (a source_signature)?
+
+    Size and modification time are checked first because that is instant.
+    If they changed we compare the SHA-256 hash, so simply touching the file
+    (or copying it) doesn't count as a change. The new timestamp is written
+    back into ``recorded`` so the next check is instant again.
+    """
+    if os.path.isdir(path):
+        current = source_signature(path)
+        if recorded.get('size') != current['size'] or recorded.get('sha256') != current['sha256']:
+            return False
+        recorded['mtime_ns'] = current['mtime_ns']
+        return True
+    stat = os.stat(path)
+    if recorded.get('size') == stat.st_size and recorded.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if recorded.get('size') != stat.st_size or recorded.get('sha256') != file_hash(path):
+        return False
+    recorded['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+
+def cache_is_fresh(path):
+    """Check the cache against the source file."""
+    data_file, meta_file = _cache_paths(path)
+    meta = read_json(meta_file)
+    if meta is None or not os.path.exists(data_file):
+        return False
+    if meta.get('version') != CACHE_VERSION or meta.get('format') != _cache_format():
+        return False
+    if meta.get('money_dtype') != MONEY_DTYPE or meta.get('outlier_z') != OUTLIER_Z:
+        return False
+
+    old_mtime = meta.get('mtime_ns')
+    if not source_unchanged(path, meta):
+        return False
+    if meta['mtime_ns'] != old_mtime:
+        write_json(meta_file, meta)
+    return True
+
+
+def build_cache(path):
+    """Parse the source file once and save the typed columnar copy."""
+    data_file, meta_file = _cache_paths(path)
+
+    df, problems = _read_validated(path)
+
+    write_frame(df, data_file)
+
+    write_json(meta_file, {
+        'version': CACHE_VERSION,
+        'format': _cache_format(),
+        'money_dtype': MONEY_DTYPE,
+        'outlier_z': OUTLIER_Z,
+        'problems': problems,
+        'source': os.path.basename(path),
+        **source_signature(path),
+        'rows': len(df),
+    })
+    return df
+
+
+def _load_partitioned(root, use_cache, start, end, regions):
+    """Read only the partition files that can match the filters."""
+    files = prune_partitions(root, start, end, regions)
+    if not files:
+        raise NoOrdersError(root, start, end, regions)
+    with span(f'read {len(files)} partitions') as timer:
+        # Parquet parts are already fast to read, so only Excel/CSV parts are cached
+        frames = [add_partition_columns(load_sales_data(file, use_cache and not file.endswith('.parquet')), keys)
+                  for file, keys in files]
+        df = pd.concat(frames, ignore_index=True)
+        for column in CATEGORY_COLUMNS:
+            # Every part has its own categories - line them up again
+            df[column] = df[column].astype(str).astype('category')
+        if 'Customer_ID' in df.columns and not pd.api.types.is_numeric_dtype(df['Customer_ID']):
+            df['Customer_ID'] = df['Customer_ID'].astype('category')
+        timer.rows = len(df)
+    return df
+
+
+def load_sales_data(path=SOURCE_FILE, use_cache=True, start=None, end=None, regions=None):
+    """Load the sales table, using the columnar cache whenever it is up to date.
+
+    ``path`` can be a file or a folder of partitioned files. ``start`` and
+    ``end`` (whole days, inclusive) and ``regions`` keep only those orders; for
+    a folder, partitions outside them are not even read. Raises NoOrdersError
+    if no orders are left.
+    """
+    if os.path.isdir(path):
+        df = _load_partitioned(path, use_cache, start, end, regions)
+    elif not use_cache:
+        df = read_source(path)
+    elif not cache_is_fresh(path):
+        df = build_cache(path)
+    else:
+        data_file, meta_file = _cache_paths(path)
+        with span('read cache') as timer:
+            df = read_frame(data_file)
+            timer.rows = len(df)
+        # Remind about orders set aside when the cache was built
+        problems = read_json(meta_file).get('problems')
+        if problems:
+            print_problems(os.path.relpath(path), problems, quarantine_file(path))
+    df = filter_sales(df, start, end, regions)
+    if len(df) == 0:
+        raise NoOrdersError(path, start, end, regions)
+    return df
+
+
+def _region_list(text):
+    return [region.strip() for region in text.split(',') if region.strip()]
+
+
+def add_input_arguments(parser):
+    """The --input/--start/--end/--region options shared by the scripts."""
+    parser.add_argument('--input', default=SOURCE_FILE,
+                        help='sales file (.xlsx, .csv or .parquet) or folder of partitioned files')
+    parser.add_argument('--start', type=pd.Timestamp, help='only orders on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=pd.Timestamp, help='only orders on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--region', type=_region_list, help='only these regions, e.g. North,South')
+
+
+def engine_available(engine):
+    """sqlite3 comes with Python; DuckDB has to be installed separately."""
+    if engine == 'duckdb':
+        return importlib.util.find_spec('duckdb') is not None
+    return True
+
+
+def input_filters(args):
+    """The date/region filters from add_input_arguments(), as load_sales_data() keywords."""
+    return {'start': args.start, 'end': args.end, 'regions': args.region}
+
+
+def _filter_text(start=None, end=None, regions=None):
+    parts = []
+    if start is not None or end is not None:
+        first = start.date() if start is not None else 'start'
+        last = end.date() if end is not None else 'end'
+        parts.append(f'{first} to {last}')
+    if regions:
+        parts.append(', '.join(regions))
+    return ', '.join(parts)
+
+
+def describe_filters(args):
+    """' (2024-07-01 to 2024-09-30, North)' for the filters in use, '' if there are none."""
+    text = _filter_text(args.start, args.end, args.region)
+    return f" ({text})" if text else ''
+
+
+if __name__ == '__main__':
+    # Run this file directly to (re)build the cache ahead of time
+    import time
+
+    start = time.perf_counter()
+    if cache_is_fresh(SOURCE_FILE):
+        print(f"✅ Cache for {SOURCE_FILE} is already up to date")
+    else:
+        df = build_cache(SOURCE_FILE)
+        print(f"✅ Cached {len(df)} records from {SOURCE_FILE}")
+    print(f"⏱️  {time.perf_counter() - start:.2f} seconds")
+
+    # Show how much smaller the typed table is than the file as read
+    print_footprint(load_sales_data(SOURCE_FILE), before=memory_footprint(read_raw(SOURCE_FILE)))
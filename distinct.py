@@ -0,0 +1,306 @@
+# Distinct counts - how many different customers are behind the totals
+# Sums can be added up piece by piece, distinct counts can't: the same customer
+# may order in two chunks, two regions or two months. So the customers are kept
+# per Region x Product x month, in one of two forms:
+#
+#   exact    every different customer once per Region x Product x month, as a
+#            64-bit hash of its ID. Counting for any grouping turns every
+#            (group, hash) pair into one integer code and counts the different codes.
+#   sketch   a HyperLogLog sketch per Region x Product x month: 2,048 one-byte
+#            registers that estimate the count to about 2%, however many
+#            customers there are. Two sketches merge by keeping the larger
+#            value of every register.
+#
+# Both merge across chunks, partitions and incremental runs (merge_distinct()),
+# so --stream and --incremental reports count customers too; the sketch never
+# needs more than 2 KB per Region x Product x month.
+# Distinct days need none of this: every cube cell is one day, so they are
+# counted straight from the cube (SalesCube.distinct_days()).
+
+import numpy as np
+import pandas as pd
+
+from calendar_dim import key_codes
+
+CUSTOMER_COLUMN = 'Customer_ID'
+DISTINCT_MODES = ['exact', 'sketch']
+
+KEYS = ['Region', 'Product', 'YearMonth']
+
+# Calendar keys that are the same on every day of a month, so they can be
+# worked out from the month alone
+MONTH_KEYS = ['Year', 'Month', 'Month_Name', 'Quarter', 'YearMonth', 'YearQuarter',
+              'Fiscal_Year', 'Fiscal_Quarter', 'Fiscal_Period']
+
+# 2 ** 11 registers per sketch: typical error 1.04 / sqrt(2048) = 2.3%
+SKETCH_PRECISION = 11
+SKETCH_REGISTERS = 2 ** SKETCH_PRECISION
+
+
+def hash_values(column):
+    """(numbers, hashes): every value as a number into ``hashes`` (-1 where it is missing).
+
+    ``hashes`` are 64-bit hashes of the different values. The same ID always
+    gets the same hash - as text or as a category, in any chunk or file - so
+    hashes from different pieces of the data can be mixed.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Already numbered: only the categories need hashing
+        return column.cat.codes.to_numpy(), pd.util.hash_array(np.asarray(column.cat.categories))
+    values = np.asarray(column)
+    if values.dtype.kind == 'f':
+        # Missing values turn whole-number IDs into floats - number them as integers
+        present = ~np.isnan(values)
+        numbers, uniques = pd.factorize(np.where(present, values, 0).astype('int64'))
+        return np.where(present, numbers, -1), pd.util.hash_array(uniques)
+    numbers, uniques = pd.factorize(values)
+    return numbers, pd.util.hash_array(np.asarray(uniques))
+
+
+def _bit_length(values):
+    """Bits needed to write every uint64 in ``values`` (0 for 0), without a Python loop."""
+    high = (values >> 32).astype('float64')
+    low = (values & 0xFFFFFFFF).astype('float64')
+    # frexp(x) = (m, e) with x = m * 2**e and 0.5 <= m < 1, so e is the bit length
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+def _sketch(groups, hashes, size):
+    """HyperLogLog registers (size x SKETCH_REGISTERS) for hashes in group numbers ``groups``."""
+    # The first bits pick the register, the rest give the rank: 1 + the
+    # number of leading zero bits, which reaches k about once per 2 ** k IDs
+    rest_bits = 64 - SKETCH_PRECISION
+    register = (hashes >> rest_bits).astype('int64')
+    rank = rest_bits - _bit_length(hashes & ((1 << rest_bits) - 1)) + 1
+    registers = np.zeros(size * SKETCH_REGISTERS, dtype='uint8')
+    np.maximum.at(registers, groups * SKETCH_REGISTERS + register, rank.astype('uint8'))
+    return registers.reshape(size, SKETCH_REGISTERS)
+
+
+def estimate(registers):
+    """Estimated number of different values for every row of sketch registers."""
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.exp2(-registers.astype('float64')).sum(axis=1)
+    # Few values: most registers are still empty, and counting those is more accurate
+    empty = (registers == 0).sum(axis=1)
+    small = m * np.log(m / np.maximum(empty, 1))
+    return np.where((raw <= 2.5 * m) & (empty > 0), small, raw)
+
+
+def _unique_pairs(groups, numbers, uniques):
+    """Every (group, value) pair once, sorted by group: (groups, values).
+
+    The values are given as ``numbers`` into ``uniques``, so each pair is one
+    integer code (group x number of values + value number); only the
+    different codes are sorted, not every order.
+    """
+    size = max(len(uniques), 1)
+    codes = pd.unique(groups.astype('int64') * size + numbers)
+    codes.sort()
+    return codes // size, uniques[codes % size]
+
+
+class DistinctCounter:
+    """Different values of one column (e.g. Customer_ID) per Region x Product x month.
+
+    ``keys`` has one row per Region x Product x month (YearMonth is a month
+    number, like a pandas Period ordinal). In exact mode ``groups`` and
+    ``values`` hold every (key row, value hash) pair once, in key row order;
+    in sketch mode ``registers`` holds one HyperLogLog sketch per key row.
+    """
+
+    def __init__(self, keys, groups=None, values=None, registers=None):
+        self.keys = keys.reset_index(drop=True)
+        self.groups = groups
+        self.values = values
+        self.registers = registers
+
+    @property
+    def mode(self):
+        return 'exact' if self.registers is None else 'sketch'
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _count(self, rows, size):
+        """Different values for each of ``size`` groups; ``rows`` maps key rows to groups."""
+        if self.registers is not None:
+            merged = np.zeros((size, SKETCH_REGISTERS), dtype='uint8')
+            np.maximum.at(merged, rows, self.registers)
+            return np.rint(estimate(merged)).astype('int64')
+        groups, _ = _unique_pairs(rows[self.groups], *pd.factorize(self.values))
+        return np.bincount(groups, minlength=size)
+
+    def count(self, by=None):
+        """Different values in total (a number), or per key / list of keys (a Series sorted by key).
+
+        Any of Region, Product and the calendar keys that don't change within
+        a month (YearMonth, Month_Name, Quarter, Year...) can be used.
+        """
+        rows, index = key_groups(self.keys, by)
+        counts = self._count(rows, 1 if index is None else len(index))
+        return int(counts[0]) if index is None else pd.Series(counts, index=index)
+
+    def sketched(self):
+        """The same counter in sketch mode (exact counts keep every hash, so they can be sketched)."""
+        if self.registers is not None:
+            return self
+        return DistinctCounter(self.keys, registers=_sketch(self.groups, self.values, len(self.keys)))
+
+    def where(self, name, value):
+        """Only the key rows where ``name`` (Region or Product) is ``value``."""
+        keep = (self.keys[name] == value).to_numpy()
+        if self.registers is not None:
+            return DistinctCounter(self.keys[keep], registers=self.registers[keep])
+        new_rows = np.cumsum(keep) - 1
+        pairs = keep[self.groups]
+        return DistinctCounter(self.keys[keep], new_rows[self.groups[pairs]], self.values[pairs])
+
+    # ---- Saving ---------------------------------------------------------------
+
+    def to_frame(self):
+        """A table that can be saved with data_loader.write_frame()."""
+        if self.registers is not None:
+            frame = self.keys.copy()
+            frame['Sketch'] = [row.tobytes() for row in self.registers]
+            return frame
+        frame = self.keys.take(self.groups).reset_index(drop=True)
+        frame['Value'] = self.values
+        return frame.astype({'Region': 'category', 'Product': 'category'})
+
+    @classmethod
+    def from_frame(cls, frame):
+        """The other way round."""
+        if 'Sketch' in frame.columns:
+            registers = np.frombuffer(b''.join(frame['Sketch']), dtype='uint8')
+            return cls(plain_keys(frame), registers=registers.reshape(len(frame), -1).copy())
+        keys, groups = saved_groups(frame)
+        return cls(keys, groups, frame['Value'].to_numpy(dtype='uint64'))
+
+
+# ---- Region x Product x month keys (shared with quantiles.py) ----------------
+
+def plain_keys(frame):
+    """The Region/Product/YearMonth columns of ``frame`` as plain text and month numbers."""
+    return pd.DataFrame({'Region': frame['Region'].astype(str), 'Product': frame['Product'].astype(str),
+                         'YearMonth': frame['YearMonth'].to_numpy(dtype='int64')})
+
+
+def saved_groups(frame):
+    """(keys, groups) for a saved table with one row per value, in key order.
+
+    A new key row starts wherever the Region/Product/YearMonth columns change.
+    """
+    keys = plain_keys(frame)
+    changed = np.zeros(len(frame), dtype=bool)
+    changed[:1] = True
+    for column in KEYS:
+        values = keys[column].to_numpy()
+        changed[1:] |= values[1:] != values[:-1]
+    return keys[changed], np.cumsum(changed) - 1
+
+
+def month_keys(df, present=None):
+    """(keys, groups): one key row per Region x Product x month in ``df``, and each order's row.
+
+    Only the orders where ``present`` is True are used (all of them by default).
+    """
+    region_codes, regions = pd.factorize(df['Region'])
+    product_codes, products = pd.factorize(df['Product'])
+    months = np.asarray(df['Date'], dtype='datetime64[M]').astype('int64')
+    first_month = int(months.min()) if len(months) else 0
+
+    shape = (len(regions), len(products), int(months.max()) - first_month + 1 if len(months) else 1)
+    rows = np.ravel_multi_index((region_codes, product_codes, months - first_month), shape)
+    if present is not None:
+        rows = rows[present]
+    # One key row per Region x Product x month combination that occurs
+    present_rows = np.flatnonzero(np.bincount(rows, minlength=int(np.prod(shape))))
+    key_row = np.zeros(int(np.prod(shape)), dtype='int64')
+    key_row[present_rows] = np.arange(len(present_rows))
+    region, product, month = np.unravel_index(present_rows, shape)
+    keys = pd.DataFrame({
+        'Region': np.asarray(regions, dtype=object)[region].astype(str),
+        'Product': np.asarray(products, dtype=object)[product].astype(str),
+        'YearMonth': month + first_month,
+    })
+    return keys, key_row[rows]
+
+
+def _key_codes(keys, name):
+    """(codes, labels) for one grouping key, one code per key row."""
+    if name in ('Region', 'Product'):
+        codes, uniques = pd.factorize(keys[name], sort=True)
+        return codes, pd.Index(uniques, name=name)
+    if name in MONTH_KEYS:
+        first_days = keys['YearMonth'].to_numpy(dtype='int64').astype('datetime64[M]')
+        return key_codes(first_days.astype('datetime64[D]').astype('int64'), name)
+    raise KeyError(f"Counts are kept per Region, Product and month - not by {name}")
+
+
+def key_groups(keys, by):
+    """(rows, index): the group of every key row for ``by``, and what each group is.
+
+    ``by`` is a key or list of keys: Region, Product or a calendar key that
+    doesn't change within a month (YearMonth, Month_Name, Quarter, Year...).
+    With ``by=None`` every row is in group 0 and ``index`` is None.
+    """
+    if by is None:
+        return np.zeros(len(keys), dtype='int64'), None
+    names = [by] if isinstance(by, str) else list(by)
+    coded = [_key_codes(keys, name) for name in names]
+    labels = [key_labels for _, key_labels in coded]
+    shape = tuple(len(key_labels) for key_labels in labels)
+    rows = np.ravel_multi_index([codes for codes, _ in coded], shape)
+    present, rows = np.unique(rows, return_inverse=True)
+    if len(labels) == 1:
+        return rows, labels[0].take(present)
+    return rows, pd.MultiIndex(levels=labels, codes=np.unravel_index(present, shape),
+                               names=names).remove_unused_levels()
+
+
+def align_keys(key_frames):
+    """(keys, rows): all key rows of several counters once, and where each counter's rows went."""
+    all_keys = pd.concat(key_frames, ignore_index=True)
+    keys = all_keys.drop_duplicates().sort_values(KEYS).reset_index(drop=True)
+    index = pd.MultiIndex.from_frame(keys)
+    return keys, [index.get_indexer(pd.MultiIndex.from_frame(frame)) for frame in key_frames]
+
+
+# ---- Building and merging -----------------------------------------------------
+
+def build_distinct(df, column=CUSTOMER_COLUMN, mode='exact', hashed=False):
+    """Count the different values of ``column`` per Region x Product x month of ``df``.
+
+    With ``hashed=True`` the column already holds the 64-bit hash of every
+    value (see hash_values()), as the SQL backend stores them.
+    """
+    if mode not in DISTINCT_MODES:
+        raise ValueError(f"Unknown distinct count mode: {mode} (use one of {', '.join(DISTINCT_MODES)})")
+    if hashed:
+        numbers, hashes = pd.factorize(df[column].to_numpy(dtype='uint64'))
+    else:
+        numbers, hashes = hash_values(df[column])
+    present = numbers >= 0
+    keys, groups = month_keys(df, present)
+    if mode == 'sketch':
+        return DistinctCounter(keys, registers=_sketch(groups, hashes[numbers[present]], len(keys)))
+    return DistinctCounter(keys, *_unique_pairs(groups, numbers[present], hashes))
+
+
+def merge_distinct(*counters):
+    """Combine counters built from different parts of the data (all in the same mode)."""
+    modes = {counter.mode for counter in counters}
+    if len(modes) > 1:
+        raise ValueError("Can't merge exact distinct counts with sketches")
+    keys, rows = align_keys([counter.keys for counter in counters])
+
+    if modes == {'sketch'}:
+        registers = np.zeros((len(keys), SKETCH_REGISTERS), dtype='uint8')
+        for counter, counter_rows in zip(counters, rows):
+            registers[counter_rows] = np.maximum(registers[counter_rows], counter.registers)
+        return DistinctCounter(keys, registers=registers)
+    groups = np.concatenate([counter_rows[counter.groups] for counter, counter_rows in zip(counters, rows)])
+    values = np.concatenate([counter.values for counter in counters])
+    return DistinctCounter(keys, *_unique_pairs(groups, *pd.factorize(values)))
@@ -0,0 +1,79 @@
+# Forecast model cache - don't refit trend lines the data hasn't changed
+# A straight-line fit only needs five running sums per series (number of
+# months, Σx, Σy, Σx², Σxy). We save those sums in .sales_cache/ together
+# with a fingerprint of the monthly numbers they came from:
+#   - same monthly numbers as last time -> the saved sums are used as they are
+#   - the old months unchanged, new months appended -> only the new months
+#     are added to the sums
+#   - anything else (an old month changed, segments changed) -> fitted again
+# Either way the result is the same line a fresh fit would give.
+
+import hashlib
+
+import numpy as np
+
+from data_loader import cache_file, read_json, write_json
+from forecasting import add_trend_statistics, trend_statistics, trends_from_statistics
+
+# Bump this whenever the saved layout changes, so old models are refitted
+FORECAST_CACHE_VERSION = 1
+
+
+def series_fingerprint(values):
+    """SHA-256 of a (segments x months) array of monthly numbers."""
+    values = np.ascontiguousarray(values, dtype='float64')
+    digest = hashlib.sha256(str(values.shape).encode())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def _labels(items):
+    return [' × '.join(map(str, item)) if isinstance(item, tuple) else str(item) for item in items]
+
+
+class TrendCache:
+    """Saved trend-line statistics for one sales file, keyed by model name."""
+
+    def __init__(self, path):
+        self.file = cache_file(path, 'forecast.json')
+        saved = read_json(self.file) or {}
+        self.models = saved.get('models', {}) if saved.get('version') == FORECAST_CACHE_VERSION else {}
+        self.changed = False
+
+    def fit(self, name, segments, months, values):
+        """Trend lines for every row of ``values`` (segments x months).
+
+        Returns (slope, intercept, months_used, status) where status is
+        'reused', 'updated' or 'fitted' and tells how much work was done.
+        """
+        segments, months = _labels(segments), [str(month) for month in months]
+        saved = self.models.get(name)
+        known = len(saved['months']) if saved else 0
+
+        if (saved and saved['segments'] == segments and months[:known] == saved['months']
+                and series_fingerprint(values[:, :known]) == saved['fingerprint']):
+            stats = saved['stats']
+            if known == len(months):
+                status = 'reused'
+            else:
+                stats = add_trend_statistics(stats, values[:, known:])
+                status = 'updated'
+        else:
+            stats = trend_statistics(values)
+            status = 'fitted'
+
+        if status != 'reused':
+            self.models[name] = {
+                'segments': segments,
+                'months': months,
+                'fingerprint': series_fingerprint(values),
+                'stats': {key: np.asarray(value).tolist() for key, value in stats.items()},
+            }
+            self.changed = True
+        slope, intercept, months_used = trends_from_statistics(stats)
+        return slope, intercept, months_used, status
+
+    def save(self):
+        if self.changed:
+            write_json(self.file, {'version': FORECAST_CACHE_VERSION, 'models': self.models})
+            self.changed = False
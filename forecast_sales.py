@@ -1,146 +1,283 @@
 # Sales Forecasting - Predict future revenue!
 # This uses machine learning to predict next 3 months
 
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-
-print("🔮 SALES FORECASTING SYSTEM")
-print("=" * 60)
-
-# Load data
-df = pd.read_excel('sales_data.xlsx')
-df['Date'] = pd.to_datetime(df['Date'])
+import argparse
 
-# STEP 1: Aggregate sales by month
-print("\n📊 Analyzing monthly trends...")
-
-df['YearMonth'] = df['Date'].dt.to_period('M')
-monthly_sales = df.groupby('YearMonth')['Revenue'].sum().reset_index()
-monthly_sales['Month_Num'] = range(1, len(monthly_sales) + 1)
-
-print(f"✅ Analyzed {len(monthly_sales)} months of data")
+import numpy as np
 
-# STEP 2: Prepare data for machine learning
-# X = Month number (1, 2, 3, 4...)
-# y = Revenue for that month
-
-X = monthly_sales['Month_Num'].values.reshape(-1, 1)
-y = monthly_sales['Revenue'].values
-
-# STEP 3: Train the forecasting model
-print("\n🤖 Training forecasting model...")
-
-model = LinearRegression()
-model.fit(X, y)
-
-# Calculate accuracy
-predictions = model.predict(X)
-accuracy = model.score(X, y) * 100
-
-print(f"✅ Model trained successfully!")
-print(f"📈 Model Accuracy: {accuracy:.2f}%")
-
-# STEP 4: Predict next 3 months
-print("\n" + "=" * 60)
-print("🔮 SALES FORECAST - NEXT 3 MONTHS")
-print("=" * 60)
-
-last_month_num = monthly_sales['Month_Num'].max()
-future_months = np.array([[last_month_num + 1], 
-                          [last_month_num + 2], 
-                          [last_month_num + 3]])
-
-future_predictions = model.predict(future_months)
-
-# Get dates for future months
-last_date = df['Date'].max()
-future_dates = []
-for i in range(1, 4):
-    next_date = last_date + timedelta(days=30 * i)
-    future_dates.append(next_date.strftime('%B %Y'))
-
-print("\nPredicted Revenue:")
-for i, (date, revenue) in enumerate(zip(future_dates, future_predictions), 1):
-    print(f"   {i}. {date:15s}  ${revenue:>12,.2f}")
-
-total_predicted = future_predictions.sum()
-print(f"\n💰 Total Predicted (3 months): ${total_predicted:,.2f}")
-
-# STEP 5: Calculate growth rate
-current_total = monthly_sales['Revenue'].tail(3).sum()
-growth = ((total_predicted - current_total) / current_total) * 100
-
-print(f"📈 Projected Growth: {growth:+.2f}%")
-
-# STEP 6: Create visualization
-print("\n📊 Creating forecast visualization...")
-
-plt.figure(figsize=(14, 7))
-
-# Plot historical data
-plt.plot(monthly_sales['Month_Num'], monthly_sales['Revenue'], 
-         marker='o', linewidth=2, markersize=8, label='Actual Sales', color='#4ECDC4')
-
-# Plot trend line (what model learned)
-plt.plot(monthly_sales['Month_Num'], predictions, 
-         linestyle='--', linewidth=2, label='Trend', color='#FF6B6B', alpha=0.7)
-
-# Plot future predictions
-future_x = [last_month_num + 1, last_month_num + 2, last_month_num + 3]
-plt.plot(future_x, future_predictions, 
-         marker='s', markersize=10, linewidth=2, label='Forecast', 
-         color='#FFA07A', linestyle='--')
-
-# Add labels to forecast points
-for x, y, date in zip(future_x, future_predictions, future_dates):
-    plt.text(x, y, f'\n${y:,.0f}', ha='center', fontweight='bold', fontsize=10)
-
-plt.title('Sales Forecast - Historical & Predicted', fontsize=16, fontweight='bold')
-plt.xlabel('Month', fontsize=12)
-plt.ylabel('Revenue ($)', fontsize=12)
-plt.legend(fontsize=11)
-plt.grid(True, alpha=0.3)
-
-# Create output folder
-import os
-os.makedirs('charts', exist_ok=True)
-
-plt.tight_layout()
-plt.savefig('charts/sales_forecast.png', dpi=300, bbox_inches='tight')
-print("   ✅ Saved: charts/sales_forecast.png")
-plt.close()
-
-# STEP 7: Forecast by Region
-print("\n" + "=" * 60)
-print("🗺️  REGIONAL FORECASTS")
-print("=" * 60)
-
-for region in df['Region'].unique():
-    region_df = df[df['Region'] == region]
-    region_monthly = region_df.groupby('YearMonth')['Revenue'].sum().reset_index()
-    region_monthly['Month_Num'] = range(1, len(region_monthly) + 1)
-    
-    X_region = region_monthly['Month_Num'].values.reshape(-1, 1)
-    y_region = region_monthly['Revenue'].values
-    
-    model_region = LinearRegression()
-    model_region.fit(X_region, y_region)
-    
-    next_month_pred = model_region.predict([[len(region_monthly) + 1]])[0]
-    
-    print(f"\n{region:10s} → Next month predicted: ${next_month_pred:>12,.2f}")
-
-print("\n" + "=" * 60)
-print("✅ FORECASTING COMPLETE!")
-print("=" * 60)
-
-# Summary
-print("\n📋 SUMMARY:")
-print(f"   • Historical months analyzed: {len(monthly_sales)}")
-print(f"   • Model accuracy: {accuracy:.2f}%")
-print(f"   • Forecast period: 3 months")
-print(f"   • Projected revenue: ${total_predicted:,.2f}")
-print(f"   • Growth trend: {growth:+.2f}%")
\ No newline at end of file
+import profiling
+from data_loader import NoOrdersError, add_input_arguments, describe_filters, input_filters, load_sales_data
+from aggregations import build_sales_cube
+from chart_renderer import render_charts
+from forecasting import (segment_month_matrix, fit_segments, sklearn_linear_trends, predict_next,
+                         r_squared, future_months, FORECAST_MODELS, backtest, best_models, forecast_best)
+from forecast_cache import TrendCache
+
+parser = argparse.ArgumentParser(description='Sales forecasting')
+parser.add_argument('--profile', action='store_true', help='record step timings to PROFILE.json')
+add_input_arguments(parser)
+parser.add_argument('--segment', default='Region',
+                    help='what to forecast separately in STEP 7, e.g. Region, Product or Region,Product')
+parser.add_argument('--model', choices=['batched', 'sklearn'], default='batched',
+                    help='batched NumPy fit (fast) or one scikit-learn model per segment')
+parser.add_argument('--method', choices=list(FORECAST_MODELS) + ['best'], default='linear',
+                    help="forecasting model; 'best' picks the model that backtests best for each segment")
+parser.add_argument('--backtest', action='store_true',
+                    help='replay the history to compare every model on every segment (STEP 8)')
+parser.add_argument('--workers', type=int, default=1,
+                    help='processes for the per-segment fits with --model sklearn')
+parser.add_argument('--no-charts', action='store_true', help='text only - skip the forecast chart')
+parser.add_argument('--refit', action='store_true', help='ignore the saved models and fit everything again')
+
+
+def _print_model_status(status):
+    # Freshly fitted models print nothing extra, like before there was a cache
+    if status == 'reused':
+        print("♻️  Monthly data unchanged - using the saved model")
+    elif status == 'updated':
+        print("♻️  New months added to the saved model")
+
+
+def _segment_label(segment):
+    return ' × '.join(segment) if isinstance(segment, tuple) else segment
+
+
+def _print_backtest(segments, errors, chosen):
+    """Mean absolute error of every model per segment (best one marked with *)."""
+    names = list(errors)
+
+    def cell(error, best=False):
+        text = '-' if np.isnan(error) else f"${error:,.0f}"
+        return f" {text:>14}{'*' if best else ' '}"
+
+    print(f"\n{'Segment':<22}" + ''.join(f" {name:>14} " for name in names))
+    for i, segment in enumerate(segments[:20]):
+        print(f"{_segment_label(segment)[:22]:<22}"
+              + ''.join(cell(errors[name][i], name == chosen[i]) for name in names))
+    if len(segments) > 20:
+        print(f"... and {len(segments) - 20} more segments")
+    print(f"{'Average':<22}" + ''.join(cell(errors[name][~np.isnan(errors[name])].mean()
+                                            if (~np.isnan(errors[name])).any() else np.nan)
+                                       for name in names))
+
+    print("\n🏆 Best model per segment:")
+    for name in names:
+        wins = int((chosen == name).sum())
+        if wins:
+            print(f"   • {name}: {wins} segment(s)")
+
+
+def main(argv=None, df=None, cube=None):
+    """Run the sales forecast.
+
+    ``df`` / ``cube`` let the pipeline runner pass in data it already loaded.
+    """
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiling.enable()
+    steps = profiling.Steps('forecast_sales')
+
+    print("🔮 SALES FORECASTING SYSTEM")
+    print("=" * 60)
+
+    # Load data
+    steps.next('Load data')
+    if cube is None:
+        if df is None:
+            df = load_sales_data(args.input, **input_filters(args))
+        cube = build_sales_cube(df)
+
+    # STEP 1: Aggregate sales by month
+    steps.next('STEP 1: Aggregate sales by month')
+    print("\n📊 Analyzing monthly trends...")
+
+    monthly_sales = cube.rollup('YearMonth')[['Revenue']].reset_index()
+    monthly_sales['Month_Num'] = range(1, len(monthly_sales) + 1)
+
+    print(f"✅ Analyzed {len(monthly_sales)} months of data")
+
+    # STEP 2: Prepare data for machine learning
+    # X = Month number (1, 2, 3, 4...)
+    # y = Revenue for that month
+    steps.next('STEP 2: Prepare data for machine learning')
+
+    X = monthly_sales['Month_Num'].values.reshape(-1, 1)
+    y = monthly_sales['Revenue'].values
+
+    # STEP 3: Train the forecasting model
+    steps.next('STEP 3: Train the forecasting model')
+    print("\n🤖 Training forecasting model...")
+
+    # Trend lines are saved in .sales_cache with a fingerprint of the monthly
+    # numbers, so an unchanged history isn't fitted again and new months are
+    # just added to the saved sums
+    trend_cache = TrendCache(args.input)
+    if args.refit:
+        trend_cache.models = {}
+    model_suffix = describe_filters(args)
+
+    if args.model == 'sklearn':
+        # scikit-learn takes over a second to import, so only load it when asked for
+        from sklearn.linear_model import LinearRegression
+        model = LinearRegression()
+        model.fit(X, y)
+        slope, intercept = model.coef_[0], model.intercept_
+    else:
+        slope, intercept, _, status = trend_cache.fit('overall' + model_suffix, ['Total'],
+                                                      monthly_sales['YearMonth'], y[np.newaxis, :].astype('float64'))
+        slope, intercept = slope[0], intercept[0]
+        _print_model_status(status)
+
+    # Calculate accuracy
+    predictions = intercept + slope * X[:, 0]
+    accuracy = r_squared(y, predictions) * 100
+
+    print(f"✅ Model trained successfully!")
+    if args.method == 'linear':
+        print(f"📈 Model Accuracy: {accuracy:.2f}%")
+    else:
+        print(f"📈 Linear trend R²: {accuracy:.2f}%")
+
+    # STEP 4: Predict next 3 months
+    steps.next('STEP 4: Predict next 3 months')
+    print("\n" + "=" * 60)
+    print("🔮 SALES FORECAST - NEXT 3 MONTHS")
+    print("=" * 60)
+
+    last_month_num = monthly_sales['Month_Num'].max()
+    future_month_nums = np.array([[last_month_num + 1], 
+                                  [last_month_num + 2], 
+                                  [last_month_num + 3]])
+
+    # The straight line from STEP 3, or one of the other models (--method).
+    # The R² above only describes the straight line, so the other models are
+    # judged by their backtest error instead
+    history_months = list(monthly_sales['YearMonth'])
+    history = y[np.newaxis, :].astype('float64')
+    backtest_error = None
+    if args.method == 'linear':
+        future_predictions = intercept + slope * future_month_nums[:, 0]
+    else:
+        history_errors = backtest(history, history_months)
+        if args.method == 'best':
+            method = best_models(history_errors)[0]
+            future_predictions = forecast_best(history, history_months, 3, history_errors)[0]
+            print(f"🧮 Forecast method: {method} (best in backtest)")
+        else:
+            method = args.method
+            future_predictions = FORECAST_MODELS[method](history, history_months, 3)[0]
+            print(f"🧮 Forecast method: {method}")
+        # The backtest needs a few months to fit on and one to check against
+        error = history_errors[method][0]
+        backtest_error = 'n/a (not enough history)' if np.isnan(error) else f"${error:,.2f} per month"
+        print(f"🎯 Backtest error ({method}): {backtest_error}")
+
+    # Names of the next 3 calendar months
+    future_dates = [month.strftime('%B %Y') for month in future_months(history_months[-1])]
+
+    print("\nPredicted Revenue:")
+    for i, (date, revenue) in enumerate(zip(future_dates, future_predictions), 1):
+        print(f"   {i}. {date:15s}  ${revenue:>12,.2f}")
+
+    total_predicted = future_predictions.sum()
+    print(f"\n💰 Total Predicted (3 months): ${total_predicted:,.2f}")
+
+    # STEP 5: Calculate growth rate
+    steps.next('STEP 5: Calculate growth rate')
+    current_total = monthly_sales['Revenue'].tail(3).sum()
+    growth = ((total_predicted - current_total) / current_total) * 100
+
+    print(f"📈 Projected Growth: {growth:+.2f}%")
+
+    # STEP 6: Create visualization
+    steps.next('STEP 6: Create visualization')
+    print("\n📊 Creating forecast visualization...")
+
+    future_x = [last_month_num + 1, last_month_num + 2, last_month_num + 3]
+    forecast_chart = {
+        'months': monthly_sales['Month_Num'].tolist(),
+        'revenue': monthly_sales['Revenue'].tolist(),
+        'trend': predictions.tolist(),
+        'future_months': [int(x) for x in future_x],
+        'forecast': future_predictions.tolist(),
+    }
+    if args.no_charts:
+        print("   ⏭️  Skipped (--no-charts)")
+    else:
+        drawn, skipped = render_charts([('sales_forecast.png', 'sales_forecast', forecast_chart)])
+        if drawn:
+            print("   ✅ Saved: charts/sales_forecast.png")
+        else:
+            print("   ⏭️  Unchanged: charts/sales_forecast.png")
+
+    # STEP 7: Forecast by Region
+    steps.next('STEP 7: Forecast by Region')
+    print("\n" + "=" * 60)
+    print("🗺️  REGIONAL FORECASTS")
+    print("=" * 60)
+
+    # One table of monthly revenue (a row per segment, a column per month),
+    # then every segment's trend line is fitted in one go
+    segment_keys = [key.strip() for key in args.segment.split(',')]
+    segments, months, segment_revenue = segment_month_matrix(cube, segment_keys)
+
+    # The backtest replays every model on every segment at once; it is only
+    # run when asked for, or when --method best needs it to choose
+    errors = chosen = None
+    if args.backtest or args.method == 'best':
+        errors = backtest(segment_revenue, months)
+        chosen = best_models(errors)
+
+    if args.method == 'linear':
+        if args.model == 'sklearn':
+            slope, intercept, months_used = fit_segments(segment_revenue, sklearn_linear_trends, workers=args.workers)
+        else:
+            slope, intercept, months_used, status = trend_cache.fit(f"by {','.join(segment_keys)}{model_suffix}",
+                                                                    segments, months, segment_revenue)
+            _print_model_status(status)
+        next_month_preds = predict_next(slope, intercept, months_used)
+    elif args.method == 'best':
+        next_month_preds = forecast_best(segment_revenue, months, 1, errors)[:, 0]
+    else:
+        next_month_preds = FORECAST_MODELS[args.method](segment_revenue, months, 1)[:, 0]
+    trend_cache.save()
+
+    for i, (segment, next_month_pred) in enumerate(zip(segments, next_month_preds)):
+        line = f"\n{_segment_label(segment):10s} → Next month predicted: ${next_month_pred:>12,.2f}"
+        if args.method == 'best':
+            line += f"  ({chosen[i]})"
+        print(line)
+
+    # STEP 8: Backtest - which model would have forecast each segment best?
+    if args.backtest:
+        steps.next('STEP 8: Backtest models')
+        print("\n" + "=" * 60)
+        print("🧪 BACKTEST - NEXT-MONTH ERROR PER MODEL")
+        print("=" * 60)
+        print("Every month from the 4th on, forecast by each model from the months before it only")
+        _print_backtest(segments, errors, chosen)
+
+    print("\n" + "=" * 60)
+    print("✅ FORECASTING COMPLETE!")
+    print("=" * 60)
+
+    # Summary
+    print("\n📋 SUMMARY:")
+    print(f"   • Historical months analyzed: {len(monthly_sales)}")
+    if args.method == 'linear':
+        print(f"   • Model accuracy: {accuracy:.2f}%")
+    else:
+        print(f"   • Linear trend R²: {accuracy:.2f}%")
+        print(f"   • Forecast method: {args.method}")
+        print(f"   • Backtest error: {backtest_error}")
+    print(f"   • Forecast period: 3 months")
+    print(f"   • Projected revenue: ${total_predicted:,.2f}")
+    print(f"   • Growth trend: {growth:+.2f}%")
+    steps.done()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except NoOrdersError as error:
+        parser.error(str(error))
\ No newline at end of file
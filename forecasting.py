@@ -0,0 +1,268 @@
+# Batched forecasting - fit a trend line for every segment at once
+# Instead of looping over regions and fitting one model per region, we put all
+# monthly revenue in one table (one row per segment, one column per month)
+# and solve every straight-line fit together with a few NumPy sums.
+#
+# The other models below (seasonal naive, exponential smoothing, trend +
+# seasonality) work on the same table the same way: one NumPy step covers
+# every segment, so 5 regions or 5,000 region x product pairs cost about the
+# same number of Python steps. backtest() replays the history month by month
+# to show which model would actually have forecast each segment best.
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Months in a seasonal cycle
+SEASON_LENGTH = 12
+
+# Smoothing factors tried by exponential smoothing (the best one is picked per segment)
+SMOOTHING_ALPHAS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+def segment_month_matrix(cube, keys):
+    """Monthly revenue per segment as a (segments x months) array.
+
+    ``keys`` is a list of cube keys such as ['Region'], ['Product'] or
+    ['Region', 'Product']. There is a column for every calendar month from
+    the first to the last (even a month with no sales at all), so column
+    positions line up with the calendar. Months where a segment had no sales
+    are NaN. Segments are listed in the order they first appear in the data.
+    """
+    monthly = cube.rollup(keys + ['YearMonth'])['Revenue']
+    matrix = monthly.unstack('YearMonth')
+    matrix = matrix.reindex(columns=pd.period_range(matrix.columns.min(), matrix.columns.max(), freq='M'))
+    matrix = matrix.reindex(cube.appearance_order(keys))
+    return list(matrix.index), list(matrix.columns), matrix.to_numpy(dtype='float64')
+
+
+def trend_statistics(values, months_before=None):
+    """Running sums a straight-line fit needs, for every row of ``values``.
+
+    Returns a dict of arrays (one entry per row): n, sum_x, sum_y, sum_xx and
+    sum_xy. Months with no sales (NaN) are skipped and the remaining months
+    are numbered 1, 2, 3... per row - continuing after ``months_before``
+    (months already counted) when only new months are being added.
+    """
+    has_value = ~np.isnan(values)
+    start = 0 if months_before is None else np.asarray(months_before)[:, np.newaxis]
+    x = (start + np.cumsum(has_value, axis=1)) * has_value
+    y = np.where(has_value, values, 0.0)
+    return {
+        'n': has_value.sum(axis=1),
+        'sum_x': x.sum(axis=1),
+        'sum_y': y.sum(axis=1),
+        'sum_xx': (x * x).sum(axis=1),
+        'sum_xy': (x * y).sum(axis=1),
+    }
+
+
+def add_trend_statistics(stats, new_values):
+    """``stats`` with the months in ``new_values`` (columns after the old ones) added."""
+    extra = trend_statistics(new_values, months_before=stats['n'])
+    return {name: np.asarray(stats[name]) + extra[name] for name in stats}
+
+
+def trends_from_statistics(stats):
+    """(slope, intercept, months_used) of the least-squares lines described by ``stats``."""
+    n, sum_x, sum_y = (np.asarray(stats[name], dtype='float64') for name in ('n', 'sum_x', 'sum_y'))
+    sum_xx, sum_xy = np.asarray(stats['sum_xx'], dtype='float64'), np.asarray(stats['sum_xy'], dtype='float64')
+
+    denominator = n * sum_xx - sum_x ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator != 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercept = np.where(n > 0, (sum_y - slope * sum_x) / n, np.nan)
+    return slope, intercept, np.asarray(stats['n']).astype('int64')
+
+
+def fit_linear_trends(values):
+    """Least-squares line through each row of ``values``, all rows at once.
+
+    Like the original one-region-at-a-time loop, months with no sales are
+    skipped and the remaining months are numbered 1, 2, 3... per row.
+    Returns (slope, intercept, months_used), each an array with one entry per row.
+    """
+    return trends_from_statistics(trend_statistics(values))
+
+
+def sklearn_linear_trends(values):
+    """Same result as fit_linear_trends(), fitted row by row with scikit-learn.
+
+    Much slower - it is here as an example of a heavier per-segment model for
+    fit_segments(workers=...) and as a cross-check of the batched maths.
+    """
+    from sklearn.linear_model import LinearRegression
+
+    slope = np.zeros(len(values))
+    intercept = np.full(len(values), np.nan)
+    n = np.zeros(len(values), dtype='int64')
+    for i, row in enumerate(values):
+        y = row[~np.isnan(row)]
+        n[i] = len(y)
+        if len(y) == 0:
+            continue
+        X = np.arange(1, len(y) + 1).reshape(-1, 1)
+        model = LinearRegression().fit(X, y)
+        slope[i] = model.coef_[0]
+        intercept[i] = model.intercept_
+    return slope, intercept, n
+
+
+def r_squared(actual, predicted):
+    """Share of the variation in ``actual`` the predictions explain (1.0 = perfect fit)."""
+    actual = np.asarray(actual, dtype='float64')
+    residual = ((actual - predicted) ** 2).sum()
+    total = ((actual - actual.mean()) ** 2).sum()
+    return 1 - residual / total if total else 0.0
+
+
+def fit_segments(values, fit_rows=fit_linear_trends, workers=1):
+    """Run ``fit_rows`` over all segments, optionally split across processes.
+
+    The batched NumPy fit is fast enough on its own; ``workers`` is for
+    heavier models where each segment is expensive to fit.
+    """
+    if workers <= 1 or len(values) < 2:
+        return fit_rows(values)
+    chunks = np.array_split(values, min(workers, len(values)))
+    # Not a plain fork, which can hang when the caller runs threads (run_pipeline.py)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = list(pool.map(fit_rows, chunks))
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def predict_next(slope, intercept, n, steps=1):
+    """Prediction ``steps`` months after the last month used in each fit."""
+    return intercept + slope * (n + steps)
+
+
+def future_months(last_month, steps=3):
+    """The ``steps`` calendar months after ``last_month`` (a pandas Period).
+
+    Counting real months, not 30-day blocks, so January is followed by
+    February even though it has 31 days.
+    """
+    return [last_month + i for i in range(1, steps + 1)]
+
+
+def _month_of_year(months):
+    return pd.PeriodIndex(months, freq='M').month.to_numpy()
+
+
+def forecast_linear(values, months, steps):
+    """Straight-line trend (the original model) - months with no sales are skipped."""
+    slope, intercept, n = fit_linear_trends(values)
+    ahead = np.arange(1, steps + 1)
+    return intercept[:, np.newaxis] + slope[:, np.newaxis] * (n[:, np.newaxis] + ahead)
+
+
+def forecast_seasonal_naive(values, months, steps, season=SEASON_LENGTH):
+    """Same month last year; just the last month while there is less than a year of history.
+
+    "Last year" is found by calendar month, not column position, so a month
+    missing from ``months`` counts as zero revenue instead of shifting the rest.
+    """
+    y = np.nan_to_num(values)
+    calendar = pd.PeriodIndex(months, freq='M')
+    if (calendar[-1] - calendar[0]).n + 1 < season:
+        return y[:, np.full(steps, y.shape[1] - 1)]
+    ahead = np.arange(1, steps + 1)
+    sources = [calendar[-1] + int(i) for i in ahead - season * ((ahead - 1) // season + 1)]
+    columns = calendar.get_indexer(sources)
+    return np.where(columns >= 0, y[:, columns], 0.0)
+
+
+def forecast_exp_smoothing(values, months, steps, alphas=SMOOTHING_ALPHAS):
+    """Simple exponential smoothing - a flat forecast at the smoothed level.
+
+    Every smoothing factor in ``alphas`` is run for every segment together
+    (an alphas x segments array, one step per month); each segment keeps the
+    factor with the smallest one-month-ahead error over its history.
+    """
+    y = np.nan_to_num(values)
+    alphas = np.asarray(alphas, dtype='float64')[:, np.newaxis]
+    level = np.repeat(y[np.newaxis, :, 0], len(alphas), axis=0)
+    squared_error = np.zeros_like(level)
+    for month in range(1, y.shape[1]):
+        error = y[:, month] - level
+        squared_error += error ** 2
+        level = level + alphas * error
+    best = squared_error.argmin(axis=0)
+    final_level = level[best, np.arange(len(y))]
+    return np.repeat(final_level[:, np.newaxis], steps, axis=1)
+
+
+def forecast_trend_seasonal(values, months, steps, season=SEASON_LENGTH):
+    """Straight-line trend plus a fixed amount per calendar month.
+
+    One least-squares solve covers all segments, because they share the same
+    months (the design matrix). Month effects need two full years to tell
+    them apart from the trend; with less history this is a plain trend line.
+    """
+    y = np.nan_to_num(values)
+    history = y.shape[1]
+    month_numbers = np.arange(1, history + steps + 1)
+    columns = [np.ones(history + steps), month_numbers]
+    if history >= 2 * season:
+        month_of_year = _month_of_year(list(months) + future_months(months[-1], steps))
+        # January is the baseline, so one column each for February..December
+        columns += [(month_of_year == month).astype('float64') for month in range(2, season + 1)]
+    design = np.column_stack(columns)
+    coefficients = np.linalg.lstsq(design[:history], y.T, rcond=None)[0]
+    return (design[history:] @ coefficients).T
+
+
+FORECAST_MODELS = {
+    'linear': forecast_linear,
+    'seasonal_naive': forecast_seasonal_naive,
+    'exp_smoothing': forecast_exp_smoothing,
+    'trend_seasonal': forecast_trend_seasonal,
+}
+
+
+def backtest(values, months, models=None, steps=1, min_history=3):
+    """Rolling-origin backtest of every model on every segment.
+
+    For each cut-off month (from ``min_history`` months onwards) each model is
+    fitted on the months before the cut-off and asked for the next ``steps``
+    months, which we already know. Returns a dict of model name -> mean
+    absolute error per segment (NaN if the history is too short to test).
+    Months with no sales count as zero revenue.
+    """
+    models = models or FORECAST_MODELS
+    actual = np.nan_to_num(values)
+    errors = {name: np.zeros(len(values)) for name in models}
+    forecasts = 0
+    for cutoff in range(min_history, values.shape[1] - steps + 1):
+        expected = actual[:, cutoff:cutoff + steps]
+        for name, model in models.items():
+            predicted = np.nan_to_num(model(values[:, :cutoff], months[:cutoff], steps))
+            errors[name] += np.abs(predicted - expected).sum(axis=1)
+        forecasts += steps
+    if forecasts == 0:
+        return {name: np.full(len(values), np.nan) for name in models}
+    return {name: total / forecasts for name, total in errors.items()}
+
+
+def best_models(errors):
+    """Name of the model with the smallest backtest error, for every segment."""
+    names = list(errors)
+    table = np.column_stack([errors[name] for name in names])
+    # Untested segments (all NaN) fall back to the first model
+    table = np.where(np.isnan(table), np.inf, table)
+    return np.array(names)[table.argmin(axis=1)]
+
+
+def forecast_best(values, months, steps, errors=None):
+    """Each segment forecast with the model that backtested best for it."""
+    errors = errors if errors is not None else backtest(values, months)
+    chosen = best_models(errors)
+    result = np.empty((len(values), steps))
+    for name in np.unique(chosen):
+        rows = chosen == name
+        result[rows] = FORECAST_MODELS[name](values[rows], months, steps)
+    return result
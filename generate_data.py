@@ -1,17 +1,23 @@
 # This program generates fake sales data for practice
 # It's like creating a practice dataset to learn with!
+#
+# Every column is drawn for many orders at once with NumPy (no Python loop
+# per order), so it can make anything from 500 rows to tens of millions.
+# Big datasets are written in chunks straight to CSV or Parquet, or split
+# into a folder of year=/month=/region= Parquet partitions.
+# With --customers every order also gets a Customer_ID (CUST-1000, CUST-1001...).
+
+import argparse
+import os
 
-import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
+import pandas as pd
 
-print("🚀 Starting to create sales data...")
-print("=" * 50)
+from partitions import write_partitions
 
 # STEP 1: Define what we sell
 # These are our product categories
-products = {
+PRODUCTS = {
     'Laptop': 899.99,      # Product name: Price
     'Smartphone': 699.99,
     'Tablet': 499.99,
@@ -23,54 +29,165 @@ products = {
 }
 
 # STEP 2: Define our sales regions
-regions = ['North', 'South', 'East', 'West']
-
-# STEP 3: Generate 500 sales records
-# We'll create 500 fake customer orders
-print("\n📊 Generating 500 sales records...")
-
-all_sales = []  # Empty list to store all our sales
-
-for i in range(500):  # Loop 500 times
-    # Pick random product
-    product_name = random.choice(list(products.keys()))
-    base_price = products[product_name]
-    
-    # Create one sale record
-    sale = {
-        'Order_ID': f'ORD-{10000 + i}',  # ORD-10000, ORD-10001, etc.
-        'Date': datetime(2024, 1, 1) + timedelta(days=random.randint(0, 300)),  # Random date in 2024
-        'Product': product_name,
-        'Region': random.choice(regions),
-        'Quantity': random.randint(1, 5),  # Buy 1-5 items
-        'Unit_Price': base_price,
-    }
-    
-    # Calculate revenue and profit
-    sale['Revenue'] = sale['Unit_Price'] * sale['Quantity']
-    sale['Profit'] = sale['Revenue'] * random.uniform(0.2, 0.4)  # 20-40% profit margin
-    
-    all_sales.append(sale)  # Add this sale to our list
-
-# STEP 4: Convert list to DataFrame (Excel-like table)
-df = pd.DataFrame(all_sales)
-
-# STEP 5: Sort by date (oldest to newest)
-df = df.sort_values('Date').reset_index(drop=True)
-
-# STEP 6: Save to Excel file
-filename = 'sales_data.xlsx'
-df.to_excel(filename, index=False)
-
-# STEP 7: Show summary
-print("=" * 50)
-print("✅ SUCCESS! Data generated successfully!")
-print("=" * 50)
-print(f"\n📈 SUMMARY:")
-print(f"   • Total Orders: {len(df)}")
-print(f"   • Total Revenue: ${df['Revenue'].sum():,.2f}")
-print(f"   • Total Profit: ${df['Profit'].sum():,.2f}")
-print(f"   • Date Range: {df['Date'].min().date()} to {df['Date'].max().date()}")
-print(f"\n💾 Saved to: {filename}")
-print("\n🎉 First 5 records:")
-print(df.head())
\ No newline at end of file
+REGIONS = ['North', 'South', 'East', 'West']
+
+EXCEL_MAX_ROWS = 1_048_575  # Excel's row limit, minus the header
+
+CUSTOMER_PREFIX = 'CUST-'
+
+
+def generate_sales_chunks(rows=500, seed=None, start='2024-01-01', days=301,
+                          products=PRODUCTS, regions=REGIONS, chunk_rows=1_000_000, customers=0):
+    """Yield the generated orders as DataFrames of at most ``chunk_rows`` rows.
+
+    Orders come out sorted by date (oldest first) with Order_IDs numbered in
+    that order, so the chunks can be written one after another. The same
+    ``seed`` always gives the same data. ``customers`` adds a Customer_ID
+    column with that many different customers.
+    """
+    rng = np.random.default_rng(seed)
+    # Customers come from their own random stream, so adding them doesn't
+    # change any other column for the same seed
+    customer_rng = rng.spawn(1)[0] if customers else None
+    product_names = list(products)
+    prices = np.array([products[name] for name in product_names])
+    start = np.datetime64(start, 'D')
+
+    # How many orders fall on each day - then day i's orders come right after
+    # day i-1's, which keeps every chunk in date order without sorting
+    orders_per_day = rng.multinomial(rows, np.full(days, 1 / days))
+    orders_before_day = np.cumsum(orders_per_day)
+
+    for first in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - first)
+        row_numbers = np.arange(first, first + n)
+        day = np.searchsorted(orders_before_day, row_numbers, side='right')
+
+        product = rng.integers(0, len(product_names), n)
+        quantity = rng.integers(1, 6, n)                    # Buy 1-5 items
+        revenue = prices[product] * quantity
+        profit = revenue * rng.uniform(0.2, 0.4, n)         # 20-40% profit margin
+
+        chunk = pd.DataFrame({
+            'Order_ID': 'ORD-' + pd.Series(10000 + row_numbers).astype(str),  # ORD-10000, ORD-10001, etc.
+            'Date': pd.to_datetime(start + day),
+            'Product': pd.Categorical.from_codes(product, product_names),
+            'Region': pd.Categorical.from_codes(rng.integers(0, len(regions), n), list(regions)),
+            'Quantity': quantity,
+            'Unit_Price': prices[product],
+            'Revenue': revenue,
+            'Profit': profit,
+        })
+        if customers:
+            # Squaring a uniform number makes low customer numbers come up far
+            # more often - a few regulars and a long tail, like a real shop
+            customer = (customers * customer_rng.random(n) ** 2).astype('int64')
+            chunk['Customer_ID'] = CUSTOMER_PREFIX + pd.Series(1000 + customer).astype(str)
+        yield chunk
+
+
+def write_sales(chunks, filename):
+    """Save the chunks to .xlsx, .csv, .parquet or a partitioned folder and return summary numbers."""
+    summary = {'orders': 0, 'revenue': 0.0, 'profit': 0.0, 'first_date': None, 'last_date': None, 'head': None}
+
+    def counted(chunks):
+        for chunk in chunks:
+            summary['orders'] += len(chunk)
+            summary['revenue'] += chunk['Revenue'].sum()
+            summary['profit'] += chunk['Profit'].sum()
+            if summary['head'] is None:
+                summary['head'] = chunk.head()
+                summary['first_date'] = chunk['Date'].iloc[0]
+            summary['last_date'] = chunk['Date'].iloc[-1]
+            yield chunk
+
+    if not os.path.splitext(filename)[1]:
+        # No extension: a folder of Parquet files split by month and region
+        for i, chunk in enumerate(counted(chunks)):
+            write_partitions(chunk, filename, i)
+    elif filename.endswith('.csv'):
+        for i, chunk in enumerate(counted(chunks)):
+            chunk.to_csv(filename, index=False, mode='w' if i == 0 else 'a', header=(i == 0),
+                         date_format='%Y-%m-%d')
+    elif filename.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in counted(chunks):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(filename, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        # Excel can't be appended to, so the orders are collected first
+        pd.concat(list(counted(chunks)), ignore_index=True).to_excel(filename, index=False)
+    return summary
+
+
+def _parse_catalog(text):
+    """'Laptop=899.99,Tablet=499.99' -> {'Laptop': 899.99, 'Tablet': 499.99}"""
+    catalog = {}
+    for item in text.split(','):
+        name, price = item.split('=')
+        catalog[name.strip()] = float(price)
+    return catalog
+
+
+parser = argparse.ArgumentParser(description='Generate practice sales data')
+parser.add_argument('--rows', type=int, default=500, help='number of orders (default: %(default)s)')
+parser.add_argument('--seed', type=int, help='random seed, for the same data every time')
+parser.add_argument('--start', default='2024-01-01', help='first possible order date (default: %(default)s)')
+parser.add_argument('--days', type=int, default=301, help='number of days orders are spread over (default: %(default)s)')
+parser.add_argument('--products', type=_parse_catalog, default=PRODUCTS,
+                    help='product catalog as Name=price,Name=price (default: built-in catalog)')
+parser.add_argument('--regions', type=lambda text: [r.strip() for r in text.split(',')], default=REGIONS,
+                    help='comma-separated regions (default: North,South,East,West)')
+parser.add_argument('--output', default='sales_data.xlsx', help='.xlsx, .csv or .parquet file, or a folder name for partitioned Parquet (default: %(default)s)')
+parser.add_argument('--chunk-rows', type=int, default=1_000_000,
+                    help='orders generated and written at a time (default: %(default)s)')
+parser.add_argument('--customers', type=int, default=0,
+                    help='add a Customer_ID column with this many different customers (default: no customers)')
+
+
+def main(argv=None):
+    """Generate the practice dataset and save it (sales_data.xlsx by default)."""
+    args = parser.parse_args(argv)
+    for option in ('rows', 'chunk_rows', 'days'):
+        if getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1")
+    if args.output.endswith('.xlsx') and args.rows > EXCEL_MAX_ROWS:
+        parser.error(f"Excel holds at most {EXCEL_MAX_ROWS:,} rows - use a .csv or .parquet --output")
+
+    print("🚀 Starting to create sales data...")
+    print("=" * 50)
+
+    # STEP 3: Generate the sales records, all columns at once
+    print(f"\n📊 Generating {args.rows:,} sales records...")
+
+    chunks = generate_sales_chunks(args.rows, args.seed, args.start, args.days,
+                                   args.products, args.regions, args.chunk_rows, args.customers)
+
+    # STEP 4: Save them (chunk by chunk for CSV and Parquet)
+    summary = write_sales(chunks, args.output)
+
+    # STEP 5: Show summary
+    print("=" * 50)
+    print("✅ SUCCESS! Data generated successfully!")
+    print("=" * 50)
+    print(f"\n📈 SUMMARY:")
+    print(f"   • Total Orders: {summary['orders']}")
+    print(f"   • Total Revenue: ${summary['revenue']:,.2f}")
+    print(f"   • Total Profit: ${summary['profit']:,.2f}")
+    print(f"   • Date Range: {summary['first_date'].date()} to {summary['last_date'].date()}")
+    print(f"\n💾 Saved to: {args.output}")
+    print("\n🎉 First 5 records:")
+    print(summary['head'])
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
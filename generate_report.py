@@ -1,181 +1,194 @@
 # Executive Summary Report Generator
 # Creates a professional text report of all findings
 
-import pandas as pd
-from datetime import datetime
-
-print("📄 Generating Executive Summary Report...")
-
-# Load data
-df = pd.read_excel('sales_data.xlsx')
-df['Date'] = pd.to_datetime(df['Date'])
-
-# Calculate all metrics
-total_revenue = df['Revenue'].sum()
-total_profit = df['Profit'].sum()
-profit_margin = (total_profit / total_revenue) * 100
-total_orders = len(df)
-avg_order = df['Revenue'].mean()
-if 'Customer_ID' in df.columns:
-    unique_customers = df['Customer_ID'].nunique()
-else:
-    unique_customers = total_orders  # Assume 1 customer per order
-
-# Regional performance
-region_sales = df.groupby('Region')['Revenue'].sum().sort_values(ascending=False)
-best_region = region_sales.index[0]
-
-# Product performance
-product_sales = df.groupby('Product')['Revenue'].sum().sort_values(ascending=False)
-best_product = product_sales.index[0]
-
-# Monthly performance
-df['Month_Name'] = df['Date'].dt.month_name()
-monthly = df.groupby('Month_Name')['Revenue'].sum()
-best_month = monthly.idxmax()
-
-# Create the report
-report = f"""
-{'='*70}
-                   SALES PERFORMANCE EXECUTIVE SUMMARY
-{'='*70}
-
-Report Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
-Analysis Period: {df['Date'].min().strftime('%B %Y')} - {df['Date'].max().strftime('%B %Y')}
-
-{'='*70}
-                        KEY PERFORMANCE INDICATORS
-{'='*70}
-
-Financial Performance:
-   • Total Revenue:              ${total_revenue:>15,.2f}
-   • Total Profit:               ${total_profit:>15,.2f}
-   • Profit Margin:              {profit_margin:>15.2f}%
-   • Average Order Value:        ${avg_order:>15,.2f}
-
-Sales Volume:
-   • Total Orders:               {total_orders:>15,}
-   • Average Orders per Day:     {total_orders / len(df['Date'].unique()):>15.1f}
-
-{'='*70}
-                         REGIONAL PERFORMANCE
-{'='*70}
-
-Revenue by Region:
-"""
-
-for region, revenue in region_sales.items():
-    pct = (revenue / total_revenue) * 100
-    report += f"   • {region:10s}  ${revenue:>12,.2f}  ({pct:>5.1f}% of total)\n"
-
-report += f"\n🏆 Top Performing Region: {best_region}\n"
-
-report += f"""
-{'='*70}
-                         PRODUCT PERFORMANCE
-{'='*70}
-
-Top 5 Products by Revenue:
-"""
-
-for i, (product, revenue) in enumerate(product_sales.head(5).items(), 1):
-    report += f"   {i}. {product:15s}  ${revenue:>12,.2f}\n"
-
-report += f"\n🏆 Best Selling Product: {best_product}\n"
-
-# Product profitability
-product_profit = df.groupby('Product').agg({
-    'Profit': 'sum',
-    'Revenue': 'sum'
-})
-product_profit['Margin'] = (product_profit['Profit'] / product_profit['Revenue']) * 100
-highest_margin = product_profit['Margin'].idxmax()
-
-report += f"💎 Highest Profit Margin: {highest_margin} ({product_profit.loc[highest_margin, 'Margin']:.1f}%)\n"
-
-report += f"""
-{'='*70}
-                        TEMPORAL ANALYSIS
-{'='*70}
-
-Best Performing Month: {best_month} (${monthly[best_month]:,.2f})
-
-Quarterly Breakdown:
-"""
-
-quarterly = df.groupby(df['Date'].dt.quarter).agg({
-    'Revenue': 'sum',
-    'Profit': 'sum'
-})
-
-for quarter, row in quarterly.iterrows():
-    margin = (row['Profit'] / row['Revenue']) * 100
-    report += f"   Q{quarter}: Revenue ${row['Revenue']:>12,.2f}  |  Profit ${row['Profit']:>12,.2f}  |  Margin {margin:.1f}%\n"
-
-# Growth trend
-monthly_sorted = df.groupby(df['Date'].dt.to_period('M'))['Revenue'].sum().sort_index()
-if len(monthly_sorted) > 1:
-    first_month = monthly_sorted.iloc[0]
-    last_month = monthly_sorted.iloc[-1]
-    growth = ((last_month - first_month) / first_month) * 100
-else:
-    growth = 0
-
-report += f"""
-{'='*70}
-                        KEY INSIGHTS & RECOMMENDATIONS
-{'='*70}
-
-Strategic Insights:
-
-1. Regional Focus:
-   → {best_region} region leads with {(region_sales[best_region] / total_revenue * 100):.1f}% of total revenue
-   → Recommendation: Increase marketing investment in {best_region} region
-
-2. Product Strategy:
-   → {best_product} generates highest revenue (${product_sales[best_product]:,.2f})
-   → {highest_margin} has best profit margin ({product_profit.loc[highest_margin, 'Margin']:.1f}%)
-   → Recommendation: Expand {highest_margin} product line for better margins
-
-3. Growth Trend:
-   → {'Positive' if growth > 0 else 'Negative'} trend: {growth:+.1f}% growth from start to end period
-   → Recommendation: {'Maintain current strategies' if growth > 0 else 'Review sales strategies'}
-
-4. Operational Efficiency:
-   → Profit margin of {profit_margin:.1f}% is {'healthy' if profit_margin > 25 else 'acceptable'}
-   → Average order value: ${avg_order:.2f}
-   → Recommendation: Focus on upselling to increase AOV
-
-{'='*70}
-                              CONCLUSION
-{'='*70}
-
-Overall Performance: {'STRONG' if profit_margin > 25 and growth > 0 else 'MODERATE'}
-
-The sales data shows {"strong performance across all regions" if region_sales.std() < region_sales.mean() * 0.2 else "varied regional performance"}.
-{best_product} and {highest_margin} are key revenue and profit drivers respectively.
-
-Next Steps:
-   1. Implement targeted campaigns in {best_region} region
-   2. Increase inventory for {best_product}
-   3. Optimize pricing for {highest_margin} to maximize margins
-   4. Monitor monthly trends and adjust strategies quarterly
-
-{'='*70}
-
-Report prepared by: Sales Analytics System
-Data source: sales_data.xlsx
-Total records analyzed: {len(df):,}
-
-{'='*70}
-"""
-
-# Save report
-with open('EXECUTIVE_SUMMARY.txt', 'w', encoding='utf-8') as f:
-    f.write(report)
-
-print("✅ Executive Summary Report Generated!")
-print("📄 Saved to: EXECUTIVE_SUMMARY.txt")
-
-# Also print to console
-print(report)
\ No newline at end of file
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import profiling
+from data_loader import (BACKENDS, DEFAULT_MAX_MEMORY_MB, NoOrdersError, add_input_arguments, describe_filters,
+                         engine_available, input_filters, load_sales_data)
+from aggregations import SalesCube, build_distributions, build_sales_cube
+from distinct import CUSTOMER_COLUMN, DISTINCT_MODES, build_distinct
+from quantiles import QUANTILE_MODES
+from report_builder import METRICS_FORMATS, report_metrics, report_text, write_metrics, write_report
+
+parser = argparse.ArgumentParser(description='Executive summary report generator')
+parser.add_argument('--profile', action='store_true', help='record step timings to PROFILE.json')
+add_input_arguments(parser)
+mode = parser.add_mutually_exclusive_group()
+mode.add_argument('--incremental', action='store_true',
+                  help='only add orders that arrived since the last run (totals are saved in .sales_cache)')
+mode.add_argument('--stream', action='store_true',
+                  help='read the file in chunks instead of loading it all into memory')
+mode.add_argument('--backend', choices=BACKENDS, default='pandas',
+                  help='add the orders up with pandas (default) or an embedded SQL database')
+parser.add_argument('--top', type=int, default=3, help='products listed per region (default: %(default)s)')
+parser.add_argument('--distinct', choices=DISTINCT_MODES, default='exact',
+                    help='count customers exactly, or with a small mergeable sketch (about 2%% off, '
+                         'flat memory) - only if the data has a Customer_ID (default: %(default)s)')
+parser.add_argument('--quantiles', choices=QUANTILE_MODES,
+                    help='median/p90/p99 order value and basket size exactly, or from a small mergeable sketch '
+                         '(within 1%%) - default: exact, sketch with --stream/--incremental')
+parser.add_argument('--metrics', choices=METRICS_FORMATS,
+                    help='also save the report numbers as EXECUTIVE_SUMMARY.json/.csv for other programs')
+parser.add_argument('--batch-by', choices=['Region', 'Product'],
+                    help='write one report per region/product into --output-dir instead of EXECUTIVE_SUMMARY.txt')
+parser.add_argument('--output-dir', default='reports', help='folder for --batch-by reports (default: %(default)s)')
+parser.add_argument('--workers', type=int, default=None,
+                    help='processes writing --batch-by reports (default: one per CPU, 0 = no extra processes)')
+parser.add_argument('--max-memory-mb', type=int, default=DEFAULT_MAX_MEMORY_MB,
+                    help='memory ceiling for --stream and for building the SQL database (default: %(default)s MB)')
+
+
+def _safe_name(value):
+    """A key value that is safe to use in a file name."""
+    return re.sub(r'[^\w.-]+', '_', str(value)).strip('_') or 'blank'
+
+
+def _write_report(job):
+    """Work out the numbers for one report and save it (runs in a worker process)."""
+    filename, cube, top, data_source, scope, metrics_format = job
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    metrics = report_metrics(cube, top, data_source, scope)
+    write_report(metrics, filename)
+    if metrics_format:
+        write_metrics(metrics, os.path.splitext(filename)[0] + '.' + metrics_format, metrics_format)
+    return filename, time.perf_counter() - start, time.process_time() - cpu_start, os.getpid()
+
+
+def write_batch_reports(cube, key, folder, top=3, data_source='', workers=None, metrics_format=None):
+    """One report per value of ``key`` (e.g. every region), written in parallel.
+
+    The cube is split into one small cube per value with a single sort, so
+    the orders are only read and added up once however many reports there
+    are. With ``metrics_format`` ('json' or 'csv') each report's numbers are
+    saved next to it too. Returns the list of report files written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    jobs = [(os.path.join(folder, f'EXECUTIVE_SUMMARY_{_safe_name(value)}.txt'),
+             part, top, data_source, f'{key}: {value}', metrics_format)
+            for value, part in cube.split(key).items()]
+    if not jobs:
+        return []
+
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    started = time.perf_counter()
+    if workers == 0:
+        results = [_write_report(job) for job in jobs]
+    else:
+        # No plain fork: this can run inside run_pipeline.py's threads, and
+        # forking while another thread holds a lock can hang the worker
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            # Hand out reports in batches - each one only takes milliseconds
+            results = list(pool.map(_write_report, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    for filename, seconds, cpu_seconds, pid in results:
+        profiling.record(f'report {os.path.basename(filename)}', started, seconds, cpu_seconds, pid=pid, tid=pid)
+    return [filename for filename, *_ in results]
+
+
+def main(argv=None, df=None, cube=None):
+    """Run the report generator.
+
+    ``df`` / ``cube`` let the pipeline runner pass in data it already loaded.
+    """
+    args = parser.parse_args(argv)
+    if args.top < 1:
+        parser.error('--top must be at least 1')
+    if args.incremental and any(value is not None for value in input_filters(args).values()):
+        parser.error('--incremental keeps totals for the whole input - it can\'t be combined with --start/--end/--region')
+    if not engine_available(args.backend):
+        parser.error(f'--backend {args.backend} needs the {args.backend} package (pip install {args.backend})')
+    if args.profile:
+        profiling.enable()
+    steps = profiling.Steps('generate_report')
+    quantiles = args.quantiles or ('sketch' if args.stream or args.incremental else 'exact')
+
+    print("📄 Generating Executive Summary Report...")
+
+    # Load data and sum everything up once - every table in the report is read
+    # from this cube. In incremental mode only the new orders are added to it,
+    # in streaming mode the file is read chunk by chunk, and with --backend
+    # sqlite/duckdb a database does the adding up. Those modules are only
+    # imported when asked for, so the plain run starts faster.
+    steps.next('Load data')
+    if args.incremental:
+        from incremental import load_incremental_cube
+        df = None
+        cube, new_orders = load_incremental_cube(args.input, args.distinct, quantiles)
+        print(f"🔄 {new_orders} new orders since last run")
+    elif args.stream:
+        from streaming import build_sales_cube_streaming
+        df = None
+        cube = build_sales_cube_streaming(args.input, args.max_memory_mb, **input_filters(args),
+                                          distinct=args.distinct, quantiles=quantiles)
+    elif args.backend != 'pandas':
+        from sql_backend import build_sales_cube_sql
+        df = None
+        cube = build_sales_cube_sql(args.input, args.backend, max_memory_mb=args.max_memory_mb,
+                                    **input_filters(args), distinct=args.distinct, quantiles=quantiles)
+    else:
+        if df is None:
+            df = load_sales_data(args.input, **input_filters(args))
+        if cube is None:
+            cube = build_sales_cube(df, distinct=args.distinct, quantiles=quantiles)
+        else:
+            # The pipeline runner's shared cube doesn't count customers or keep
+            # quantiles; add them to our own copy so the other stages' cube is left alone
+            cube = SalesCube(cube.cells, cube.customers, dict(cube.distributions))
+            if cube.customers is None and CUSTOMER_COLUMN in df.columns:
+                cube.customers = build_distinct(df, CUSTOMER_COLUMN, args.distinct)
+            if not cube.distributions:
+                cube.distributions = build_distributions(df, quantiles)
+    steps.rows(cube.totals()['Orders'])
+    data_source = f"{args.input}{describe_filters(args)}"
+
+    # Batch mode: one report per region/product instead of one for everything
+    if args.batch_by:
+        steps.next('Write reports')
+        files = write_batch_reports(cube, args.batch_by, args.output_dir, args.top, data_source,
+                                    args.workers, args.metrics)
+        print(f"✅ {len(files)} reports generated (one per {args.batch_by})!")
+        for filename in files[:10]:
+            print(f"📄 Saved to: {filename}")
+        if len(files) > 10:
+            print(f"   ... and {len(files) - 10} more in {args.output_dir}/")
+        steps.done()
+        return
+
+    # Calculate all metrics once - the text report and the --metrics file
+    # are both filled in from them
+    steps.next('Calculate metrics')
+    metrics = report_metrics(cube, args.top, data_source)
+
+    # Save report
+    steps.next('Save report')
+    report = report_text(metrics)
+    with open('EXECUTIVE_SUMMARY.txt', 'w', encoding='utf-8') as f:
+        f.write(report)
+    if args.metrics:
+        write_metrics(metrics, f'EXECUTIVE_SUMMARY.{args.metrics}', args.metrics)
+
+    print("✅ Executive Summary Report Generated!")
+    print("📄 Saved to: EXECUTIVE_SUMMARY.txt")
+    if args.metrics:
+        print(f"📄 Metrics saved to: EXECUTIVE_SUMMARY.{args.metrics}")
+
+    # Also print to console
+    print(report)
+    steps.done()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except NoOrdersError as error:
+        parser.error(str(error))
\ No newline at end of file
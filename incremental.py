@@ -0,0 +1,138 @@
+# Incremental refresh - only add up the orders that arrived since the last run
+# Our order feed only ever appends new orders. Instead of re-adding the whole
+# history every day, we save the aggregate cube together with a "high-water
+# mark" (the newest Order_ID and Date already counted) and a hash of the orders
+# below it. Next run we only aggregate the orders beyond that mark and merge
+# them into the saved cube - as long as the hash shows nobody edited the old ones.
+# Customer counts (see distinct.py) and quantiles (see quantiles.py) are
+# saved and merged the same way, in the most detailed mode any run asked for:
+# exact counts and values can always be turned into sketches, so scripts
+# asking for less (or nothing) share the same saved state.
+
+import os
+
+import numpy as np
+
+from aggregations import SalesCube, build_distributions, build_sales_cube, merge_cubes
+from data_loader import (SOURCE_FILE, cache_file, frame_file, load_sales_data, read_frame, read_json,
+                         row_hashes, source_signature, source_unchanged, write_frame, write_json)
+from distinct import CUSTOMER_COLUMN, DistinctCounter, build_distinct
+from quantiles import ValueDistribution
+from schema import parse_order_ids
+
+# Bump this whenever the saved state changes shape, so old state is rebuilt
+STATE_VERSION = 4
+
+# How much each mode keeps: a mode can be worked out from any mode above it
+DETAIL = {None: 0, 'sketch': 1, 'exact': 2}
+
+
+def order_numbers(order_ids):
+    """Numeric part of Order_IDs like 'ORD-10042' -> 10042 (already numbers after loading)."""
+    return parse_order_ids(order_ids)
+
+
+def history_hash(hashes):
+    """One number for a set of orders, from their row_hashes() (0 for none)."""
+    return int(hashes.sum(dtype='uint64'))
+
+
+def _save_state(path, cube, df, numbers, hashes, distinct, quantiles):
+    write_frame(cube.cells, frame_file(path, 'aggregates'))
+    if cube.customers is not None:
+        write_frame(cube.customers.to_frame(), frame_file(path, 'customers'))
+    for column, distribution in cube.distributions.items():
+        write_frame(distribution.to_frame(), frame_file(path, f'quantiles_{column}'))
+    write_json(cache_file(path, 'state.json'), {
+        'version': STATE_VERSION,
+        'distinct': distinct,
+        'customers': cube.customers is not None,
+        'quantiles': quantiles,
+        'distributions': list(cube.distributions),
+        'source': source_signature(path),
+        'rows': len(df),
+        'history': history_hash(hashes),
+        'max_order_id': int(numbers.max()) if len(numbers) else -1,
+        'max_date': str(df['Date'].max().date()) if len(df) else None,
+    })
+
+
+def _more_detailed(mode, other):
+    return mode if DETAIL[mode] >= DETAIL[other] else other
+
+
+def _as_asked(cube, distinct, quantiles):
+    """The cube with customers/quantiles in the modes asked for (left out for None)."""
+    customers = None if distinct is None else cube.customers
+    if customers is not None and distinct == 'sketch':
+        customers = customers.sketched()
+    distributions = {} if quantiles is None else cube.distributions
+    if quantiles == 'sketch':
+        distributions = {column: distribution.sketched() for column, distribution in distributions.items()}
+    return SalesCube(cube.cells, customers, distributions)
+
+
+def _saved_cube(path, state):
+    customers = None
+    if state['customers']:
+        customers = DistinctCounter.from_frame(read_frame(frame_file(path, 'customers')))
+    distributions = {column: ValueDistribution.from_frame(read_frame(frame_file(path, f'quantiles_{column}')))
+                     for column in state['distributions']}
+    return SalesCube(read_frame(frame_file(path, 'aggregates')), customers, distributions)
+
+
+def load_incremental_cube(path=SOURCE_FILE, distinct=None, quantiles=None):
+    """Return ``(cube, new_orders)`` using the totals saved by the last run.
+
+    - Source file unchanged: the saved cube is returned without reading any orders.
+    - New orders appended: only orders with an Order_ID above the high-water
+      mark are aggregated and merged into the saved cube.
+    - Anything else (first run, or old orders edited or removed, so the row
+      count or the hash of the orders below the mark no longer matches): the
+      cube is rebuilt from scratch.
+    ``distinct`` and ``quantiles`` ('exact' or 'sketch') also return customer
+    counts and Revenue/Quantity quantiles. They are saved in the most detailed
+    mode asked for so far; asking for more detail than was saved rebuilds only
+    those from all orders, and the high-water mark is kept.
+    """
+    cube_file = frame_file(path, 'aggregates')
+    state_file = cache_file(path, 'state.json')
+    state = read_json(state_file)
+    usable = (state is not None and state.get('version') == STATE_VERSION and os.path.exists(cube_file)
+              and (not state['customers'] or os.path.exists(frame_file(path, 'customers')))
+              and all(os.path.exists(frame_file(path, f'quantiles_{column}'))
+                      for column in state['distributions']))
+    saved_distinct = state['distinct'] if usable else None
+    saved_quantiles = state['quantiles'] if usable else None
+    keep_distinct = _more_detailed(saved_distinct, distinct)
+    keep_quantiles = _more_detailed(saved_quantiles, quantiles)
+    more_detail = (keep_distinct, keep_quantiles) != (saved_distinct, saved_quantiles)
+
+    if usable and not more_detail and source_unchanged(path, state['source']):
+        write_json(state_file, state)  # keeps a refreshed timestamp, if any
+        return _as_asked(_saved_cube(path, state), distinct, quantiles), 0
+
+    df = load_sales_data(path)
+    numbers = order_numbers(df['Order_ID'])
+    hashes = row_hashes(df)
+
+    if usable:
+        is_new = numbers > state['max_order_id']
+        if len(df) - is_new.sum() == state['rows'] and history_hash(hashes[~is_new]) == state['history']:
+            positions = np.flatnonzero(is_new)
+            cube = _saved_cube(path, state)
+            if len(positions):
+                new_cube = build_sales_cube(df.iloc[positions], row_numbers=positions, distinct=saved_distinct,
+                                            quantiles=saved_quantiles)
+                cube = merge_cubes(cube, new_cube)
+            # Only what needs more detail than was saved is built again from every order
+            if keep_distinct != saved_distinct and CUSTOMER_COLUMN in df.columns:
+                cube.customers = build_distinct(df, CUSTOMER_COLUMN, keep_distinct)
+            if keep_quantiles != saved_quantiles:
+                cube.distributions = build_distributions(df, keep_quantiles)
+            _save_state(path, cube, df, numbers, hashes, keep_distinct, keep_quantiles)
+            return _as_asked(cube, distinct, quantiles), len(positions)
+
+    cube = build_sales_cube(df, distinct=keep_distinct, quantiles=keep_quantiles)
+    _save_state(path, cube, df, numbers, hashes, keep_distinct, keep_quantiles)
+    return _as_asked(cube, distinct, quantiles), len(df)
@@ -0,0 +1,112 @@
+# Partitioned datasets - a folder of sales files split by month and region
+# Big exports usually come as many files in "hive-style" folders:
+#
+#   sales/year=2024/month=01/region=North/part-00000.parquet
+#   sales/year=2024/month=01/region=South/part-00000.parquet
+#   ...
+#
+# The folder names already tell us which dates and region a file holds, so when
+# a script only needs a window (--start/--end) or some regions (--region) the
+# files that can't match are never opened. Files inside a partition are read
+# with the normal loader, so each one gets its own fast cache.
+
+import calendar
+import os
+from urllib.parse import unquote
+
+import pandas as pd
+
+SALES_EXTENSIONS = ('.parquet', '.csv', '.xlsx')
+
+# Columns the folder names can stand in for (files usually leave them out)
+PARTITION_COLUMNS = {'region': 'Region', 'product': 'Product'}
+
+
+def list_partitions(root):
+    """Every sales file under ``root`` with the key=value pairs from its folder names."""
+    partitions = []
+    for folder, subfolders, files in os.walk(root):
+        subfolders[:] = sorted(name for name in subfolders if not name.startswith('.'))
+        relative = os.path.relpath(folder, root)
+        keys = {}
+        for part in relative.split(os.sep):
+            if '=' in part:
+                key, value = part.split('=', 1)
+                keys[key.lower()] = unquote(value)
+        for name in sorted(files):
+            if name.endswith(SALES_EXTENSIONS) and not name.startswith(('.', '~$')):
+                partitions.append((os.path.join(folder, name), keys))
+    return partitions
+
+
+def _date_span(keys):
+    """First and last day a partition can hold, from its year=/month=/date= keys."""
+    if 'date' in keys:
+        day = pd.Timestamp(keys['date'])
+        return day, day
+    if 'year' not in keys:
+        return None, None
+    year = int(keys['year'])
+    if 'month' not in keys:
+        return pd.Timestamp(year, 1, 1), pd.Timestamp(year, 12, 31)
+    month = int(keys['month'])
+    return pd.Timestamp(year, month, 1), pd.Timestamp(year, month, calendar.monthrange(year, month)[1])
+
+
+def partition_matches(keys, start=None, end=None, regions=None):
+    """Can a partition with these keys hold orders inside the filters?
+
+    Keys the folder names don't have can't rule anything out, so a partition
+    is only skipped when its folder names prove it has nothing we want.
+    """
+    first, last = _date_span(keys)
+    if start is not None and last is not None and last < start:
+        return False
+    if end is not None and first is not None and first > end:
+        return False
+    if regions and 'region' in keys and keys['region'] not in regions:
+        return False
+    return True
+
+
+def prune_partitions(root, start=None, end=None, regions=None):
+    """Sales files under ``root`` that can hold orders inside the filters."""
+    return [(file, keys) for file, keys in list_partitions(root)
+            if partition_matches(keys, start, end, regions)]
+
+
+def add_partition_columns(df, keys):
+    """Put back columns the files left out because the folder name holds them."""
+    for key, column in PARTITION_COLUMNS.items():
+        if key in keys and column not in df.columns:
+            df[column] = keys[key]
+    return df
+
+
+def filter_sales(df, start=None, end=None, regions=None):
+    """Only the orders between ``start`` and ``end`` (whole days) in ``regions``."""
+    if start is None and end is None and not regions:
+        return df
+    keep = pd.Series(True, index=df.index)
+    if start is not None:
+        keep &= df['Date'] >= start
+    if end is not None:
+        keep &= df['Date'] < end + pd.Timedelta(days=1)
+    if regions:
+        keep &= df['Region'].isin(regions)
+    return df[keep].reset_index(drop=True)
+
+
+def write_partitions(chunk, root, part_number, extension='.parquet'):
+    """Write one chunk of orders into year=/month=/region= folders under ``root``."""
+    dates = pd.to_datetime(chunk['Date'])
+    groups = chunk.groupby([dates.dt.year, dates.dt.month, chunk['Region']], sort=True, observed=True)
+    for (year, month, region), part in groups:
+        folder = os.path.join(root, f'year={year}', f'month={month:02d}', f'region={region}')
+        os.makedirs(folder, exist_ok=True)
+        part = part.drop(columns='Region')  # the folder name holds it
+        filename = os.path.join(folder, f'part-{part_number:05d}{extension}')
+        if extension == '.csv':
+            part.to_csv(filename, index=False, date_format='%Y-%m-%d')
+        else:
+            part.to_parquet(filename, index=False)
@@ -0,0 +1,165 @@
+# Profiling - where does the time go in a pipeline run?
+# When switched on (SALES_PROFILE=1 or the --profile flag) every step the
+# scripts print ("STEP 1", "ANALYSIS 3", chart saves...) records its wall time,
+# CPU time, rows processed and peak memory allocation. At exit everything is
+# written to PROFILE.json in Chrome trace format (open it in chrome://tracing
+# or https://ui.perfetto.dev) and a short table is printed.
+# When profiling is off, every call here returns immediately.
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+DEFAULT_PROFILE_FILE = 'PROFILE.json'
+
+_output_file = None
+_events = []
+_events_lock = threading.Lock()
+_local = threading.local()
+_started = time.perf_counter()
+
+
+def enable(output_file=DEFAULT_PROFILE_FILE):
+    """Start recording; the trace is written to ``output_file`` when the program exits."""
+    global _output_file
+    if _output_file is None:
+        atexit.register(write_profile)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    _output_file = output_file
+
+
+def enabled():
+    return _output_file is not None
+
+
+def record(name, start, seconds, cpu_seconds=None, rows=None, peak_bytes=None, pid=None, tid=None):
+    """Add one finished step (``start`` is a time.perf_counter() value)."""
+    if not enabled():
+        return
+    event = {
+        'name': name,
+        'ph': 'X',  # a "complete" event: start + duration
+        'ts': round((start - _started) * 1e6),
+        'dur': round(seconds * 1e6),
+        'pid': pid or os.getpid(),
+        'tid': tid or threading.get_ident(),
+        'args': {'wall_ms': round(seconds * 1000, 3)},
+    }
+    if cpu_seconds is not None:
+        event['args']['cpu_ms'] = round(cpu_seconds * 1000, 3)
+    if rows is not None:
+        event['args']['rows'] = int(rows)
+    if peak_bytes is not None:
+        event['args']['peak_mb'] = round(peak_bytes / 1024 / 1024, 3)
+    with _events_lock:
+        _events.append(event)
+
+
+class span:
+    """Time a block of code: ``with span('read_excel', rows=n): ...``
+
+    Spans can be nested. ``rows`` can also be filled in inside the block
+    (``with span('aggregate') as s: ...; s.rows = len(df)``).
+    """
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        if not enabled():
+            return self
+        stack = _local.__dict__.setdefault('stack', [])
+        # Peak memory is tracked per span: remember the current peak for the
+        # enclosing span before starting a fresh one for this block
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.base = tracemalloc.get_traced_memory()[0]
+        self.peak = 0
+        stack.append(self)
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not enabled() or not hasattr(self, 'start'):
+            return False
+        seconds = time.perf_counter() - self.start
+        cpu_seconds = time.thread_time() - self.cpu_start
+        peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        _local.stack.pop()
+        if _local.stack:
+            _local.stack[-1].peak = max(_local.stack[-1].peak, peak)
+        record(self.name, self.start, seconds, cpu_seconds, self.rows, max(peak - self.base, 0))
+        return False
+
+
+class Steps:
+    """Times the numbered steps of a script, one after the other.
+
+        steps = Steps('analyze_data')
+        steps.next('STEP 1: Load data')
+        ...
+        steps.next('STEP 2: KPIs', rows=len(df))
+        ...
+        steps.done()
+
+    Each ``next`` ends the previous step; the whole script is one more span.
+    """
+
+    def __init__(self, script):
+        self.script = span(script).__enter__()
+        self.current = None
+
+    def next(self, name, rows=None):
+        self._finish()
+        self.current = span(name, rows).__enter__()
+
+    def rows(self, rows):
+        if self.current is not None:
+            self.current.rows = rows
+
+    def _finish(self):
+        if self.current is not None:
+            self.current.__exit__(None, None, None)
+            self.current = None
+
+    def done(self):
+        self._finish()
+        self.script.__exit__(None, None, None)
+
+
+def write_profile():
+    """Write the Chrome trace file and print a short summary table."""
+    if not enabled() or not _events:
+        return
+    with _events_lock:
+        events = sorted(_events, key=lambda event: event['ts'])
+    with open(_output_file, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, indent=1)
+
+    # The summary goes to stderr so the scripts' normal output stays the same
+    out = sys.stderr
+    out.write(f"\n⏱️  PROFILE ({_output_file})\n")
+    out.write(f"{'Step':<45} {'Wall ms':>10} {'CPU ms':>10} {'Rows':>10} {'Peak MB':>9}\n")
+    out.write("-" * 88 + "\n")
+    for event in events:
+        args = event['args']
+        rows = f"{args['rows']:,}" if 'rows' in args else ''
+        cpu = f"{args['cpu_ms']:.1f}" if 'cpu_ms' in args else ''
+        peak = f"{args['peak_mb']:.1f}" if 'peak_mb' in args else ''
+        out.write(f"{event['name'][:45]:<45} {args['wall_ms']:>10.1f} {cpu:>10} {rows:>10} {peak:>9}\n")
+
+
+# Profiling can be switched on for any script from the environment:
+#   SALES_PROFILE=1 python analyze_data.py            -> PROFILE.json
+#   SALES_PROFILE=trace.json python analyze_data.py   -> trace.json
+_env = os.environ.get('SALES_PROFILE', '')
+if _env and _env != '0':
+    enable(DEFAULT_PROFILE_FILE if _env == '1' else _env)
@@ -0,0 +1,195 @@
+# Quantiles - what a typical order looks like, not just the average one
+# A few very large orders pull the average order value up; the median (p50),
+# p90 and p99 show what most orders really look like and how big the large
+# ones get. Like distinct counts, quantiles can't be added up piece by piece,
+# so the values are kept per Region x Product x month, in one of two forms:
+#
+#   exact    every different value once per Region x Product x month, with how
+#            many orders had it. Quantiles are read off the sorted values, with
+#            the same linear interpolation as pandas' Series.quantile().
+#   sketch   values rounded into logarithmic buckets, each 2% wider than the
+#            one before, with how many orders fell into each (the DDSketch
+#            idea). Every quantile comes out within 1% of the true value, and a
+#            Region x Product x month never needs more than a few hundred
+#            buckets, however many orders there are.
+#
+# Both are lists of (key row, value, count) and merge by adding the counts of
+# equal values, so chunks (--stream), partitions and incremental runs combine
+# exactly like the cube does (merge_distributions()).
+
+import numpy as np
+import pandas as pd
+
+from distinct import align_keys, key_groups, month_keys, saved_groups
+
+QUANTILE_MODES = ['exact', 'sketch']
+
+# Order value and basket size
+QUANTILE_COLUMNS = ['Revenue', 'Quantity']
+
+# Median, p90 and p99
+QUANTILES = [0.5, 0.9, 0.99]
+
+# Relative accuracy of the sketch: bucket i holds values in (GAMMA**(i-1), GAMMA**i]
+SKETCH_ACCURACY = 0.01
+GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+# Buckets run from -MAX_BUCKET to MAX_BUCKET (GAMMA ** 2000 is about 10 ** 17);
+# zero and negative values all go into bucket ZERO_BUCKET
+MAX_BUCKET = 2000
+ZERO_BUCKET = -MAX_BUCKET - 1
+
+
+def quantile_name(q):
+    """0.5 -> 'p50', 0.99 -> 'p99'."""
+    return f"p{q * 100:g}"
+
+
+def buckets(values):
+    """Sketch bucket number of every value."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.ceil(np.log(values) / np.log(GAMMA))
+    return np.where(values > 0, np.clip(index, -MAX_BUCKET, MAX_BUCKET), ZERO_BUCKET).astype('int64')
+
+
+def bucket_values(numbers):
+    """The value a bucket stands for: no more than SKETCH_ACCURACY away from anything in it."""
+    return np.where(numbers > ZERO_BUCKET, 2 * np.power(GAMMA, numbers.astype('float64')) / (GAMMA + 1), 0.0)
+
+
+def _tally(groups, values, counts=None):
+    """Every (group, value) pair once, sorted by group then value: (groups, values, counts).
+
+    ``counts`` says how many orders each input pair stands for (1 each by
+    default). The values are numbered in sorted order, so each pair is one
+    integer code (group x number of values + value number) and sorting the
+    different codes sorts by group, then value.
+    """
+    numbers, uniques = pd.factorize(values, sort=True)
+    size = max(len(uniques), 1)
+    pair_numbers, pairs = pd.factorize(groups.astype('int64') * size + numbers, sort=True)
+    totals = np.bincount(pair_numbers, weights=counts, minlength=len(pairs))
+    return pairs // size, np.asarray(uniques)[pairs % size], totals.astype('int64')
+
+
+class ValueDistribution:
+    """Values of one column (e.g. Revenue) per Region x Product x month.
+
+    ``keys`` has one row per Region x Product x month, as in
+    distinct.DistinctCounter. ``groups``, ``values`` and ``counts`` list every
+    (key row, value) pair once with its number of orders, sorted by key row
+    then value. With ``sketch=True`` the values are bucket numbers (see
+    buckets()) instead of the values themselves.
+    """
+
+    def __init__(self, keys, groups, values, counts, sketch=False):
+        self.keys = keys.reset_index(drop=True)
+        self.groups = groups
+        self.values = values
+        self.counts = counts
+        self.sketch = sketch
+
+    @property
+    def mode(self):
+        return 'sketch' if self.sketch else 'exact'
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _quantiles(self, rows, size, quantiles):
+        """size x len(quantiles) array of quantiles; ``rows`` maps key rows to groups."""
+        groups, values, counts = _tally(rows[self.groups], self.values, self.counts)
+        if self.sketch:
+            values = bucket_values(values)
+        # Orders are numbered 0, 1, 2... through all groups in turn; ends[i] is
+        # the number of orders up to and including pair i
+        ends = np.cumsum(counts)
+        totals = np.bincount(groups, weights=counts, minlength=size)
+        starts = np.cumsum(totals) - totals
+        last = starts + np.maximum(totals - 1, 0)
+        result = np.full((size, len(quantiles)), np.nan)
+        if len(values) == 0:
+            return result
+        for column, q in enumerate(quantiles):
+            position = starts + q * (totals - 1)
+            below = np.floor(position)
+            low = values[np.searchsorted(ends, below, side='right')]
+            high = values[np.searchsorted(ends, np.minimum(below + 1, last), side='right')]
+            result[:, column] = np.where(totals > 0, low + (high - low) * (position - below), np.nan)
+        return result
+
+    def quantiles(self, by=None, quantiles=QUANTILES):
+        """Quantiles in total (a Series: p50, p90, p99) or per key / list of keys (a DataFrame).
+
+        Any of Region, Product and the calendar keys that don't change within
+        a month (YearMonth, Month_Name, Quarter, Year...) can be used.
+        """
+        rows, index = key_groups(self.keys, by)
+        result = self._quantiles(rows, 1 if index is None else len(index), quantiles)
+        columns = [quantile_name(q) for q in quantiles]
+        if index is None:
+            return pd.Series(result[0], index=columns)
+        return pd.DataFrame(result, index=index, columns=columns)
+
+    def sketched(self):
+        """The same values in sketch mode (exact values can always be put into buckets)."""
+        if self.sketch:
+            return self
+        return ValueDistribution(self.keys, *_tally(self.groups, buckets(self.values), self.counts), sketch=True)
+
+    def where(self, name, value):
+        """Only the key rows where ``name`` (Region or Product) is ``value``."""
+        keep = (self.keys[name] == value).to_numpy()
+        new_rows = np.cumsum(keep) - 1
+        pairs = keep[self.groups]
+        return ValueDistribution(self.keys[keep], new_rows[self.groups[pairs]], self.values[pairs],
+                                 self.counts[pairs], self.sketch)
+
+    # ---- Saving ---------------------------------------------------------------
+
+    def to_frame(self):
+        """A table that can be saved with data_loader.write_frame()."""
+        frame = self.keys.take(self.groups).reset_index(drop=True)
+        frame['Bucket' if self.sketch else 'Value'] = self.values
+        frame['Count'] = self.counts
+        return frame.astype({'Region': 'category', 'Product': 'category'})
+
+    @classmethod
+    def from_frame(cls, frame):
+        """The other way round."""
+        keys, groups = saved_groups(frame)
+        sketch = 'Bucket' in frame.columns
+        values = frame['Bucket'].to_numpy(dtype='int64') if sketch else frame['Value'].to_numpy(dtype='float64')
+        return cls(keys, groups, values, frame['Count'].to_numpy(dtype='int64'), sketch)
+
+
+def build_distribution(df, column='Revenue', mode='exact', counts=None):
+    """Keep the values of ``column`` per Region x Product x month of ``df``, for quantiles.
+
+    ``counts`` says how many orders each row of ``df`` stands for, when the
+    rows are already grouped (as the SQL backend returns them).
+    """
+    if mode not in QUANTILE_MODES:
+        raise ValueError(f"Unknown quantile mode: {mode} (use one of {', '.join(QUANTILE_MODES)})")
+    values = np.asarray(df[column], dtype='float64')
+    present = ~np.isnan(values)
+    keys, groups = month_keys(df, present)
+    values = values[present]
+    if counts is not None:
+        counts = np.asarray(counts, dtype='float64')[present]
+    if mode == 'sketch':
+        values = buckets(values)
+    return ValueDistribution(keys, *_tally(groups, values, counts), sketch=mode == 'sketch')
+
+
+def merge_distributions(*distributions):
+    """Combine distributions built from different parts of the data (all in the same mode)."""
+    modes = {distribution.mode for distribution in distributions}
+    if len(modes) > 1:
+        raise ValueError("Can't merge exact quantiles with sketches")
+    keys, rows = align_keys([distribution.keys for distribution in distributions])
+    groups = np.concatenate([distribution_rows[distribution.groups]
+                             for distribution, distribution_rows in zip(distributions, rows)])
+    values = np.concatenate([distribution.values for distribution in distributions])
+    counts = np.concatenate([distribution.counts for distribution in distributions])
+    return ValueDistribution(keys, *_tally(groups, values, counts), sketch=modes == {'sketch'})
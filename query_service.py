@@ -0,0 +1,412 @@
+# Sales query service - ask questions without re-running a whole script
+# Loads the sales data ONCE, keeps the Region x Product x day cube in memory
+# and answers small HTTP/JSON queries from it in milliseconds:
+#
+#   /kpis                      totals, average order value, profit margin
+#   /rollup?by=Region          revenue/profit/orders by any cube or calendar key
+#   /top?group=Region&item=Product&n=3
+#   /status                    what is loaded, cache hits/misses
+#
+# Every query takes the same filters as the scripts (start=, end=, region=,
+# product=). Answers are kept in an LRU cache keyed by the query, and the data
+# file is watched: when it changes the cube is rebuilt in the background and
+# the cache is emptied. Only the standard library (asyncio) is used - no web
+# framework to install.
+#
+#   python query_service.py --port 8765
+#   curl 'http://127.0.0.1:8765/rollup?by=Region&start=2024-07-01&end=2024-09-30'
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from aggregations import MEASURES, build_sales_cube
+from data_loader import SOURCE_FILE, load_sales_data, source_signature, source_unchanged
+from partitions import list_partitions
+
+parser = argparse.ArgumentParser(description='Sales query service (HTTP/JSON)')
+parser.add_argument('--input', default=SOURCE_FILE,
+                    help='sales file or partitioned folder to serve (default: %(default)s)')
+parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+parser.add_argument('--port', type=int, default=8765, help='port to listen on (default: %(default)s)')
+parser.add_argument('--cache-size', type=int, default=256,
+                    help='query results kept in memory (default: %(default)s)')
+parser.add_argument('--reload-seconds', type=float, default=2.0,
+                    help='how often to check the data for changes, 0 = never (default: %(default)s)')
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class QueryError(ValueError):
+    """A query the service can't answer (bad key, bad date...) - sent back as a 400."""
+
+
+class ResultCache:
+    """The last ``size`` query results, least recently used thrown out first."""
+
+    def __init__(self, size=256):
+        self.size = size
+        self.results = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        if key not in self.results:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(key)
+        return self.results[key]
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+    def clear(self):
+        self.results.clear()
+
+
+# ---- Answering queries -----------------------------------------------------
+
+def _param(params, name, default=None):
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def _list_param(params, name):
+    """'a,b' or repeated name=a&name=b -> ['a', 'b'] (None when not given)."""
+    values = [value.strip() for text in params.get(name, []) for value in text.split(',') if value.strip()]
+    return values or None
+
+
+def _key_param(params, name):
+    """Like _list_param(), for keys of a table: each key may only be given once."""
+    keys = _list_param(params, name)
+    for key in keys or []:
+        if keys.count(key) > 1:
+            raise QueryError(f"{name}: {key} is given more than once")
+    return keys
+
+
+def _date_param(params, name):
+    text = _param(params, name)
+    if text is None:
+        return None
+    try:
+        return pd.Timestamp(text).normalize()
+    except ValueError:
+        raise QueryError(f"{name}: '{text}' is not a date (use YYYY-MM-DD)")
+
+
+def _int_param(params, name, default, minimum=None):
+    text = _param(params, name)
+    try:
+        value = default if text is None else int(text)
+    except ValueError:
+        raise QueryError(f"{name}: '{text}' is not a whole number")
+    if value is not None and minimum is not None and value < minimum:
+        raise QueryError(f"{name}: must be at least {minimum}")
+    return value
+
+
+def _measure_param(params, name='measure', default='Revenue'):
+    measure = _param(params, name, default)
+    if measure not in MEASURES:
+        raise QueryError(f"{name}: '{measure}' is not one of {', '.join(MEASURES)}")
+    return measure
+
+
+def filter_cube(cube, params):
+    """The part of the cube inside the query's start/end/region/product filters."""
+    start, end = _date_param(params, 'start'), _date_param(params, 'end')
+    regions, products = _list_param(params, 'region'), _list_param(params, 'product')
+    if start is None and end is None and not regions and not products:
+        return cube
+    cells = cube.cells
+    keep = pd.Series(True, index=cells.index)
+    if start is not None:
+        keep &= cells['Date'] >= start
+    if end is not None:
+        keep &= cells['Date'] <= end
+    if regions:
+        keep &= cells['Region'].isin(regions)
+    if products:
+        keep &= cells['Product'].isin(products)
+    return cube.where(keep.to_numpy())
+
+
+def _records(table):
+    """A roll-up table as a list of plain dicts (keys first, then the measures)."""
+    table = table.reset_index()
+    records = []
+    for row in table.to_dict(orient='records'):
+        records.append({key: _plain(value) for key, value in row.items()})
+    return records
+
+
+def _plain(value):
+    """numpy/pandas values -> things json can write."""
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, pd.Period):
+        return str(value)
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def query_kpis(cube, params):
+    """The headline numbers analyze_data.py prints."""
+    totals = cube.totals()
+    if totals['Orders'] == 0:
+        return {'revenue': 0.0, 'profit': 0.0, 'orders': 0, 'avg_order_value': None, 'profit_margin': None}
+    first_date, last_date = cube.date_range()
+    return {
+        'revenue': float(totals['Revenue']),
+        'profit': float(totals['Profit']),
+        'orders': totals['Orders'],
+        'avg_order_value': float(totals['Revenue'] / totals['Orders']),
+        'profit_margin': float(totals['Profit'] / totals['Revenue'] * 100),
+        'first_date': first_date.strftime('%Y-%m-%d'),
+        'last_date': last_date.strftime('%Y-%m-%d'),
+    }
+
+
+def query_rollup(cube, params):
+    """Totals by ``by`` (one or more keys), optionally sorted and cut to ``limit`` rows."""
+    by = _key_param(params, 'by')
+    if not by:
+        raise QueryError("by: give one or more keys, e.g. by=Region or by=Region,Month_Name")
+    sort = _param(params, 'sort', 'key')
+    if sort not in ('key', 'asc', 'desc'):
+        raise QueryError(f"sort: '{sort}' is not one of key, asc, desc")
+    measure = _measure_param(params)
+    limit = _int_param(params, 'limit', None, minimum=0)
+    try:
+        table = cube.rollup(by)
+    except KeyError as error:
+        raise QueryError(f"by: {error.args[0]}")
+    if sort != 'key':
+        table = table.sort_values(measure, ascending=sort == 'asc', kind='stable')
+    if limit is not None:
+        table = table.head(limit)
+    return {'by': by, 'rows': _records(table)}
+
+
+def query_top(cube, params):
+    """The ``n`` best ``item`` values within every ``group`` value (like advanced_analysis.py)."""
+    group, item = _key_param(params, 'group'), _key_param(params, 'item')
+    if not group or not item:
+        raise QueryError("group and item are needed, e.g. group=Region&item=Product")
+    shared = [key for key in group if key in item]
+    if shared:
+        raise QueryError(f"group and item can't both use {', '.join(shared)}")
+    n = _int_param(params, 'n', 3, minimum=1)
+    measure = _measure_param(params)
+    try:
+        table = cube.top_n(group, item, n=n, measure=measure)
+    except KeyError as error:
+        raise QueryError(f"group/item: {error.args[0]}")
+    return {'group': group, 'item': item, 'rows': _records(table.set_index(group + item))}
+
+
+QUERIES = {
+    '/kpis': query_kpis,
+    '/rollup': query_rollup,
+    '/top': query_top,
+}
+
+
+def query_key(path, params):
+    """The cache key of a query: the same question asked in any order is one key."""
+    return path, tuple(sorted((name, tuple(values)) for name, values in params.items()))
+
+
+# ---- Keeping the data loaded ---------------------------------------------
+
+def _quick_stamp(path):
+    """Sizes and modification times only - cheap enough to check every few seconds."""
+    if os.path.isdir(path):
+        stats = [(file, os.stat(file)) for file, _ in list_partitions(path)]
+        return tuple((file, stat.st_size, stat.st_mtime_ns) for file, stat in stats)
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SalesService:
+    """The loaded cube, the result cache and the file watcher."""
+
+    def __init__(self, path, cache_size=256):
+        self.path = path
+        self.cache = ResultCache(cache_size)
+        self.cube = None
+        self.signature = None
+        self.stamp = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.reloads = 0
+        # Goes up by one every time a new cube is swapped in
+        self.generation = 0
+
+    def load(self):
+        """Read the data and build the cube (blocking - run it in a thread once serving)."""
+        started = time.perf_counter()
+        stamp = _quick_stamp(self.path)
+        signature = source_signature(self.path)
+        cube = build_sales_cube(load_sales_data(self.path))
+        # Swap everything in at once, so a query never sees half of a reload
+        self.cube, self.signature, self.stamp = cube, signature, stamp
+        self.generation += 1
+        self.cache.clear()
+        self.loaded_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.load_seconds = time.perf_counter() - started
+
+    def changed(self):
+        """Has the data changed since it was loaded? (touching the file doesn't count)"""
+        try:
+            stamp = _quick_stamp(self.path)
+        except OSError:
+            return False  # in the middle of being replaced - look again next time
+        if stamp == self.stamp:
+            return False
+        if source_unchanged(self.path, self.signature):
+            self.stamp = stamp
+            return False
+        return True
+
+    def answer(self, path, params):
+        """(status, result dict, cache hit?) for one request."""
+        if path == '/status':
+            return 200, self.status(), False
+        if path not in QUERIES:
+            return 404, {'error': f"unknown query {path}", 'queries': sorted(QUERIES) + ['/status']}, False
+        if self.cube is None:
+            return 503, {'error': 'data is still loading'}, False
+
+        key = query_key(path, params)
+        result = self.cache.get(key)
+        if result is not None:
+            return 200, result, True
+        # A reload can swap the cube (and empty the cache) while we work on
+        # the old one; that answer is still fine to send but not to keep
+        cube, generation = self.cube, self.generation
+        try:
+            result = QUERIES[path](filter_cube(cube, params), params)
+        except QueryError as error:
+            return 400, {'error': str(error)}, False
+        if self.generation == generation:
+            self.cache.put(key, result)
+        return 200, result, False
+
+    def status(self):
+        return {
+            'input': self.path,
+            'orders': self.cube.totals()['Orders'] if self.cube is not None else None,
+            'cube_cells': len(self.cube) if self.cube is not None else None,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds else None,
+            'reloads': self.reloads,
+            'cache': {'entries': len(self.cache.results), 'size': self.cache.size,
+                      'hits': self.cache.hits, 'misses': self.cache.misses},
+        }
+
+    async def watch(self, every_seconds):
+        """Rebuild the cube in the background whenever the data changes."""
+        while True:
+            await asyncio.sleep(every_seconds)
+            if not await asyncio.to_thread(self.changed):
+                continue
+            print(f"🔄 {self.path} changed - reloading...")
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as error:  # keep serving the old data
+                print(f"⚠️  Reload failed, still serving the previous data: {error}")
+                continue
+            self.reloads += 1
+            print(f"✅ Reloaded {self.cube.totals()['Orders']:,} orders in {self.load_seconds:.2f}s")
+
+
+# ---- HTTP ------------------------------------------------------------------
+
+async def _read_request(reader):
+    """(method, target) of one HTTP request; the headers are read and ignored."""
+    request_line = (await reader.readline()).decode('latin-1').strip()
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+    parts = request_line.split()
+    if len(parts) < 2:
+        return None, None
+    return parts[0], parts[1]
+
+
+def _response(status, result, cache_hit, seconds):
+    body = json.dumps(result).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"X-Cache: {'hit' if cache_hit else 'miss'}\r\n"
+            f"X-Query-Ms: {seconds * 1000:.2f}\r\n"
+            "Connection: close\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+def make_handler(service):
+    async def handle(reader, writer):
+        try:
+            method, target = await _read_request(reader)
+            started = time.perf_counter()
+            if method is None:
+                return
+            if method != 'GET':
+                status, result, hit = 405, {'error': 'only GET is supported'}, False
+            else:
+                url = urlsplit(target)
+                try:
+                    status, result, hit = service.answer(url.path.rstrip('/') or '/', parse_qs(url.query))
+                except Exception as error:  # a bug shouldn't leave the client without an answer
+                    print(f"⚠️  {target} failed: {error!r}")
+                    status, result, hit = 500, {'error': f"internal error: {error}"}, False
+            writer.write(_response(status, result, hit, time.perf_counter() - started))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(args):
+    service = SalesService(args.input, args.cache_size)
+    print(f"🔄 Loading data from {args.input}...")
+    await asyncio.to_thread(service.load)
+    print(f"✅ {service.cube.totals()['Orders']:,} orders in a {len(service.cube):,}-cell cube "
+          f"({service.load_seconds:.2f}s)")
+
+    server = await asyncio.start_server(make_handler(service), args.host, args.port)
+    if args.reload_seconds > 0:
+        service.watcher = asyncio.create_task(service.watch(args.reload_seconds))  # keep a reference
+    print(f"🚀 Serving on http://{args.host}:{args.port}  (queries: {', '.join(sorted(QUERIES))}, /status)")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+
+
+if __name__ == '__main__':
+    main()
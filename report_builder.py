@@ -0,0 +1,412 @@
+# Report builder - the executive summary as metrics + a template
+# The report used to be one long chain of f-strings glued together with +=,
+# working numbers out again inside the text as it went. Now it is two steps:
+#   1. report_metrics() works out every number once into a plain dict
+#      (also what --metrics json/csv saves for other programs)
+#   2. render_report() fills the templates below from that dict and writes the
+#      pieces straight to a file (or any writer), without building one big string
+# The templates are turned into bound format functions once, when this module
+# is imported, so each report only fills them in.
+
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import numpy as np
+
+from quantiles import QUANTILES, quantile_name
+from timeseries import time_series
+
+RULE = '=' * 70
+WRITE_BUFFER_BYTES = 64 * 1024
+
+METRICS_FORMATS = ['json', 'csv']
+
+# Metric name -> order column whose median/p90/p99 the report shows
+ORDER_SIZES = {'order_value': 'Revenue', 'basket_size': 'Quantity'}
+
+
+def _compile(template):
+    """A template string -> a function filling it from a dict of fields."""
+    return template.format_map
+
+
+HEADER = _compile("""
+{rule}
+                   SALES PERFORMANCE EXECUTIVE SUMMARY
+{rule}
+
+Report Generated: {generated:%B %d, %Y at %I:%M %p}
+Analysis Period: {first_date:%B %Y} - {last_date:%B %Y}{scope_line}
+
+{rule}
+                        KEY PERFORMANCE INDICATORS
+{rule}
+
+Financial Performance:
+   • Total Revenue:              ${total_revenue:>15,.2f}
+   • Total Profit:               ${total_profit:>15,.2f}
+   • Profit Margin:              {profit_margin:>15.2f}%
+   • Average Order Value:        ${avg_order:>15,.2f}
+
+Sales Volume:
+   • Total Orders:               {total_orders:>15,}
+   • Average Orders per Day:     {orders_per_day:>15.1f}{customer_lines}{order_size_lines}
+
+{rule}
+                         REGIONAL PERFORMANCE
+{rule}
+
+Revenue by Region:
+""")
+# Only shown when the orders have a Customer_ID ('~' marks a sketch estimate)
+CUSTOMER_LINES = _compile("""
+   • Unique Customers:           {customers_text:>15}
+   • Orders per Customer:        {orders_per_customer:>15.2f}""")
+
+# Only shown when the cube kept quantiles
+ORDER_SIZE_HEADER = _compile("""
+
+Order Size{estimated_note}:
+                                   Median         p90         p99""")
+ORDER_SIZE_LINE = _compile("""
+   • {label:22s}  {p50:>12}{p90:>12}{p99:>12}""")
+
+REGION_LINE = _compile("   • {region:10s}  ${revenue:>12,.2f}  ({pct:>5.1f}% of total)\n")
+
+PRODUCT_HEADER = _compile("""
+🏆 Top Performing Region: {best_region}
+
+{rule}
+                         PRODUCT PERFORMANCE
+{rule}
+
+Top 5 Products by Revenue:
+""")
+PRODUCT_LINE = _compile("   {rank}. {product:15s}  ${revenue:>12,.2f}\n")
+
+PRODUCT_FOOTER = _compile("""
+🏆 Best Selling Product: {best_product}
+💎 Highest Profit Margin: {highest_margin_product} ({highest_margin:.1f}%)
+
+Top {top} Products by Region:
+""")
+REGION_TOP_LINE = _compile("   • {region:10s}  {product_list}\n")
+
+TEMPORAL_HEADER = _compile("""
+{rule}
+                        TEMPORAL ANALYSIS
+{rule}
+
+Best Performing Month: {best_month} (${best_month_revenue:,.2f})
+
+Quarterly Breakdown:
+""")
+QUARTER_LINE = _compile("   Q{quarter}: Revenue ${revenue:>12,.2f}  |  Profit ${profit:>12,.2f}  |  Margin {margin:.1f}%\n")
+
+MONTHLY_HEADER = _compile("""
+Monthly Trend:
+   Month         Revenue      MoM   3-Mo Average   Year to Date
+""")
+MONTH_LINE = _compile("   {month:7s}  ${revenue:>11,.2f}  {mom_text:>7}  {average_text:>13}  ${year_to_date:>12,.2f}\n")
+
+INSIGHTS = _compile("""
+{rule}
+                        KEY INSIGHTS & RECOMMENDATIONS
+{rule}
+
+Strategic Insights:
+
+1. Regional Focus:
+   → {best_region} region leads with {best_region_pct:.1f}% of total revenue
+   → Recommendation: Increase marketing investment in {best_region} region
+
+2. Product Strategy:
+   → {best_product} generates highest revenue (${best_product_revenue:,.2f})
+   → {highest_margin_product} has best profit margin ({highest_margin:.1f}%)
+   → Recommendation: Expand {highest_margin_product} product line for better margins
+
+3. Growth Trend:
+   → {growth_direction} trend: {growth:+.1f}% growth from start to end period
+   → Latest month ({latest_month}): {latest_change}
+   → Recommendation: {growth_advice}
+
+4. Operational Efficiency:
+   → Profit margin of {profit_margin:.1f}% is {margin_rating}
+   → Average order value: ${avg_order:.2f}
+   → Recommendation: Focus on upselling to increase AOV
+
+{rule}
+                              CONCLUSION
+{rule}
+
+Overall Performance: {overall}
+
+The sales data shows {regional_spread}.
+{best_product} and {highest_margin_product} are key revenue and profit drivers respectively.
+
+Next Steps:
+   1. Implement targeted campaigns in {best_region} region
+   2. Increase inventory for {best_product}
+   3. Optimize pricing for {highest_margin_product} to maximize margins
+   4. Monitor monthly trends and adjust strategies quarterly
+
+{rule}
+
+Report prepared by: Sales Analytics System
+Data source: {data_source}
+Total records analyzed: {total_orders:,}
+
+{rule}
+""")
+
+
+def report_metrics(cube, top=3, data_source='', scope=None):
+    """Every number the executive summary shows, as a dict of plain values.
+
+    Lists of rows (regions, products, quarters...) are lists of dicts, so the
+    result can be saved as JSON as it is. ``scope`` (e.g. 'Region: North')
+    says which part of the business the numbers cover. Customer numbers are
+    None when the cube has no customer counts, order size quantiles (e.g.
+    order_value_p90) when it kept no quantiles.
+    """
+    totals = cube.totals()
+    first_date, last_date = cube.date_range()
+    total_revenue = float(totals['Revenue'])
+    total_profit = float(totals['Profit'])
+    total_orders = totals['Orders']
+
+    # Regional performance
+    region_sales = cube.rollup('Region')['Revenue'].sort_values(ascending=False)
+    best_region = str(region_sales.index[0])
+
+    # Product performance
+    product_profit = cube.rollup('Product')
+    product_sales = product_profit['Revenue'].sort_values(ascending=False)
+    margins = (product_profit['Profit'] / product_profit['Revenue']) * 100
+    highest_margin = margins.idxmax()
+
+    # Monthly performance
+    monthly = cube.rollup('Month_Name')['Revenue']
+    best_month = monthly.idxmax()
+
+    # Best products in each region (one sort for all regions)
+    top_products = cube.top_n('Region', 'Product', n=top)
+    by_region = {str(region): [str(product) for product in rows['Product']]
+                 for region, rows in top_products.groupby('Region', observed=True)}
+
+    quarterly = cube.rollup('Quarter')
+
+    # Different days with orders and different customers, per region/product/month
+    customers = cube.distinct_customers()
+    days = {key: cube.distinct_days(key) for key in ('Region', 'Product', 'YearMonth')}
+    buyers = {key: cube.distinct_customers(key) for key in days}
+
+    def activity(key, value):
+        return {'days': int(days[key].get(value, 0)),
+                'customers': None if buyers[key] is None else int(buyers[key].get(value, 0))}
+
+    # Median, p90 and p99 order value and basket size, overall and per region/product/month
+    size_tables = {(name, key): cube.value_quantiles(column, key)
+                   for name, column in ORDER_SIZES.items() for key in (None, 'Region', 'Product', 'YearMonth')}
+
+    def order_size(key=None, value=None):
+        fields = {}
+        for name in ORDER_SIZES:
+            table = size_tables[name, key]
+            row = table if key is None or table is None else table.loc[value] if value in table.index else None
+            for q in QUANTILES:
+                fields[f'{name}_{quantile_name(q)}'] = None if row is None else float(row[quantile_name(q)])
+        return fields
+
+    # Month by month on a gap-free calendar: growth, moving average, running totals
+    trend = time_series(cube, 'M')
+    month_growth = _numbers(trend.growth()[0])
+    year_growth = _numbers(trend.year_over_year()[0])
+    average = _numbers(trend.moving_average('Revenue', 3)[0])
+    running = {measure: trend.cumulative(measure)[0] for measure in ('Revenue', 'Profit')}
+    years = trend.periods.year.to_numpy()
+    year_to_date = running['Revenue'] - np.r_[0.0, running['Revenue'][:-1]][np.searchsorted(years, years)]
+
+    # Growth trend
+    monthly_sorted = cube.rollup('YearMonth')['Revenue']
+    if len(monthly_sorted) > 1:
+        first_month = monthly_sorted.iloc[0]
+        last_month = monthly_sorted.iloc[-1]
+        growth = float((last_month - first_month) / first_month * 100)
+    else:
+        growth = 0.0
+
+    return {
+        'generated': datetime.now(),
+        'data_source': data_source,
+        'scope': scope,
+        'first_date': first_date.date(),
+        'last_date': last_date.date(),
+        'total_revenue': total_revenue,
+        'total_profit': total_profit,
+        'profit_margin': total_profit / total_revenue * 100,
+        'total_orders': total_orders,
+        'avg_order': total_revenue / total_orders,
+        'orders_per_day': total_orders / cube.distinct_days(),
+        'customers': customers,
+        'customers_estimated': customers is not None and cube.customers.mode == 'sketch',
+        'orders_per_customer': total_orders / customers if customers else None,
+        **order_size(),
+        'order_sizes_estimated': any(distribution.mode == 'sketch' for distribution in cube.distributions.values()),
+        'regions': [{'region': str(region), 'revenue': float(revenue), 'pct': float(revenue / total_revenue * 100),
+                     **activity('Region', region), **order_size('Region', region)}
+                    for region, revenue in region_sales.items()],
+        'best_region': best_region,
+        'best_region_pct': float(region_sales.iloc[0] / total_revenue * 100),
+        # Same test as always: regions within 20% of each other (std / mean)
+        'regions_even': bool(region_sales.std() < region_sales.mean() * 0.2),
+        'top_products': [{'product': str(product), 'rank': rank, 'revenue': float(revenue),
+                          **activity('Product', product), **order_size('Product', product)}
+                         for rank, (product, revenue) in enumerate(product_sales.head(5).items(), 1)],
+        'best_product': str(product_sales.index[0]),
+        'best_product_revenue': float(product_sales.iloc[0]),
+        'highest_margin_product': str(highest_margin),
+        'highest_margin': float(margins[highest_margin]),
+        'top': top,
+        'top_products_by_region': [{'region': str(region), 'products': by_region[str(region)]}
+                                   for region in region_sales.index],
+        'best_month': str(best_month),
+        'best_month_revenue': float(monthly[best_month]),
+        'quarters': [{'quarter': int(quarter), 'revenue': float(row['Revenue']), 'profit': float(row['Profit']),
+                      'margin': float(row['Profit'] / row['Revenue'] * 100)}
+                     for quarter, row in quarterly.iterrows()],
+        'months': [{'month': str(month), 'revenue': float(trend.values['Revenue'][0, i]),
+                    'profit': float(trend.values['Profit'][0, i]), 'orders': int(trend.values['Orders'][0, i]),
+                    **activity('YearMonth', month), **order_size('YearMonth', month),
+                    'mom_growth': month_growth[i], 'yoy_growth': year_growth[i], 'revenue_3m_avg': average[i],
+                    'year_to_date': float(year_to_date[i]),
+                    'cumulative_revenue': float(running['Revenue'][i]), 'cumulative_profit': float(running['Profit'][i])}
+                   for i, month in enumerate(trend.periods)],
+        'latest_month': str(trend.periods[-1]),
+        'latest_mom_growth': month_growth[-1],
+        'latest_yoy_growth': year_growth[-1],
+        'growth': growth,
+    }
+
+
+def _numbers(values):
+    """Array -> list of floats, with None where there is no number (NaN), for JSON."""
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def _fields(metrics):
+    """The metrics plus the wording that depends on them."""
+    growing = metrics['growth'] > 0
+    healthy = metrics['profit_margin'] > 25
+    changes = []
+    if metrics['latest_mom_growth'] is not None:
+        changes.append(f"{metrics['latest_mom_growth']:+.1f}% vs previous month")
+    if metrics['latest_yoy_growth'] is not None:
+        changes.append(f"{metrics['latest_yoy_growth']:+.1f}% vs a year earlier")
+    customer_lines = ''
+    if metrics['customers'] is not None:
+        customers_text = f"{'~' if metrics['customers_estimated'] else ''}{metrics['customers']:,}"
+        customer_lines = CUSTOMER_LINES(dict(metrics, customers_text=customers_text))
+    order_size_lines = ''
+    for name, label, text in (('order_value', 'Order Value:', '${:,.2f}'),
+                              ('basket_size', 'Basket Size (units):', '{:,.1f}')):
+        if metrics[f'{name}_p50'] is None:
+            continue
+        if not order_size_lines:
+            order_size_lines = ORDER_SIZE_HEADER(
+                {'estimated_note': ' (estimated, within 1%)' if metrics['order_sizes_estimated'] else ''})
+        order_size_lines += ORDER_SIZE_LINE({'label': label, **{
+            quantile_name(q): text.format(metrics[f'{name}_{quantile_name(q)}']) for q in QUANTILES}})
+    return dict(
+        metrics,
+        rule=RULE,
+        scope_line=f"\nScope: {metrics['scope']}" if metrics['scope'] else '',
+        customer_lines=customer_lines,
+        order_size_lines=order_size_lines,
+        latest_change=', '.join(changes) or 'no earlier month to compare with',
+        growth_direction='Positive' if growing else 'Negative',
+        growth_advice='Maintain current strategies' if growing else 'Review sales strategies',
+        margin_rating='healthy' if healthy else 'acceptable',
+        overall='STRONG' if healthy and growing else 'MODERATE',
+        regional_spread=('strong performance across all regions' if metrics['regions_even']
+                         else 'varied regional performance'),
+    )
+
+
+def render_report(metrics, out):
+    """Write the executive summary for ``metrics`` to the writer ``out``."""
+    fields = _fields(metrics)
+    out.write(HEADER(fields))
+    for row in metrics['regions']:
+        out.write(REGION_LINE(row))
+    out.write(PRODUCT_HEADER(fields))
+    for row in metrics['top_products']:
+        out.write(PRODUCT_LINE(row))
+    out.write(PRODUCT_FOOTER(fields))
+    for row in metrics['top_products_by_region']:
+        out.write(REGION_TOP_LINE({'region': row['region'], 'product_list': ', '.join(row['products'])}))
+    out.write(TEMPORAL_HEADER(fields))
+    for row in metrics['quarters']:
+        out.write(QUARTER_LINE(row))
+    out.write(MONTHLY_HEADER(fields))
+    for row in metrics['months']:
+        out.write(MONTH_LINE(dict(
+            row,
+            mom_text='-' if row['mom_growth'] is None else f"{row['mom_growth']:+.1f}%",
+            average_text='-' if row['revenue_3m_avg'] is None else f"${row['revenue_3m_avg']:,.2f}",
+        )))
+    out.write(INSIGHTS(fields))
+
+
+def report_text(metrics):
+    """The executive summary as one string (for printing)."""
+    out = io.StringIO()
+    render_report(metrics, out)
+    return out.getvalue()
+
+
+def write_report(metrics, filename):
+    """Save the executive summary through a buffered file writer."""
+    with open(filename, 'w', encoding='utf-8', buffering=WRITE_BUFFER_BYTES) as f:
+        render_report(metrics, f)
+
+
+# ---- Metrics for other programs ------------------------------------------
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Can't save {type(value).__name__} as JSON")
+
+
+def metrics_rows(metrics):
+    """The metrics as (section, key, metric, value) rows, e.g. for a CSV file.
+
+    Single numbers are in the 'summary' section; every list (regions,
+    quarters...) is its own section, keyed by the first column of its rows.
+    """
+    rows = []
+    for name, value in metrics.items():
+        if isinstance(value, list):
+            for row in value:
+                key_column, *columns = row
+                for column in columns:
+                    cell = row[column]
+                    rows.append((name, row[key_column], column, ', '.join(cell) if isinstance(cell, list) else cell))
+        else:
+            rows.append(('summary', '', name, _plain(value) if isinstance(value, (date, datetime)) else value))
+    return rows
+
+
+def write_metrics(metrics, filename, fmt='json'):
+    """Save ``metrics`` as JSON (nested, like the dict) or CSV (one row per number)."""
+    with open(filename, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_BYTES) as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(['section', 'key', 'metric', 'value'])
+            writer.writerows(metrics_rows(metrics))
+        else:
+            json.dump(metrics, f, indent=2, default=_plain)
+            f.write('\n')
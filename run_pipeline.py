@@ -0,0 +1,284 @@
+# Pipeline runner - runs the whole project with one command
+# Instead of starting six separate Python programs (each one re-importing
+# pandas and re-loading the data), this runs every script as a "stage" inside
+# one program:
+#   - the data is loaded and aggregated only once and shared by all stages
+#   - stages that don't depend on each other (charts, forecast, report...)
+#     run at the same time
+#   - a stage whose inputs (data + code) haven't changed since the last run,
+#     and whose output files are still the ones it wrote, is skipped and its
+#     previous output is shown instead
+
+import argparse
+import hashlib
+import importlib
+import io
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import profiling
+from data_loader import (SOURCE_FILE, NoOrdersError, add_input_arguments, cache_file, file_hash, input_filters,
+                         load_sales_data, read_json, source_signature, write_json)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Stage name -> (script module, stages it depends on, files it writes)
+# 'data' is the shared load + aggregation step every analysis stage reads from.
+STAGES = {
+    'generate': ('generate_data', [], [SOURCE_FILE]),
+    'data': (None, ['generate'], []),
+    'analyze': ('analyze_data', ['data'], []),
+    'charts': ('create_charts', ['data'], ['charts/revenue_by_region.png', 'charts/revenue_by_product.png',
+                                           'charts/region_distribution.png', 'charts/revenue_trend.png']),
+    'forecast': ('forecast_sales', ['data'], ['charts/sales_forecast.png']),
+    'advanced': ('advanced_analysis', ['data'], ['charts/advanced_dashboard.png']),
+    'report': ('generate_report', ['data'], ['EXECUTIVE_SUMMARY.txt']),
+}
+
+
+class SharedData:
+    """The sales data, loaded the first time a stage actually needs it."""
+
+    def __init__(self, path, filters=None):
+        self.path = path
+        self.filters = filters or {}
+        self._lock = threading.Lock()
+        self._loaded = None
+
+    def get(self):
+        with self._lock:
+            if self._loaded is None:
+                from aggregations import build_sales_cube
+                with profiling.span('pipeline: load data'):
+                    df = load_sales_data(self.path, **self.filters)
+                    self._loaded = (df, build_sales_cube(df))
+            return self._loaded
+
+
+class StageOutput:
+    """Stand-in for sys.stdout that gives every stage thread its own buffer.
+
+    Stages run at the same time, so their print() output would otherwise be
+    mixed together line by line.
+    """
+
+    def __init__(self, real):
+        self.real = real
+        self.local = threading.local()
+
+    def _target(self):
+        return getattr(self.local, 'buffer', None) or self.real
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def capture(self):
+        self.local.buffer = io.StringIO()
+
+    def release(self):
+        text = self.local.buffer.getvalue()
+        self.local.buffer = None
+        return text
+
+
+def code_hash(module_name, seen=None):
+    """Hash of a script plus every local module it imports (directly or not)."""
+    seen = set() if seen is None else seen
+    if module_name in seen:
+        return ''
+    seen.add(module_name)
+    path = os.path.join(HERE, module_name + '.py')
+    if not os.path.exists(path):
+        return ''
+    with open(path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha256(source)
+    for name in sorted(set(re.findall(rb'^\s*(?:from|import)\s+(\w+)', source, re.MULTILINE))):
+        digest.update(code_hash(name.decode(), seen).encode())
+    return digest.hexdigest()
+
+
+def stage_key(name, dep_keys, path, argv=()):
+    """Everything that decides a stage's output: its code, its inputs, its options and its upstream stages."""
+    module_name, _, _ = STAGES[name]
+    digest = hashlib.sha256(name.encode())
+    digest.update(' '.join(argv).encode())
+    if module_name:
+        digest.update(code_hash(module_name).encode())
+    if name == 'data':
+        digest.update(source_signature(path)['sha256'].encode())
+    for key in dep_keys:
+        digest.update(key.encode())
+    return digest.hexdigest()
+
+
+def input_args(path=SOURCE_FILE, start=None, end=None, regions=None):
+    """The --input/--start/--end/--region options that describe the data being analysed."""
+    argv = [] if path == SOURCE_FILE else ['--input', path]
+    if start is not None:
+        argv += ['--start', str(start.date())]
+    if end is not None:
+        argv += ['--end', str(end.date())]
+    if regions:
+        argv += ['--region', ','.join(regions)]
+    return argv
+
+
+def stage_args(name, no_charts=False, data_args=()):
+    """Command-line options passed to a stage's script."""
+    if name == 'generate':
+        return []
+    argv = list(data_args)
+    if no_charts and name in ('forecast', 'advanced'):
+        argv.append('--no-charts')
+    return argv
+
+
+def stage_outputs(name, no_charts=False):
+    """Files a stage writes (no PNGs in text-only mode)."""
+    return [out for out in STAGES[name][2] if not (no_charts and out.endswith('.png'))]
+
+
+def output_hashes(outputs):
+    """SHA-256 of every output file (None if it is missing).
+
+    Saved with the stage, so a file that was deleted or overwritten since -
+    e.g. by running the script on its own with other options - is noticed.
+    """
+    hashes = {}
+    for out in outputs:
+        file = os.path.join(HERE, out)
+        hashes[out] = file_hash(file) if os.path.exists(file) else None
+    return hashes
+
+
+def _run_stage(name, data, output, argv):
+    module_name, _, _ = STAGES[name]
+    if module_name is None:
+        return ''
+    output.capture()
+    try:
+        module = importlib.import_module(module_name)
+        if name == 'generate':
+            module.main(argv)
+        else:
+            df, cube = data.get()
+            module.main(argv, df=df, cube=cube)
+    finally:
+        text = output.release()
+    return text
+
+
+def run_pipeline(selected, path=SOURCE_FILE, force=False, workers=4, no_charts=False,
+                 start=None, end=None, regions=None):
+    """Run the selected stages (plus what they depend on) in dependency order.
+
+    ``no_charts`` runs the text-only version: the charts stage is left out and
+    the other stages skip their charts, so matplotlib is never imported.
+    ``start``/``end``/``regions`` limit the analysis to those orders.
+    """
+    if no_charts:
+        selected = [name for name in selected if name != 'charts']
+
+    # Work out every stage that is needed, including dependencies
+    needed = set()
+    todo = list(selected)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(dep for dep in STAGES[name][1] if dep in selected or dep == 'data')
+
+    state_file = cache_file(path, 'pipeline.json')
+    state = read_json(state_file) or {}
+    data = SharedData(path, {'start': start, 'end': end, 'regions': regions})
+    data_args = input_args(path, start, end, regions)
+    keys, done, running = {}, set(), {}
+
+    output = StageOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while len(done) < len(needed):
+                for name in sorted(needed - done - set(running)):
+                    deps = [dep for dep in STAGES[name][1] if dep in needed]
+                    if not all(dep in done for dep in deps):
+                        continue
+                    argv = stage_args(name, no_charts, data_args)
+                    keys[name] = stage_key(name, [keys[dep] for dep in deps], path, argv)
+                    previous = state.get(name, {})
+                    hashes = output_hashes(stage_outputs(name, no_charts))
+                    outputs_unchanged = None not in hashes.values() and previous.get('outputs') == hashes
+                    if not force and name != 'generate' and previous.get('key') == keys[name] and outputs_unchanged:
+                        _report(output, name, previous.get('output', ''), cached=True)
+                        done.add(name)
+                        continue
+                    running[name] = (pool.submit(_run_stage, name, data, output, argv), time.perf_counter())
+
+                if not running:
+                    continue
+                finished, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+                for name, (future, started) in list(running.items()):
+                    if future not in finished:
+                        continue
+                    del running[name]
+                    text = future.result()
+                    _report(output, name, text, seconds=time.perf_counter() - started)
+                    if STAGES[name][0] is not None:
+                        state[name] = {'key': keys[name], 'output': text,
+                                       'outputs': output_hashes(stage_outputs(name, no_charts))}
+                        write_json(state_file, state)
+                    done.add(name)
+    finally:
+        sys.stdout = output.real
+
+
+def _report(output, name, text, cached=False, seconds=None):
+    if STAGES[name][0] is None:
+        return
+    status = '⏭️  unchanged, showing last output' if cached else f'✅ {seconds:.2f}s'
+    output.real.write(f"\n{'#' * 60}\n# STAGE: {name}  ({status})\n{'#' * 60}\n")
+    output.real.write(text)
+    output.real.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the whole sales analytics pipeline')
+    parser.add_argument('--generate', action='store_true', help='generate a new sales_data.xlsx first')
+    parser.add_argument('--only', help='comma-separated stages to run, e.g. analyze,report')
+    parser.add_argument('--force', action='store_true', help='re-run stages even if nothing changed')
+    parser.add_argument('--workers', type=int, default=4, help='stages to run at the same time')
+    parser.add_argument('--no-charts', action='store_true', help='text only - skip every chart')
+    add_input_arguments(parser)
+    parser.add_argument('--profile', action='store_true', help='record step timings to PROFILE.json')
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiling.enable()
+
+    selected = [name for name in STAGES if name not in ('generate', 'data')]
+    if args.only:
+        selected = [name.strip() for name in args.only.split(',')]
+        unknown = [name for name in selected if name not in STAGES]
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    if args.generate:
+        selected.append('generate')
+
+    start = time.perf_counter()
+    try:
+        run_pipeline(selected, args.input, force=args.force, workers=args.workers, no_charts=args.no_charts,
+                     **input_filters(args))
+    except NoOrdersError as error:
+        parser.error(str(error))
+    print(f"\n🏁 Pipeline finished in {time.perf_counter() - start:.2f} seconds")
+
+
+if __name__ == '__main__':
+    main()
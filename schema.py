@@ -0,0 +1,106 @@
+# Sales table schema - the compact column types every script works with
+# Straight out of Excel/CSV the table is stored loosely: Order_ID is a string
+# like 'ORD-10416', Product and Region are Python strings, Quantity is a 64-bit
+# integer. Here every column gets the smallest type that holds its values:
+#
+#   Order_ID   'ORD-10416' -> 10416 (integer)
+#   Date       datetime at midnight (whole days; pandas has no day-sized unit)
+#   Product    category (small integer codes + a lookup table)
+#   Region     category
+#   Quantity   int8 (a few units per order)
+#   Unit_Price, Revenue, Profit   float64, or float32 with SALES_MONEY_DTYPE=float32
+#   Customer_ID  category, if the data has customers (each ID stored once)
+#
+# Groupbys then run on integer codes, and a big export takes a fraction of the
+# memory. A column whose values don't fit its small type is widened, never cut.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+ORDER_PREFIX = 'ORD-'
+
+CATEGORY_COLUMNS = ['Region', 'Product']
+INTEGER_COLUMNS = {'Order_ID': 'int32', 'Quantity': 'int8'}
+MONEY_COLUMNS = ['Unit_Price', 'Revenue', 'Profit']
+
+# float32 halves the money columns but keeps only ~7 significant digits,
+# so totals can be off by a few cents - it is opt-in
+MONEY_DTYPE = os.environ.get('SALES_MONEY_DTYPE', 'float64')
+
+
+def parse_order_ids(order_ids):
+    """'ORD-10042' -> 10042 for a whole column (numbers are passed through)."""
+    if pd.api.types.is_numeric_dtype(order_ids):
+        return order_ids.to_numpy(dtype='int64')
+    text = order_ids.astype(str)
+    if text.str.startswith(ORDER_PREFIX).all():
+        digits = text.str.slice(len(ORDER_PREFIX))
+    else:
+        digits = text.str.extract(r'(\d+)$')[0]
+    return digits.astype('int64').to_numpy()
+
+
+def format_order_ids(numbers):
+    """The other way round: 10042 -> 'ORD-10042'."""
+    return ORDER_PREFIX + pd.Series(numbers).astype(str)
+
+
+def _fitting_int(values, dtype):
+    """``dtype`` if every value fits in it, otherwise the next bigger integer type."""
+    if len(values) == 0:
+        return dtype
+    low, high = values.min(), values.max()
+    for candidate in ('int8', 'int16', 'int32', 'int64'):
+        if np.dtype(candidate).itemsize < np.dtype(dtype).itemsize:
+            continue
+        info = np.iinfo(candidate)
+        if low >= info.min and high <= info.max:
+            return candidate
+    return 'int64'
+
+
+def apply_schema(df, money_dtype=None):
+    """Convert a freshly read sales table to the compact types (in place, also returned)."""
+    money_dtype = money_dtype or MONEY_DTYPE
+
+    if 'Order_ID' in df.columns:
+        numbers = parse_order_ids(df['Order_ID'])
+        df['Order_ID'] = numbers.astype(_fitting_int(numbers, INTEGER_COLUMNS['Order_ID']))
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date']).dt.normalize().astype('datetime64[s]')
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    if 'Quantity' in df.columns:
+        quantity = df['Quantity'].to_numpy(dtype='int64')
+        df['Quantity'] = quantity.astype(_fitting_int(quantity, INTEGER_COLUMNS['Quantity']))
+    for column in MONEY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(money_dtype)
+    if 'Customer_ID' in df.columns and not pd.api.types.is_numeric_dtype(df['Customer_ID']):
+        df['Customer_ID'] = df['Customer_ID'].astype('category')
+    return df
+
+
+def memory_footprint(df):
+    """Bytes used by each column (strings and categories counted in full)."""
+    return df.memory_usage(deep=True, index=False).to_dict()
+
+
+def print_footprint(df, before=None):
+    """Table of the memory used per column; ``before`` is an earlier memory_footprint()."""
+    after = memory_footprint(df)
+    print(f"\n🧮 MEMORY FOOTPRINT ({len(df):,} rows)")
+    print(f"{'Column':<12} {'Type':<16} {'Size':>12}" + (f" {'Before':>12}" if before else ''))
+    for column, size in after.items():
+        line = f"{column:<12} {str(df[column].dtype):<16} {size / 1024:>9,.1f} KB"
+        if before:
+            line += f" {before.get(column, 0) / 1024:>9,.1f} KB"
+        print(line)
+    total = sum(after.values())
+    line = f"{'Total':<12} {'':<16} {total / 1024:>9,.1f} KB"
+    if before:
+        line += f" {sum(before.values()) / 1024:>9,.1f} KB  ({sum(before.values()) / max(total, 1):.1f}x smaller)"
+    print(line)
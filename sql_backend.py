@@ -0,0 +1,218 @@
+# SQL backend - let an embedded database do the big scan
+# For data too big even for the compact pandas table, the orders are copied
+# (chunk by chunk, so memory stays flat) into a local database file in
+# .sales_cache/ - SQLite, which comes with Python, or DuckDB if installed.
+# A single GROUP BY then adds them up into the same Region x Product x day cube
+# the pandas path builds, so every script prints exactly the same tables.
+# Customer counts and quantiles are read with GROUP BY queries too: one row
+# per different customer (or value) per Region x Product x month, not per order.
+# The database file is rebuilt only when the sales data changes.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregations import SalesCube
+from calendar_dim import day_codes
+from data_loader import (DEFAULT_MAX_MEMORY_MB, NoOrdersError, cache_file, read_json, source_signature,
+                         source_unchanged, write_json)
+from distinct import CUSTOMER_COLUMN, build_distinct, hash_values
+from quantiles import QUANTILE_COLUMNS, build_distribution
+from streaming import chunk_rows_for, iter_sales_chunks
+
+# Bump this whenever the table layout changes, so old database files are rebuilt
+SQL_VERSION = 2
+
+CREATE_TABLE = """
+CREATE TABLE sales (
+    Row BIGINT,        -- position of the order in the source data
+    Region VARCHAR,
+    Product VARCHAR,
+    Day INTEGER,       -- days since 1970-01-01 (see calendar_dim.day_codes)
+    Revenue DOUBLE,
+    Profit DOUBLE,
+    Month INTEGER,     -- months since 1970-01
+    Quantity DOUBLE,
+    Customer BIGINT    -- 64-bit hash of Customer_ID (see distinct.hash_values), NULL if none
+)
+"""
+
+# One row per Region x Product x day, in the order the cells first appear in
+# the data (the same order the pandas cube has)
+CUBE_QUERY = """
+SELECT Region, Product, Day,
+       SUM(Revenue) AS Revenue, SUM(Profit) AS Profit,
+       COUNT(*) AS Orders, MIN(Row) AS First_Row
+FROM sales
+{where}
+GROUP BY Region, Product, Day
+ORDER BY First_Row
+"""
+
+# Every different customer once per Region x Product x month
+CUSTOMERS_QUERY = """
+SELECT Region, Product, Month, Customer
+FROM sales
+{where}
+GROUP BY Region, Product, Month, Customer
+"""
+
+# Every different value of a column once per Region x Product x month, with its number of orders
+VALUES_QUERY = """
+SELECT Region, Product, Month, {column}, COUNT(*) AS Orders
+FROM sales
+{where}
+GROUP BY Region, Product, Month, {column}
+"""
+
+
+def _connect(engine, file, read_only=False):
+    if engine == 'duckdb':
+        import duckdb
+        return duckdb.connect(file, read_only=read_only)
+    import sqlite3
+    return sqlite3.connect(file)
+
+
+def _insert(connection, engine, table):
+    if engine == 'duckdb':
+        connection.register('chunk', table)
+        connection.execute('INSERT INTO sales SELECT * FROM chunk')
+        connection.unregister('chunk')
+    else:
+        # tolist() gives plain Python numbers (None where missing), which sqlite3 can store
+        rows = zip(*(table[column].astype(object).where(table[column].notna(), None).tolist()
+                     for column in table.columns))
+        connection.executemany(f"INSERT INTO sales VALUES ({', '.join('?' * len(table.columns))})", rows)
+
+
+def build_database(path, engine='sqlite', max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """Copy every order of ``path`` into a fresh database file and return its path."""
+    db_file = cache_file(path, engine)
+    temp_file = db_file + '.tmp'
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+
+    connection = _connect(engine, temp_file)
+    try:
+        connection.execute(CREATE_TABLE)
+        rows = 0
+        columns = set()
+        for chunk in iter_sales_chunks(path, chunk_rows_for(max_memory_mb)):
+            days = day_codes(chunk['Date'])
+            _insert(connection, engine, pd.DataFrame({
+                'Row': np.arange(rows, rows + len(chunk)),
+                'Region': chunk['Region'].astype(str),
+                'Product': chunk['Product'].astype(str),
+                'Day': days.astype('int32'),
+                'Revenue': chunk['Revenue'].astype('float64'),
+                'Profit': chunk['Profit'].astype('float64'),
+                'Month': days.astype('datetime64[D]').astype('datetime64[M]').astype('int32'),
+                'Quantity': chunk['Quantity'].astype('float64') if 'Quantity' in chunk.columns else np.nan,
+                'Customer': _customer_hashes(chunk),
+            }))
+            columns.update(column for column in (*QUANTILE_COLUMNS, CUSTOMER_COLUMN) if column in chunk.columns)
+            rows += len(chunk)
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temp_file, db_file)
+
+    write_json(cache_file(path, f'{engine}.json'), {
+        'version': SQL_VERSION,
+        'source': source_signature(path),
+        'rows': rows,
+        'columns': sorted(columns),
+    })
+    return db_file
+
+
+def _customer_hashes(chunk):
+    """Hash of every order's Customer_ID as a signed 64-bit number (missing without one)."""
+    if CUSTOMER_COLUMN not in chunk.columns:
+        return pd.arrays.IntegerArray(np.zeros(len(chunk), dtype='int64'), np.ones(len(chunk), dtype=bool))
+    numbers, hashes = hash_values(chunk[CUSTOMER_COLUMN])
+    # The extra 0 at the end is what number -1 (missing) picks, before it is masked out
+    customers = pd.Series(np.append(hashes.view('int64'), 0)[numbers], dtype='Int64')
+    return customers.where(numbers >= 0).array
+
+
+def sales_database(path, engine='sqlite', max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """The database file for ``path``, (re)built first if the data changed."""
+    db_file = cache_file(path, engine)
+    meta_file = cache_file(path, f'{engine}.json')
+    meta = read_json(meta_file)
+    if (meta is not None and meta.get('version') == SQL_VERSION and os.path.exists(db_file)
+            and source_unchanged(path, meta['source'])):
+        write_json(meta_file, meta)  # keeps a refreshed timestamp, if any
+        return db_file
+    return build_database(path, engine, max_memory_mb)
+
+
+def _query(connection, sql, params):
+    cursor = connection.execute(sql, params)
+    columns = [description[0] for description in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+
+def _month_rows(table):
+    """Region/Product/Month rows from the database as the Region/Product/Date table distinct.py keys on."""
+    return table.assign(Region=table['Region'].astype(str), Product=table['Product'].astype(str),
+                        Date=table['Month'].to_numpy(dtype='int64').astype('datetime64[M]'))
+
+
+def build_sales_cube_sql(path, engine='sqlite', start=None, end=None, regions=None,
+                         max_memory_mb=DEFAULT_MAX_MEMORY_MB, distinct=None, quantiles=None):
+    """Same cube as build_sales_cube(load_sales_data(path, ...)), added up by the database.
+
+    ``distinct`` and ``quantiles`` ('exact' or 'sketch') add customer counts
+    and Revenue/Quantity quantiles, like build_sales_cube() does.
+    """
+    db_file = sales_database(path, engine, max_memory_mb)
+    columns = read_json(cache_file(path, f'{engine}.json'))['columns']
+
+    conditions, params = [], []
+    if start is not None:
+        conditions.append('Day >= ?')
+        params.append(int(day_codes([start])[0]))
+    if end is not None:
+        conditions.append('Day <= ?')
+        params.append(int(day_codes([end])[0]))
+    if regions:
+        conditions.append(f"Region IN ({', '.join('?' * len(regions))})")
+        params.extend(regions)
+    where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+    connection = _connect(engine, db_file, read_only=True)
+    try:
+        cells = _query(connection, CUBE_QUERY.format(where=where), params)
+        customers = values = None
+        if distinct and CUSTOMER_COLUMN in columns:
+            customer_where = 'WHERE ' + ' AND '.join(conditions + ['Customer IS NOT NULL'])
+            customers = _query(connection, CUSTOMERS_QUERY.format(where=customer_where), params)
+        if quantiles:
+            values = {column: _query(connection, VALUES_QUERY.format(column=column, where=where), params)
+                      for column in QUANTILE_COLUMNS if column in columns}
+    finally:
+        connection.close()
+    if len(cells) == 0:
+        raise NoOrdersError(path, start, end, regions)
+
+    cube = SalesCube(pd.DataFrame({
+        'Region': cells['Region'].astype('category'),
+        'Product': cells['Product'].astype('category'),
+        'Date': pd.to_datetime(cells['Day'].to_numpy(dtype='int64').astype('datetime64[D]')),
+        'Revenue': cells['Revenue'].astype('float64'),
+        'Profit': cells['Profit'].astype('float64'),
+        'Orders': cells['Orders'].astype('int64'),
+        'First_Row': cells['First_Row'].astype('int64'),
+    }))
+    if customers is not None:
+        customers['Customer'] = customers['Customer'].to_numpy(dtype='int64').view('uint64')
+        cube.customers = build_distinct(_month_rows(customers), 'Customer', distinct, hashed=True)
+    if values is not None:
+        cube.distributions = {column: build_distribution(_month_rows(table), column, quantiles,
+                                                         counts=table['Orders'])
+                              for column, table in values.items()}
+    return cube
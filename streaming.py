@@ -0,0 +1,126 @@
+# Streaming reader - add up files that are too big to load into memory at once
+# Instead of loading every order into one big DataFrame, we read the file in
+# chunks of a few thousand rows, turn each chunk into a small aggregate cube,
+# and merge the cubes. Memory use depends on the chunk size, not the file size.
+# Chunk cubes are merged in batches, each batch once it is as big as the cube
+# so far, so the growing cube isn't grouped all over again for every chunk.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregations import build_sales_cube, merge_cubes
+from data_loader import DEFAULT_MAX_MEMORY_MB, NoOrdersError, prepare_types, quarantine_file, save_problems
+from partitions import add_partition_columns, filter_sales, prune_partitions
+from validation import SeenOrders, print_problems, validate_sales
+
+# Rough memory cost of one order while a chunk is being processed (raw values,
+# the DataFrame, and the temporary columns used while grouping)
+BYTES_PER_ROW = 1024
+
+
+def chunk_rows_for(max_memory_mb):
+    """How many rows fit in one chunk for the given memory ceiling."""
+    # Keep half the budget for the cube and Python itself
+    return max(1000, int(max_memory_mb * 1024 * 1024 / 2 / BYTES_PER_ROW))
+
+
+def _iter_excel_chunks(path, chunk_rows):
+    # read_only mode streams the worksheet row by row instead of loading it all
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _iter_parquet_chunks(path, chunk_rows):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def _iter_file_chunks(path, chunk_rows):
+    if path.endswith('.csv'):
+        return pd.read_csv(path, chunksize=chunk_rows)
+    if path.endswith('.parquet'):
+        return _iter_parquet_chunks(path, chunk_rows)
+    return _iter_excel_chunks(path, chunk_rows)
+
+
+def iter_sales_chunks(path, chunk_rows, start=None, end=None, regions=None):
+    """Yield the orders of an .xlsx, .csv or .parquet file as DataFrames of at most chunk_rows rows.
+
+    ``path`` can also be a partitioned folder; only the partitions that can
+    match the date/region filters are read. Every chunk is validated like a
+    loaded file: broken orders go to the file's quarantine CSV, and duplicate
+    Order_IDs are caught across chunks. (Outliers are judged per chunk.)
+    """
+    if os.path.isdir(path):
+        files = prune_partitions(path, start, end, regions)
+    else:
+        files = [(path, {})]
+    for file, keys in files:
+        seen, counts, saved = SeenOrders(), {}, False
+        for chunk in _iter_file_chunks(file, chunk_rows):
+            chunk, problems, chunk_counts = validate_sales(chunk, seen)
+            for rule, count in chunk_counts.items():
+                counts[rule] = counts.get(rule, 0) + count
+            if len(problems):
+                save_problems(file, problems, append=saved)
+                saved = True
+            chunk = filter_sales(prepare_types(add_partition_columns(chunk, keys)), start, end, regions)
+            if len(chunk):
+                yield chunk
+        if not saved:
+            save_problems(file, pd.DataFrame())  # clears a quarantine file from an earlier run
+        if counts:
+            print_problems(os.path.relpath(file), counts, quarantine_file(file))
+
+
+def build_sales_cube_streaming(path, max_memory_mb=DEFAULT_MAX_MEMORY_MB, start=None, end=None, regions=None,
+                               distinct=None, quantiles=None):
+    """Same cube as build_sales_cube(load_sales_data(path, ...)), read chunk by chunk.
+
+    With ``distinct`` the customers of every chunk are counted and merged too;
+    'sketch' keeps that memory flat as well (see distinct.py). The same goes
+    for ``quantiles`` and the Revenue/Quantity quantiles (see quantiles.py).
+    Raises NoOrdersError if no chunk has any orders left after filtering.
+    """
+    chunk_rows = chunk_rows_for(max_memory_mb)
+    cube = None
+    waiting, waiting_cells = [], 0
+    rows_seen = 0
+    for chunk in iter_sales_chunks(path, chunk_rows, start, end, regions):
+        row_numbers = np.arange(rows_seen, rows_seen + len(chunk))
+        part = build_sales_cube(chunk, row_numbers=row_numbers, distinct=distinct,
+                                quantiles=quantiles)
+        rows_seen += len(chunk)
+        if cube is None:
+            cube = part
+            continue
+        waiting.append(part)
+        waiting_cells += len(part)
+        # Merging only once the waiting pieces add up to the cube's size keeps
+        # memory within about twice the finished cube
+        if waiting_cells >= len(cube):
+            cube = merge_cubes(cube, *waiting)
+            waiting, waiting_cells = [], 0
+    if cube is None:
+        raise NoOrdersError(path, start, end, regions)
+    return merge_cubes(cube, *waiting) if waiting else cube
@@ -0,0 +1,151 @@
+# Time-series engine - rolling windows, growth and running totals over a calendar grid
+# The cube holds one row per Region x Product x day that had orders, so days
+# (or weeks, months) without orders are simply missing. Here the totals are
+# laid out as a dense grid instead: one row per segment (e.g. every Region),
+# one column per day/week/month from the first to the last, zeros where
+# nothing was sold. On that grid every window is plain array arithmetic:
+#
+#   running total    np.cumsum along the periods
+#   rolling sum      running total now minus the running total `window` periods ago
+#   moving average   rolling sum / window
+#   growth           this period vs `lag` periods ago (1 = month-over-month,
+#                    12 months = year-over-year)
+#
+# Each is O(periods) for all segments at once, whatever the window size -
+# there is no Python loop over windows or segments.
+
+import numpy as np
+import pandas as pd
+
+from aggregations import MEASURES
+from calendar_dim import day_codes
+
+FREQUENCIES = ['D', 'W', 'M']
+
+# Periods in a year, for year-over-year growth (364 days = same weekday last year)
+YEAR_LAGS = {'D': 364, 'W': 52, 'M': 12}
+
+
+def period_codes(days, freq):
+    """(codes, periods): the period number of every day code and the full run of periods.
+
+    Codes count from the first period, so ``periods[codes[i]]`` is day i's
+    day/week/month. ``periods`` has no gaps, even if some periods had no days.
+    """
+    if freq == 'M':
+        ordinals = days.astype('datetime64[D]').astype('datetime64[M]').astype('int64')
+    elif freq == 'W':
+        # Weeks run Monday to Sunday; day 0 (1970-01-01) was a Thursday
+        ordinals = (days + 3) // 7
+    elif freq == 'D':
+        ordinals = days
+    else:
+        raise ValueError(f"Unknown frequency: {freq} (use one of {', '.join(FREQUENCIES)})")
+    if len(ordinals) == 0:
+        return ordinals, pd.PeriodIndex([], freq=freq)
+    first = int(ordinals.min())
+    first_day = {'M': np.datetime64(first, 'M').astype('datetime64[D]'),
+                 'W': np.datetime64(first * 7 - 3, 'D'),
+                 'D': np.datetime64(first, 'D')}[freq]
+    periods = pd.period_range(pd.Timestamp(first_day), periods=int(ordinals.max()) - first + 1, freq=freq)
+    return ordinals - first, periods
+
+
+def _shifted(values, lag):
+    """``values`` moved ``lag`` periods later along the last axis (NaN where nothing moved in)."""
+    shifted = np.full(values.shape, np.nan)
+    if lag < values.shape[-1]:
+        shifted[..., lag:] = values[..., :values.shape[-1] - lag]
+    return shifted
+
+
+class TimeSeries:
+    """Revenue, Profit and Orders per segment and period, as dense NumPy arrays.
+
+    ``values[measure]`` has one row per segment (``segments``) and one column
+    per period (``periods``, a gap-free PeriodIndex); periods without orders
+    are 0. Window sizes and lags are counted in periods of ``freq``.
+    """
+
+    def __init__(self, segments, periods, values, freq):
+        self.segments = segments
+        self.periods = periods
+        self.values = values
+        self.freq = freq
+
+    def __len__(self):
+        return len(self.periods)
+
+    def series(self, measure='Revenue'):
+        return self.values[measure]
+
+    def cumulative(self, measure='Revenue'):
+        """Running total from the first period."""
+        return np.cumsum(self.values[measure], axis=-1)
+
+    def rolling_sum(self, measure='Revenue', window=3):
+        """Sum of the last ``window`` periods (NaN until there are that many)."""
+        running = self.cumulative(measure)
+        rolling = running - _shifted(running, window)
+        rolling[..., window - 1:window] = running[..., window - 1:window]
+        return rolling
+
+    def moving_average(self, measure='Revenue', window=3):
+        """Average of the last ``window`` periods (NaN until there are that many)."""
+        return self.rolling_sum(measure, window) / window
+
+    def growth(self, measure='Revenue', lag=1):
+        """% change from ``lag`` periods earlier (NaN without an earlier period or when it was 0)."""
+        values = self.values[measure].astype('float64')
+        before = _shifted(values, lag)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(before != 0, (values - before) / before * 100, np.nan)
+
+    def year_over_year(self, measure='Revenue'):
+        """% change from the same period a year earlier."""
+        return self.growth(measure, YEAR_LAGS[self.freq])
+
+    def total(self):
+        """One 'Total' segment with every segment added together."""
+        return TimeSeries(pd.Index(['Total'], name='Segment'), self.periods,
+                          {measure: values.sum(axis=0, keepdims=True) for measure, values in self.values.items()},
+                          self.freq)
+
+    def to_frame(self, **columns):
+        """A long table with one row per segment and period: the segment key(s), Period,
+        every measure, and any extra ``columns`` given as name=array, e.g.
+        to_frame(Revenue_MA3=series.moving_average('Revenue', 3))."""
+        frame = self.segments.repeat(len(self.periods)).to_frame(index=False)
+        frame['Period'] = np.tile(self.periods, len(self.segments))
+        for name, values in {**self.values, **columns}.items():
+            frame[name] = np.asarray(values).ravel()
+        return frame
+
+
+def time_series(cube, freq='M', by=None):
+    """Lay the cube's totals out per ``by`` (e.g. 'Region', or None for one total row) and period.
+
+    ``freq`` is 'D' (days), 'W' (Monday-Sunday weeks) or 'M' (months).
+    Every segment gets the same gap-free run of periods, from the data's
+    first to its last day.
+    """
+    keys = [] if by is None else [by] if isinstance(by, str) else list(by)
+    table = cube.rollup(keys + ['Date']).reset_index()
+    codes, periods = period_codes(day_codes(table['Date']), freq)
+    if keys:
+        segment_codes = table.groupby(keys, observed=True, sort=True).ngroup().to_numpy()
+        segments = pd.MultiIndex.from_frame(table[keys].drop_duplicates().sort_values(keys))
+        if len(keys) == 1:
+            segments = segments.get_level_values(0)
+    else:
+        segment_codes = np.zeros(len(table), dtype='int64')
+        segments = pd.Index(['Total'], name='Segment')
+
+    # One bincount per measure fills the whole grid, zeros included
+    cells = segment_codes * len(periods) + codes
+    size = len(segments) * len(periods)
+    values = {measure: np.bincount(cells, weights=table[measure].to_numpy(dtype='float64'),
+                                   minlength=size).reshape(len(segments), len(periods))
+              for measure in MEASURES}
+    values['Orders'] = values['Orders'].astype('int64')
+    return TimeSeries(segments, periods, values, freq)
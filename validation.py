@@ -0,0 +1,288 @@
+# Data validation - catch broken orders before they skew every KPI
+# Each order is checked against a few rules that must always hold:
+#
+#   missing_value        a required column is empty (or not a number/date)
+#   bad_quantity         Quantity is zero or negative
+#   bad_price            Unit_Price is zero or negative
+#   revenue_mismatch     Revenue isn't Unit_Price x Quantity (to the cent)
+#   profit_above_revenue Profit is bigger than Revenue
+#   duplicate_order      the Order_ID was already seen earlier in the file
+#
+# Orders breaking a rule are taken out and written to a quarantine file in
+# .sales_cache/ instead of stopping the whole run. Orders whose Revenue is far
+# from what that product usually sells for (a robust z-score per Product, see
+# outlier_scores()) are only flagged: they stay in, but are listed in the same
+# file so someone can take a look.
+#
+# Every check is a whole-column NumPy comparison - no Python loop per order -
+# so validating millions of rows costs a fraction of reading them.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import ORDER_PREFIX
+
+RULES = ['missing_value', 'bad_quantity', 'bad_price', 'revenue_mismatch', 'profit_above_revenue',
+         'duplicate_order']
+OUTLIER = 'outlier'
+
+REQUIRED_COLUMNS = ['Order_ID', 'Date', 'Product', 'Region', 'Quantity', 'Unit_Price', 'Revenue', 'Profit']
+NUMBER_COLUMNS = ['Quantity', 'Unit_Price', 'Revenue', 'Profit']
+
+# Revenue may differ from Unit_Price x Quantity by rounding, up to one cent
+REVENUE_TOLERANCE = 0.01
+
+# Orders with a robust z-score above this are flagged (3.5 is the usual
+# cut-off for the median/MAD score); SALES_OUTLIER_Z=0 switches it off
+OUTLIER_Z = float(os.environ.get('SALES_OUTLIER_Z', '3.5'))
+
+# Largest bitmap SeenOrders keeps (one bit per possible Order_ID: 32 MB covers
+# a range of 268 million IDs); IDs spread wider than that go into a set
+MAX_BITMAP_BYTES = 32 * 1024 * 1024
+
+
+class SeenOrders:
+    """Order numbers already seen, for spotting duplicates across chunks of one file.
+
+    Every number is one bit in a bitmap over the range of numbers seen so far
+    (125 KB per million IDs), so checking a chunk costs the same however many
+    chunks came before it. Numbers spread over too wide a range for a bitmap
+    are kept in a Python set instead.
+    """
+
+    def __init__(self):
+        self.first = 0  # number of the first bit, a multiple of 8
+        self.bits = np.zeros(0, dtype='uint8')
+        self.numbers = None  # the set, once the bitmap got too wide
+
+    def contains(self, numbers):
+        if self.numbers is not None:
+            return np.fromiter((number in self.numbers for number in numbers.tolist()), dtype=bool,
+                               count=len(numbers))
+        index = numbers - self.first
+        inside = (index >= 0) & (index < len(self.bits) * 8)
+        found = np.zeros(len(numbers), dtype=bool)
+        index = index[inside]
+        found[inside] = (self.bits[index >> 3] >> (index & 7)) & 1
+        return found
+
+    def _cover(self, low, high):
+        """Widen the bitmap to cover low..high; False if it would get too big."""
+        first = low - low % 8
+        if len(self.bits):
+            first = min(first, self.first)
+            high = max(high, self.first + len(self.bits) * 8 - 1)
+        size = (high - first) // 8 + 1
+        if size > MAX_BITMAP_BYTES:
+            return False
+        if first != self.first or size > len(self.bits):
+            # Room to grow, so a file of rising IDs doesn't copy the bitmap every chunk
+            bits = np.zeros(min(max(size, 2 * len(self.bits)), MAX_BITMAP_BYTES), dtype='uint8')
+            offset = (self.first - first) // 8
+            bits[offset:offset + len(self.bits)] = self.bits
+            self.first, self.bits = first, bits
+        return True
+
+    def add(self, numbers):
+        """Remember ``numbers`` (sorted from low to high)."""
+        if len(numbers) == 0:
+            return
+        if self.numbers is None and not self._cover(int(numbers[0]), int(numbers[-1])):
+            self.numbers = set((self.first + np.flatnonzero(np.unpackbits(self.bits, bitorder='little'))).tolist())
+            self.bits = np.zeros(0, dtype='uint8')
+        if self.numbers is not None:
+            self.numbers.update(numbers.tolist())
+            return
+        # Numbers sharing a byte are OR-ed together first, then each byte is set once
+        index = numbers - self.first
+        byte = index >> 3
+        starts = np.flatnonzero(np.r_[True, byte[1:] != byte[:-1]])
+        self.bits[byte[starts]] |= np.bitwise_or.reduceat((1 << (index & 7)).astype('uint8'), starts)
+
+
+def _order_numbers(order_ids):
+    """'ORD-10042' -> 10042 as floats, NaN where the ID is missing or has no number."""
+    if pd.api.types.is_numeric_dtype(order_ids):
+        return order_ids.to_numpy(dtype='float64')
+    # Fast path: every ID is 'ORD-' + digits
+    if order_ids.str.startswith(ORDER_PREFIX, na=False).all():
+        digits = order_ids.str.slice(len(ORDER_PREFIX))
+        # Arrow-backed text converts to numbers inside Arrow, much faster
+        in_arrow = isinstance(digits.dtype, pd.StringDtype) and digits.dtype.storage == 'pyarrow'
+        try:
+            return digits.astype('int64[pyarrow]' if in_arrow else 'int64').to_numpy(dtype='float64')
+        except (ValueError, TypeError):
+            pass
+    digits = order_ids.astype('string').str.extract(r'(\d+)\s*$', expand=False)
+    return pd.to_numeric(digits, errors='coerce').to_numpy(dtype='float64')
+
+
+def _group_medians(codes, values, groups):
+    """Median of ``values`` for every group code 0..groups-1 (NaN for empty groups).
+
+    The values are put in group order with one stable sort of the codes (a
+    fast radix sort for small integers); each group's median is then taken
+    with np.median on its slice - one NumPy call per group, none per row.
+    """
+    small_codes = codes.astype('int16' if groups < 2 ** 15 else 'int32')
+    grouped = values[np.argsort(small_codes, kind='stable')]
+    ends = np.cumsum(np.bincount(codes, minlength=groups))
+    medians = np.full(groups, np.nan)
+    for group, part in enumerate(np.split(grouped, ends[:-1])):
+        if len(part):
+            medians[group] = np.median(part)
+    return medians
+
+
+def outlier_scores(values, groups):
+    """Robust z-score of every value within its group (e.g. Revenue within Product).
+
+    z = 0.6745 x (value - group median) / group MAD, where MAD is the median
+    distance from the median. Unlike mean/std, one huge order can't hide
+    itself by dragging the average up. If more than half a group's values are
+    identical (MAD = 0) the mean distance is used instead (x 1.2533 so both
+    measure the same spread).
+    """
+    values = np.asarray(values, dtype='float64')
+    codes, labels = pd.factorize(np.asarray(groups))
+    scores = np.zeros(len(values))
+    usable = (codes >= 0) & ~np.isnan(values)
+    if not usable.any():
+        return scores
+    codes, x = codes[usable], values[usable]
+    medians = _group_medians(codes, x, len(labels))
+    distance = np.abs(x - medians[codes])
+    mad = _group_medians(codes, distance, len(labels))
+    mean_distance = np.bincount(codes, weights=distance, minlength=len(labels)) / np.maximum(
+        np.bincount(codes, minlength=len(labels)), 1)
+    spread = np.where(mad > 0, mad / 0.6745, mean_distance * 1.2533)[codes]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores[usable] = np.where(spread > 0, (x - medians[codes]) / spread,
+                                  np.where(distance > 0, np.inf, 0.0))
+    return scores
+
+
+def validate_sales(df, seen=None, outlier_z=None):
+    """Check every order of a freshly read (raw) sales table.
+
+    Returns (clean, problems, counts):
+      - clean: the orders that pass every rule, with number/date columns
+        converted, ready for schema.apply_schema()
+      - problems: the quarantined and flagged orders as read, plus a Problems
+        column (rule names) and an Action column ('quarantined' or 'flagged')
+      - counts: orders per rule, 'outlier' and 'quarantined' (the total
+        taken out) - only the ones that were hit
+    ``seen`` (a SeenOrders) carries Order_IDs over from earlier chunks.
+    Columns the table doesn't have (e.g. Region in a partition file) are skipped.
+    """
+    outlier_z = OUTLIER_Z if outlier_z is None else outlier_z
+    rows = len(df)
+    broken = {}
+
+    # Numbers and dates as proper types; anything unreadable becomes NaN/NaT
+    numbers = {column: pd.to_numeric(df[column], errors='coerce').to_numpy(dtype='float64')
+               for column in NUMBER_COLUMNS if column in df.columns}
+    dates = pd.to_datetime(df['Date'], errors='coerce') if 'Date' in df.columns else None
+    order_numbers = _order_numbers(df['Order_ID']) if 'Order_ID' in df.columns else None
+
+    missing = np.zeros(rows, dtype=bool)
+    for column in REQUIRED_COLUMNS:
+        if column in numbers:
+            missing |= np.isnan(numbers[column])
+        elif column == 'Date' and dates is not None:
+            missing |= dates.isna().to_numpy()
+        elif column == 'Order_ID' and order_numbers is not None:
+            missing |= np.isnan(order_numbers)
+        elif column in df.columns:
+            missing |= df[column].isna().to_numpy()
+    broken['missing_value'] = missing
+
+    # NaN comparisons are False, so missing numbers only count as missing_value
+    if 'Quantity' in numbers:
+        broken['bad_quantity'] = numbers['Quantity'] <= 0
+    if 'Unit_Price' in numbers:
+        broken['bad_price'] = numbers['Unit_Price'] <= 0
+    if {'Quantity', 'Unit_Price', 'Revenue'} <= numbers.keys():
+        expected = numbers['Unit_Price'] * numbers['Quantity']
+        broken['revenue_mismatch'] = np.abs(numbers['Revenue'] - expected) > REVENUE_TOLERANCE
+    if {'Revenue', 'Profit'} <= numbers.keys():
+        broken['profit_above_revenue'] = numbers['Profit'] > numbers['Revenue']
+
+    if order_numbers is not None:
+        has_id = ~np.isnan(order_numbers)
+        ids = order_numbers[has_id].astype('int64')
+        # Sorted, repeats sit next to each other; a stable sort keeps the first one first
+        order = np.argsort(ids, kind='stable')
+        sorted_ids = ids[order]
+        duplicate = np.zeros(len(ids), dtype=bool)
+        duplicate[order[1:]] = sorted_ids[1:] == sorted_ids[:-1]
+        if seen is not None:
+            duplicate = duplicate | seen.contains(ids)
+            seen.add(sorted_ids)
+        broken['duplicate_order'] = np.zeros(rows, dtype=bool)
+        broken['duplicate_order'][has_id] = duplicate
+
+    quarantined = np.zeros(rows, dtype=bool)
+    for mask in broken.values():
+        quarantined |= mask
+
+    # Outliers are judged against the good orders only
+    flagged = np.zeros(rows, dtype=bool)
+    if outlier_z > 0 and 'Revenue' in numbers and 'Product' in df.columns:
+        good = ~quarantined
+        products = pd.factorize(df['Product'])[0]  # category codes when Product is a category
+        scores = outlier_scores(numbers['Revenue'][good], products[good])
+        flagged[good] = np.abs(scores) > outlier_z
+        broken[OUTLIER] = flagged
+
+    counts = {rule: int(mask.sum()) for rule, mask in broken.items() if mask.any()}
+    if quarantined.any():
+        counts['quarantined'] = int(quarantined.sum())
+
+    problem_rows = quarantined | flagged
+    problems = df[problem_rows].copy()
+    if len(problems):
+        # Rule names are only put together for the few problem rows
+        names = pd.Series('', index=problems.index)
+        for rule, mask in broken.items():
+            names = names.where(~mask[problem_rows], names + ';' + rule)
+        problems['Problems'] = names.str.lstrip(';')
+        problems['Action'] = np.where(quarantined[problem_rows], 'quarantined', 'flagged')
+
+    # Hand over the converted values, so e.g. '3' read from a CSV is the number 3
+    if quarantined.any():
+        keep = ~quarantined
+        clean = df[keep].reset_index(drop=True)
+    else:
+        keep = slice(None)
+        clean = df.copy(deep=False)
+    for column, values in numbers.items():
+        clean[column] = values[keep]
+    if dates is not None:
+        clean['Date'] = dates.to_numpy()[keep]
+    if order_numbers is not None:
+        clean['Order_ID'] = order_numbers[keep].astype('int64')  # schema.py keeps numbers as they are
+    return clean, problems, counts
+
+
+def write_problems(problems, file, append=False):
+    """Save quarantined/flagged orders as CSV (``append`` adds to the file of an earlier chunk)."""
+    problems.to_csv(file, mode='a' if append else 'w', header=not append, index=False)
+
+
+def _orders(count):
+    return f"{count} order" if count == 1 else f"{count} orders"
+
+
+def print_problems(source, counts, file):
+    """Warn about what validation found in ``source`` (prints nothing if all was fine)."""
+    quarantined = counts.get('quarantined', 0)
+    rules = ', '.join(f"{rule}: {count}" for rule, count in counts.items() if rule in RULES)
+    if quarantined:
+        print(f"⚠️  {source}: {_orders(quarantined)} failed validation and were set aside ({rules})")
+    if counts.get(OUTLIER):
+        print(f"⚠️  {source}: {_orders(counts[OUTLIER])} flagged as unusual (kept in)")
+    if quarantined or counts.get(OUTLIER):
+        print(f"   See {os.path.relpath(file)}")